@@ -0,0 +1,311 @@
+"""
+Benchmark suite for the pipeline stages: get_clean_entries (segment),
+create_dataframes (dataframes) and scaled_fuzzy_matching (fuzzy).
+
+Each stage is run on fixed samples of the real OCR files and on synthetic
+volumes at several multiples of a volume's size. Every case runs in a fresh
+process so that its peak memory is not polluted by earlier cases. Throughput,
+peak memory and a log-log scaling exponent are reported per stage.
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import multiprocessing
+from queue import Empty
+
+import numpy as np
+
+from instrumentation import peak_rss_mb
+from synthetic_corpus import real_sample, write_synthetic_volume
+
+STAGES = ["segment", "dataframes", "fuzzy"]
+
+# (year_string, path relative to the repository root) of the fixed real inputs.
+REAL_INPUTS = [
+    ("12", "princeton_years/ecb_1912.txt"),
+    ("19", "new_text_files/ecb_1919_nypl_070724.txt"),
+]
+
+# Seconds between checks that a benchmark case's process is still running.
+POLL_SECONDS = 1
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks for the entry and dataframe scripts.')
+
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+            help="Stages to benchmark.")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100],
+            help="Synthetic corpus sizes, as multiples of one volume.")
+    parser.add_argument("--pages", type=int, default=300,
+            help="Number of pages in one synthetic volume.")
+    parser.add_argument("--real-pages", type=int, default=5,
+            help="Number of pages cut out of each real OCR file.")
+    parser.add_argument("--compression", action="store_true",
+            help="Instead of the stages, benchmark reading the real OCR files and a dataframe "
+                 "CSV against their disk size, plain and with every compression.")
+    parser.add_argument("--output", type=str, default=None,
+            help="Write the results as JSON lines to this file.")
+
+    return parser.parse_args(args)
+
+
+def run_stage(stage, year_string, input_path):
+    """
+    Run one pipeline stage on one input file.
+
+    Arguments:
+        stage: String; one of STAGES.
+        year_string: String; string representation of year.
+        input_path: String; OCR text file, or clean entries CSV for the dataframes stage.
+
+    Returns:
+        entries_out: Integer; number of entries or rows produced.
+    """
+    from create_entries import get_clean_entries, get_header_patterns
+
+    if stage == "segment":
+        full_entries, _, _, _, _ = get_clean_entries(
+            year_string, input_path, get_header_patterns(year_string), False)
+        return len(full_entries)
+
+    if stage == "dataframes":
+        from create_dataframes import create_dataframes
+        return len(create_dataframes(input_path, year_string).index)
+
+    if stage == "fuzzy":
+        from scaled_fuzzy_matching import scaled_fuzzy_matching
+        full_entries, _, _, _, _ = scaled_fuzzy_matching(input_path, year_string)
+        return len(full_entries)
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def prepare_input(stage, year_string, ocr_path, work_directory):
+    """
+    Turn an OCR text file into the input a stage expects. The dataframes stage
+    reads a clean entries CSV, so segmentation is run first (untimed).
+
+    Returns:
+        input_path: String; path to feed to run_stage.
+    """
+    if stage != "dataframes":
+        return ocr_path
+
+    from create_entries import get_clean_entries, get_header_patterns
+
+    _, clean_entries_df, _, _, _ = get_clean_entries(
+        year_string, ocr_path, get_header_patterns(year_string), False)
+    csv_path = os.path.join(work_directory, "clean_entries.csv")
+    clean_entries_df.to_csv(csv_path, index=False, encoding="utf-8", quotechar='"')
+    return csv_path
+
+
+def measure_case(queue, stage, year_string, ocr_path, work_directory):
+    """
+    Body of the child process for one benchmark case; puts a result dict on queue.
+    """
+    input_path = prepare_input(stage, year_string, ocr_path, work_directory)
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    entries_out = run_stage(stage, year_string, input_path)
+    seconds = time.perf_counter() - start
+
+    queue.put({
+        "seconds": seconds,
+        "entries_out": entries_out,
+        "input_bytes": os.path.getsize(input_path),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+    })
+
+
+def measure(stage, year_string, ocr_path, work_directory):
+    """
+    Run one benchmark case in a fresh process.
+
+    Returns:
+        result: Dictionary; seconds, entries_out, input_bytes, peak memory and throughput,
+                or only the exit code if the process failed before putting a result.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure_case,
+                              args=(queue, stage, year_string, ocr_path, work_directory))
+    process.start()
+    result = None
+    while result is None:
+        exited = process.exitcode is not None
+        try:
+            result = queue.get(timeout=POLL_SECONDS)
+        except Empty:
+            # A process that exited without a result raised; its traceback is on stderr
+            if exited:
+                break
+    process.join()
+
+    if result is None:
+        return {"exitcode": process.exitcode}
+
+    result["mb_per_second"] = result["input_bytes"] / 1e6 / result["seconds"]
+    result["entries_per_second"] = result["entries_out"] / result["seconds"]
+    return result
+
+
+def scaling_exponent(sizes, seconds):
+    """
+    Slope of log(seconds) against log(size): about 1 for linear stages, 2 for
+    quadratic ones.
+    """
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+
+def run_benchmarks(stages, scales, pages, real_pages, cwd_path):
+    """
+    Run every stage on the real samples and the synthetic volumes.
+
+    Arguments:
+        stages: List; stages to benchmark.
+        scales: List; synthetic corpus sizes, as multiples of one volume.
+        pages: Integer; number of pages in one synthetic volume.
+        real_pages: Integer; number of pages cut out of each real OCR file.
+        cwd_path: String; repository root.
+
+    Returns:
+        results: List; one dictionary per (stage, input) case.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        inputs = []
+        for year_string, relative_path in REAL_INPUTS:
+            path = os.path.join(work_directory, f"real_19{year_string}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(real_sample(os.path.join(cwd_path, relative_path), year_string, real_pages))
+            inputs.append(("real", year_string, relative_path, real_pages, path))
+
+        for scale in scales:
+            path = os.path.join(work_directory, f"synthetic_{scale}x.txt")
+            write_synthetic_volume(path, "12", pages * scale)
+            inputs.append(("synthetic", "12", f"{scale}x", pages * scale, path))
+
+        for stage in stages:
+            for kind, year_string, name, num_pages, path in inputs:
+                result = measure(stage, year_string, path, work_directory)
+                result.update({"stage": stage, "input": kind, "name": name,
+                               "year": year_string, "pages": num_pages})
+                results.append(result)
+                if "exitcode" in result:
+                    print(f"{stage:>10} {kind:>9} {name:>40} {num_pages:>7} pages "
+                          f"failed with exit code {result['exitcode']}")
+                    continue
+                print(f"{stage:>10} {kind:>9} {name:>40} {num_pages:>7} pages "
+                      f"{result['seconds']:9.2f}s {result['mb_per_second']:8.3f} MB/s "
+                      f"{result['entries_per_second']:10.0f} entries/s "
+                      f"peak {result['peak_rss_mb'] or 0:8.1f} MB")
+
+            synthetic = [r for r in results if r["stage"] == stage and r["input"] == "synthetic"
+                         and "exitcode" not in r]
+            exponent = scaling_exponent([r["pages"] for r in synthetic],
+                                        [r["seconds"] for r in synthetic])
+            if exponent is not None:
+                print(f"{stage:>10} scaling exponent: {exponent:.2f}")
+
+    return results
+
+
+def run_compression_benchmark(relative_paths, cwd_path, repeats=3):
+    """
+    Time reading files (pages of the OCR files, rows of the CSV files) plain
+    and with every compression available, against their size on disk.
+
+    Arguments:
+        relative_paths: List; files relative to the repository root.
+        cwd_path: String; repository root.
+        repeats: Integer; reads per case; the fastest is reported.
+
+    Returns:
+        results: List; one dictionary per (file, compression) case.
+    """
+    import pandas as pd
+    from compressed_io import COMPRESSION_SUFFIXES, iter_pages, open_binary, zstandard
+
+    compressions = [None] + [compression for compression in COMPRESSION_SUFFIXES
+                             if compression != "zstd" or zstandard is not None]
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        for relative_path in relative_paths:
+            source = os.path.join(cwd_path, relative_path)
+            plain_bytes = os.path.getsize(source)
+            for compression in compressions:
+                path = os.path.join(work_directory, os.path.basename(source))
+                if compression is not None:
+                    path += COMPRESSION_SUFFIXES[compression]
+                    start = time.perf_counter()
+                    with open(source, "rb") as f, open_binary(path, "wb") as out:
+                        out.write(f.read())
+                    compress_seconds = time.perf_counter() - start
+                else:
+                    path, compress_seconds = source, 0.0
+
+                seconds = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    if source.endswith(".csv"):
+                        units = len(pd.read_csv(path, dtype=str).index)
+                    else:
+                        units = sum(1 for _ in iter_pages(path))
+                    seconds.append(time.perf_counter() - start)
+
+                result = {
+                    "file": relative_path,
+                    "compression": compression or "none",
+                    "disk_bytes": os.path.getsize(path),
+                    "ratio": plain_bytes / os.path.getsize(path),
+                    "compress_seconds": compress_seconds,
+                    "read_seconds": min(seconds),
+                    "read_units": units,
+                    "mb_per_second": plain_bytes / 1e6 / min(seconds),
+                }
+                results.append(result)
+                print(f"{relative_path:>60} {result['compression']:>5} "
+                      f"{result['disk_bytes'] / 1e6:8.2f} MB (x{result['ratio']:5.2f}) "
+                      f"read {result['read_seconds']:7.3f}s {result['mb_per_second']:8.1f} MB/s")
+                if compression is not None:
+                    os.remove(path)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    if args.compression:
+        results = run_compression_benchmark(
+            [relative_path for _, relative_path in REAL_INPUTS]
+            + ["dataframes/dataframe_from_hand_corrected_csv/df_1912.csv"], cwd_path)
+    else:
+        results = run_benchmarks(args.stages, args.scales, args.pages, args.real_pages, cwd_path)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
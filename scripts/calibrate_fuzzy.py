@@ -0,0 +1,328 @@
+"""
+This module calibrates the thresholds of the fuzzy segmenter
+(scaled_fuzzy_matching.py), CUTOFF_POINT_SCORE and CLOSE_INDEX_THRESHOLD,
+against the hand-corrected entries in /entries/manually_corrected_entries/.
+
+Scoring every segment of a volume against the month strings is nearly all of
+the cost of a fuzzy run, and neither threshold changes it. The score matrix and
+the peak sequences of each year are therefore computed once and kept in
+/fuzzy_scores/ (keyed by the OCR text, so they are recomputed when it changes).
+Each setting of a grid then only reruns the cheap cutoff and entry stages, and
+its entry boundaries are scored against the hand-corrected ones with the
+boundary alignment of compare_segmentations.py:
+``(python prefix) calibrate_fuzzy.py --years 1913-1916 --cutoff-scores 0.35 0.4 0.45 --close-thresholds 3 5 8``
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import read_text, resolve_path
+from compare_segmentations import PAGE_MARKER_RE, WHITESPACE_RE, load_reference, merge_boundaries
+from scaled_fuzzy_matching import (CLOSE_INDEX_THRESHOLD, CUTOFF_POINT_SCORE, SEGMENT_LENGTH, get_month_strings,
+                                   peak_sequences, refine_cutoffs, score_pages, select_cutoffs, volume_pages)
+
+# Bumped whenever scoring or peak finding changes, so that older cached scores are not reused.
+FUZZY_SCORES_VERSION = 1
+
+SEQUENCE_FIELDS = ["month", "first", "last", "score"]
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Sweeps the fuzzy segmenter thresholds against the '
+                                                 'hand-corrected entries.')
+
+    parser.add_argument("--years", nargs="+", default=["1913-1916"],
+            help="Years or inclusive year ranges, e.g. 1913 or 1913-1916.")
+    parser.add_argument("--cutoff-scores", nargs="+", type=float, default=[0.3, 0.35, 0.4, 0.45, 0.5],
+            help="CUTOFF_POINT_SCORE values to try.")
+    parser.add_argument("--close-thresholds", nargs="+", type=int, default=[3, 5, 8, 12],
+            help="CLOSE_INDEX_THRESHOLD values to try.")
+    parser.add_argument("--tolerance", type=int, default=3,
+            help="Largest distance, in non-whitespace characters, between two boundaries that agree.")
+    parser.add_argument("--workers", type=int, default=1,
+            help="Number of processes that score the pages of a year that is not cached yet.")
+    parser.add_argument("--cache-directory", type=str, default="fuzzy_scores",
+            help="Directory, relative to the repository root, that score matrices and peak sequences are kept in.")
+    parser.add_argument("--output", type=str, default=None,
+            help="Write the precision and recall of every year and setting to this CSV file.")
+
+    return parser.parse_args(args)
+
+
+def scores_key(contents, month_strings):
+    """
+    Digest of everything the score matrix of a year depends on.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in [str(FUZZY_SCORES_VERSION), str(SEGMENT_LENGTH), *month_strings, contents]:
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_year_scores(path, key):
+    """
+    Peak sequences kept for a year, or None if there are none for the OCR text of key.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        if str(cached["key"]) != key:
+            return None
+        return {field: cached[field] for field in SEQUENCE_FIELDS}
+
+
+def save_year_scores(path, key, scores_array, sequences):
+    """
+    Keep a year's score matrix and peak sequences. Scores are rounded to 3
+    decimals, so they are stored exactly as integer thousandths.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, key=np.array(key),
+                        scores=np.rint(scores_array * 1000).astype(np.int16),
+                        **{field: sequences[field] for field in SEQUENCE_FIELDS})
+
+
+def year_sequences(contents, ecb_pages, month_strings, path, workers=1):
+    """
+    Peak sequences of a year, from the cache when its OCR text is unchanged.
+
+    Arguments:
+        contents: String; Princeton OCR file contents.
+        ecb_pages: List; page strings, see scaled_fuzzy_matching.volume_pages.
+        month_strings: List; month strings, e.g. "Jan 13".
+        path: String; cache file path.
+        workers: Integer; number of processes that score the pages on a cache miss.
+
+    Returns:
+        sequences: Dictionary; scaled_fuzzy_matching.peak_sequences output.
+        cached: Boolean; whether the sequences came from the cache.
+    """
+    key = scores_key(contents, month_strings)
+    sequences = load_year_scores(path, key)
+    if sequences is not None:
+        return sequences, True
+
+    scores_array = score_pages(ecb_pages, month_strings, workers)
+    sequences = peak_sequences(scores_array)
+    save_year_scores(path, key, scores_array, sequences)
+    return sequences, False
+
+
+def reference_positions(contents):
+    """
+    Offset in the whitespace-free reference (compare_segmentations.load_reference)
+    of every character position of an OCR file.
+
+    Returns:
+        positions: Numpy Array; positions[i] is the number of non-whitespace
+                   characters before contents[i].
+    """
+    non_whitespace = np.fromiter((not char.isspace() for char in contents), dtype=bool, count=len(contents))
+    return np.concatenate([[0], np.cumsum(non_whitespace)])
+
+
+def fuzzy_boundaries(ecb_pages, content_start, cutoff_points_dict, positions):
+    """
+    Reference offsets at which the entries of a set of cutoff points start.
+
+    Arguments:
+        ecb_pages: List; page strings.
+        content_start: Integer; offset of the first page in the OCR file.
+        cutoff_points_dict: Dictionary; scaled_fuzzy_matching.select_cutoffs output.
+        positions: Numpy Array; reference_positions output.
+
+    Returns:
+        starts: Numpy Array; sorted, unique reference offsets.
+    """
+    # Pages are separated by one \f in the OCR file
+    page_offsets = content_start + np.concatenate([[0], np.cumsum([len(page) + 1 for page in ecb_pages])])
+    starts = [page_offsets[page] + cutoff_point
+              for page, cutoff_points in cutoff_points_dict.items()
+              for cutoff_point in cutoff_points if cutoff_point < len(ecb_pages[page])]
+    return np.unique(positions[np.array(starts, dtype=np.int64)])
+
+
+def boundary_scores(truth, predicted, tolerance):
+    """
+    Precision and recall of predicted entry boundaries against the true ones.
+
+    Arguments:
+        truth: Numpy Array; sorted true boundary offsets.
+        predicted: Numpy Array; sorted predicted boundary offsets.
+        tolerance: Integer; largest distance between agreeing boundaries.
+
+    Returns:
+        scores: Dictionary; true, predicted and matched boundary counts, precision, recall and F1.
+    """
+    matched, _, _ = merge_boundaries(truth, predicted, tolerance)
+    precision = len(matched) / len(predicted) if len(predicted) else 0.0
+    recall = len(matched) / len(truth) if len(truth) else 0.0
+    return {
+        "true_boundaries": len(truth),
+        "predicted_boundaries": len(predicted),
+        "matched": len(matched),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def corrected_entry_offsets(entries_path, reference, page_starts, key_lengths=(24, 12), min_length=8,
+                            sample_step=40):
+    """
+    Locate the hand-corrected entries of a year in the reference. Hand-corrected
+    entries are not all in OCR order and their text differs from the OCR in places,
+    so unlike compare_segmentations.entry_offsets each entry is searched for on its
+    own page (and the pages either side), by its first key_lengths characters in turn.
+    Entries added by hand have no page and are skipped.
+
+    Arguments:
+        entries_path: String; hand-corrected entries CSV, with entry and page_num columns.
+        reference: String; output of compare_segmentations.load_reference.
+        page_starts: Numpy Array; output of compare_segmentations.load_reference.
+        key_lengths: Tuple; numbers of leading characters searched for, longest first.
+        min_length: Integer; shortest entry that is placed.
+        sample_step: Integer; every sample_step-th entry is used to find the page offset.
+
+    Returns:
+        starts: Numpy Array; sorted, unique reference offsets at which the placed entries start.
+        unplaced: Integer; number of entries that could not be placed.
+    """
+    rows = pd.read_csv(resolve_path(entries_path), dtype=str, keep_default_na=False)
+    entries = [WHITESPACE_RE.sub("", PAGE_MARKER_RE.sub("", entry)) for entry in rows["entry"]]
+    page_nums = pd.to_numeric(rows["page_num"], errors="coerce").to_numpy()
+
+    # page_num counts catalogue pages; find its offset from the OCR file's \f pages
+    # with the sampled entries whose key is found exactly once
+    deltas = []
+    for entry, page_num in zip(entries[::sample_step], page_nums[::sample_step]):
+        key = entry[:key_lengths[0]]
+        if len(key) == key_lengths[0] and not np.isnan(page_num) and reference.count(key) == 1:
+            deltas.append(np.searchsorted(page_starts, reference.find(key), side="right") - 1 - int(page_num))
+    delta = int(pd.Series(deltas).mode().iloc[0]) if deltas else 0
+
+    bounds = np.concatenate([page_starts, [len(reference)]])
+    starts = []
+    unplaced = 0
+    for entry, page_num in zip(entries, page_nums):
+        if len(entry) < min_length or np.isnan(page_num):
+            unplaced += 1
+            continue
+        page = min(max(int(page_num) + delta, 0), len(page_starts) - 1)
+        first, last = bounds[max(page - 1, 0)], bounds[min(page + 2, len(page_starts))]
+        for key_length in key_lengths:
+            start = reference.find(entry[:key_length], first, last)
+            if start >= 0:
+                starts.append(start)
+                break
+        else:
+            unplaced += 1
+
+    return np.unique(np.array(starts, dtype=np.int64)), unplaced
+
+
+def get_corrected_entries_path(year_string, cwd_path):
+    """
+    Gets a year's hand-corrected entries CSV.
+    """
+    return resolve_path(os.path.join(cwd_path, "entries", "manually_corrected_entries", f"entries_19{year_string}.csv"))
+
+
+def calibrate_year(year_string, cwd_path, cutoff_scores, close_thresholds, tolerance=3, workers=1,
+                   cache_directory="fuzzy_scores"):
+    """
+    Score every threshold setting of a grid on one year.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        cutoff_scores: List; CUTOFF_POINT_SCORE values.
+        close_thresholds: List; CLOSE_INDEX_THRESHOLD values.
+        tolerance: Integer; largest distance between agreeing boundaries.
+        workers: Integer; number of processes that score the pages on a cache miss.
+        cache_directory: String; directory, relative to cwd_path, of the score cache.
+
+    Returns:
+        results: Pandas Dataframe; one row of boundary_scores per setting.
+        cached: Boolean; whether the year's scores came from the cache.
+    """
+    ocr_path = resolve_path(os.path.join(cwd_path, "princeton_years", f"ecb_19{year_string}.txt"))
+    cache_path = os.path.join(cwd_path, cache_directory, f"scores_19{year_string}.npz")
+
+    contents = read_text(ocr_path)
+    ecb_pages, content_start = volume_pages(contents, year_string)
+    month_strings = get_month_strings(year_string)
+    sequences, cached = year_sequences(contents, ecb_pages, month_strings, cache_path, workers)
+
+    # Shortening a sequence's last segment does not depend on either threshold,
+    # so it is done once for the lowest cutoff score of the grid
+    refined_cutoffs = refine_cutoffs(ecb_pages, sequences, month_strings, min(cutoff_scores))
+
+    # True boundaries within the pages the fuzzy segmenter covers
+    reference, page_starts = load_reference(ocr_path)
+    positions = reference_positions(contents)
+    truth, _ = corrected_entry_offsets(get_corrected_entries_path(year_string, cwd_path), reference, page_starts)
+    content_end = content_start + sum(len(page) + 1 for page in ecb_pages) - 1
+    truth = truth[(truth >= positions[content_start]) & (truth < positions[content_end])]
+
+    rows = []
+    for cutoff_score in cutoff_scores:
+        for close_threshold in close_thresholds:
+            cutoff_points_dict = select_cutoffs(refined_cutoffs, cutoff_score, close_threshold)
+            predicted = fuzzy_boundaries(ecb_pages, content_start, cutoff_points_dict, positions)
+            rows.append({"year": "19" + year_string, "cutoff_score": cutoff_score,
+                         "close_threshold": close_threshold, **boundary_scores(truth, predicted, tolerance)})
+
+    return pd.DataFrame(rows), cached
+
+
+def summarise(results):
+    """
+    Precision, recall and F1 of every setting over all calibrated years.
+    """
+    totals = results.groupby(["cutoff_score", "close_threshold"])[
+        ["true_boundaries", "predicted_boundaries", "matched"]].sum()
+    totals["precision"] = totals["matched"] / totals["predicted_boundaries"].where(totals["predicted_boundaries"] > 0)
+    totals["recall"] = totals["matched"] / totals["true_boundaries"].where(totals["true_boundaries"] > 0)
+    totals["f1"] = 2 * totals["precision"] * totals["recall"] / (totals["precision"] + totals["recall"])
+    return totals.sort_values("f1", ascending=False)
+
+
+if __name__ == "__main__":
+
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    all_results = []
+    for year_string in parse_years(args.years):
+        if not os.path.exists(get_corrected_entries_path(year_string, cwd_path)):
+            print(f"19{year_string}: no hand-corrected entries, skipped")
+            continue
+        results, cached = calibrate_year(year_string, cwd_path, args.cutoff_scores, args.close_thresholds,
+                                         args.tolerance, args.workers, args.cache_directory)
+        print(f"19{year_string}: {'cached' if cached else 'scored'}, {len(results.index)} settings")
+        all_results.append(results)
+
+    if all_results:
+        results = pd.concat(all_results, ignore_index=True)
+        print(summarise(results).to_string())
+        print(f"Current setting: cutoff_score {CUTOFF_POINT_SCORE}, close_threshold {CLOSE_INDEX_THRESHOLD}")
+        if args.output:
+            results.to_csv(args.output, index=False)
@@ -0,0 +1,368 @@
+"""
+This module serves read-only HTTP/JSON lookups over the catalogue database
+written by catalogue_database.py, so that notebooks can share one warm store
+instead of each reading the year CSVs into pandas:
+``(python prefix) catalogue_api.py --database ecb_catalogue.db --port 8770``
+
+Every lookup is a named, parameterised query from QUERIES, e.g.
+``GET /query/publishers?year=1912&limit=20`` or
+``GET /query/author_titles?last_name=Hardy``; ``GET /queries`` lists them.
+Queries run on a pool of read-only connections, whose prepared statements are
+reused, and results are kept in an LRU cache. A cached result is only served
+while the versions that load_year bumps in LOADS_TABLE are unchanged for the
+years it covers, so reloading a year invalidates its results.
+"""
+
+import os
+import re
+import sys
+import json
+import queue
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from catalogue_database import CATALOGUE_TABLE, LOADS_TABLE
+
+# sql: statement with named parameters.
+# params: parameter name -> (converter, default); REQUIRED parameters have no default.
+# year_scoped: If true, the result only depends on the rows of the "year" parameter.
+CatalogueQuery = namedtuple("CatalogueQuery", ["sql", "params", "year_scoped"])
+
+REQUIRED = object()
+
+QUERIES = {
+    "years": CatalogueQuery(
+        f"SELECT catalogue_year, COUNT(*) AS entries FROM {CATALOGUE_TABLE} "
+        f"GROUP BY catalogue_year ORDER BY catalogue_year",
+        {}, False),
+    "publishers": CatalogueQuery(
+        f"SELECT publisher, COUNT(*) AS entries FROM {CATALOGUE_TABLE} "
+        f"WHERE catalogue_year = :year AND publisher IS NOT NULL "
+        f"GROUP BY publisher ORDER BY entries DESC, publisher LIMIT :limit",
+        {"year": (int, REQUIRED), "limit": (int, 50)}, True),
+    "publisher_years": CatalogueQuery(
+        f"SELECT catalogue_year, COUNT(*) AS entries FROM {CATALOGUE_TABLE} "
+        f"WHERE publisher = :publisher GROUP BY catalogue_year ORDER BY catalogue_year",
+        {"publisher": (str, REQUIRED)}, False),
+    "author_titles": CatalogueQuery(
+        f"SELECT catalogue_year, entry_id, last_name, first_name, title, publisher, price, format, date "
+        f"FROM {CATALOGUE_TABLE} WHERE last_name = :last_name "
+        f"AND (:first_name IS NULL OR first_name = :first_name) "
+        f"ORDER BY catalogue_year, page_num, title LIMIT :limit",
+        {"last_name": (str, REQUIRED), "first_name": (str, None), "limit": (int, 500)}, False),
+    "prices": CatalogueQuery(
+        f"SELECT price, price_pence(price) AS pence, COUNT(*) AS entries FROM {CATALOGUE_TABLE} "
+        f"WHERE catalogue_year = :year AND price IS NOT NULL "
+        f"GROUP BY price ORDER BY pence IS NULL, pence, price",
+        {"year": (int, REQUIRED)}, True),
+    "formats": CatalogueQuery(
+        f"SELECT format, COUNT(*) AS entries FROM {CATALOGUE_TABLE} "
+        f"WHERE catalogue_year = :year GROUP BY format ORDER BY entries DESC",
+        {"year": (int, REQUIRED)}, True),
+    "title_prefix": CatalogueQuery(
+        f"SELECT catalogue_year, entry_id, author_name, title, publisher, price FROM {CATALOGUE_TABLE} "
+        f"WHERE title >= :prefix AND title < :prefix || char(1114111) "
+        f"ORDER BY title, catalogue_year LIMIT :limit",
+        {"prefix": (str, REQUIRED), "limit": (int, 100)}, False),
+    "entry": CatalogueQuery(
+        f"SELECT * FROM {CATALOGUE_TABLE} WHERE entry_id = :entry_id",
+        {"entry_id": (str, REQUIRED)}, False),
+}
+
+PRICE_RE = re.compile(r"(?:£\s*(\d+)\s*|(\d+)\s*l\.?\s*)?(?:(\d+)\s*s\.?\s*)?(?:(\d+)\s*d\.?)?")
+
+
+def price_pence(price):
+    """
+    Value of a catalogue price such as "3s. 6d." or "1l. 1s." in pence, or None
+    if it is not written in pounds, shillings and pence.
+    """
+    match = PRICE_RE.fullmatch(price.strip()) if isinstance(price, str) else None
+    if match is None or not any(match.groups()) or match.group(0).strip().isdigit():
+        return None
+    pounds, pounds_l, shillings, pence = (int(value or 0) for value in match.groups())
+    return (pounds + pounds_l) * 240 + shillings * 12 + pence
+
+
+def read_versions(connection):
+    """
+    Load version of every catalogue year, or an empty dictionary for a database
+    written before LOADS_TABLE was added.
+    """
+    try:
+        return dict(connection.execute(f"SELECT catalogue_year, version FROM {LOADS_TABLE}"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+class ConnectionPool:
+    """
+    Fixed number of read-only connections to a SQLite database, shared between threads.
+
+    Arguments:
+        db_path: String; SQLite database file path.
+        size: Integer; number of connections.
+        timeout: Float; seconds to wait on a database locked by a writer.
+    """
+
+    def __init__(self, db_path, size=4, timeout=30):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"No catalogue database at {db_path}")
+        uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+        self.connections = queue.Queue()
+        for _ in range(size):
+            # Autocommit mode, so that each lookup reads in one explicit transaction
+            connection = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False,
+                                         isolation_level=None, cached_statements=4 * len(QUERIES))
+            connection.execute("PRAGMA query_only = ON")
+            connection.create_function("price_pence", 1, price_pence, deterministic=True)
+            self.connections.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection, waiting for one to be returned if all are in use.
+        """
+        connection = self.connections.get()
+        try:
+            yield connection
+        finally:
+            self.connections.put(connection)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+class ResultCache:
+    """
+    Least recently used cache of query results, keyed by query, parameters and
+    the load versions of the years they were read from.
+
+    Arguments:
+        max_size: Integer; largest number of results kept.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def sync(self, versions):
+        """
+        Drop the results of years whose load version changed, and results over
+        every year if any did.
+        """
+        with self.lock:
+            if versions == self.versions:
+                return
+            changed = {year for year in set(versions) | set(self.versions)
+                       if versions.get(year) != self.versions.get(year)}
+            stale = [key for key, (year, _) in self.results.items() if year is None or year in changed]
+            for key in stale:
+                del self.results[key]
+            self.invalidated += len(stale)
+            self.versions = dict(versions)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.results:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key][1]
+
+    def put(self, key, year, result):
+        with self.lock:
+            self.results[key] = (year, result)
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.results), "max_size": self.max_size, "hits": self.hits,
+                    "misses": self.misses, "invalidated": self.invalidated}
+
+
+def parse_params(name, raw_params):
+    """
+    Convert the query string parameters of a named query, filling in defaults.
+
+    Raises:
+        KeyError: unknown query.
+        ValueError: missing, unknown or malformed parameter.
+    """
+    catalogue_query = QUERIES[name]
+    unknown = set(raw_params) - set(catalogue_query.params)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {name}: {', '.join(sorted(unknown))}")
+
+    params = {}
+    for param, (converter, default) in catalogue_query.params.items():
+        if param in raw_params:
+            try:
+                params[param] = converter(raw_params[param])
+            except ValueError:
+                raise ValueError(f"Parameter {param} of {name} must be {converter.__name__}") from None
+        elif default is REQUIRED:
+            raise ValueError(f"Parameter {param} of {name} is required")
+        else:
+            params[param] = default
+    return params
+
+
+class CatalogueQueryService:
+    """
+    Runs named queries on a ConnectionPool, through a ResultCache.
+
+    Arguments:
+        db_path: String; SQLite database file path.
+        pool_size: Integer; number of read-only connections.
+        cache_size: Integer; largest number of cached results, 0 to disable caching.
+    """
+
+    def __init__(self, db_path, pool_size=4, cache_size=1024):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.cache = ResultCache(cache_size) if cache_size else None
+
+    def run(self, name, raw_params):
+        """
+        Run a named query.
+
+        Arguments:
+            name: String; key of QUERIES.
+            raw_params: Dictionary; query string parameters.
+
+        Returns:
+            result: Dictionary; query, params, columns, rows and whether it was cached.
+        """
+        params = parse_params(name, raw_params)
+        catalogue_query = QUERIES[name]
+
+        with self.pool.connection() as connection:
+            # The versions and the rows are read from the same snapshot of the database
+            connection.execute("BEGIN")
+            try:
+                versions = read_versions(connection)
+                if catalogue_query.year_scoped:
+                    year = params["year"]
+                    version = versions.get(year, 0)
+                else:
+                    year = None
+                    version = tuple(sorted(versions.items()))
+                key = (name, tuple(sorted(params.items())), version)
+
+                if self.cache is not None:
+                    self.cache.sync(versions)
+                    cached = self.cache.get(key)
+                    if cached is not None:
+                        return dict(cached, cached=True)
+
+                cursor = connection.execute(catalogue_query.sql, params)
+                result = {
+                    "query": name,
+                    "params": params,
+                    "columns": [description[0] for description in cursor.description],
+                    "rows": [list(row) for row in cursor.fetchall()],
+                }
+            finally:
+                connection.execute("COMMIT")
+
+        if self.cache is not None:
+            self.cache.put(key, year, result)
+        return dict(result, cached=False)
+
+    def close(self):
+        self.pool.close()
+
+
+class CatalogueHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /queries, /query/<name> and /stats; the server holds the service.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+
+        if url.path == "/queries":
+            self.send_json(200, {name: {param: None if default is REQUIRED else default
+                                        for param, (_, default) in catalogue_query.params.items()}
+                                 for name, catalogue_query in QUERIES.items()})
+        elif url.path == "/stats":
+            self.send_json(200, service.cache.stats() if service.cache is not None else {})
+        elif url.path.startswith("/query/"):
+            name = url.path[len("/query/"):]
+            if name not in QUERIES:
+                self.send_json(404, {"message": f"Unknown query {name}"})
+                return
+            try:
+                result = service.run(name, dict(parse_qsl(url.query)))
+            except ValueError as error:
+                self.send_json(400, {"message": str(error)})
+                return
+            self.send_json(200, result)
+        else:
+            self.send_json(404, {"message": f"Unknown path {url.path}"})
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(db_path, port=8770, pool_size=4, cache_size=1024, verbose=False):
+    """
+    Create a query server; call serve_forever() on it, e.g. in a thread.
+
+    Arguments:
+        db_path: String; SQLite database file path.
+        port: Integer; port to listen on, 0 for any free port.
+        pool_size: Integer; number of read-only connections.
+        cache_size: Integer; largest number of cached results, 0 to disable caching.
+        verbose: Boolean; If true, logs every request.
+
+    Returns:
+        server: ThreadingHTTPServer; the bound server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), CatalogueHandler)
+    server.service = CatalogueQueryService(db_path, pool_size, cache_size)
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Serves read-only JSON queries over the catalogue database.')
+    parser.add_argument("--database", type=str, default="ecb_catalogue.db",
+            help="SQLite database, relative to the repository root.")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--pool-size", type=int, default=4, help="Number of read-only connections.")
+    parser.add_argument("--cache-size", type=int, default=1024,
+            help="Largest number of cached query results, 0 to disable caching.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(sys.argv[1:])
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    server = make_server(os.path.join(cwd_path, args.database), args.port, args.pool_size,
+                         args.cache_size, args.verbose)
+    print(f"Serving {', '.join(QUERIES)} on http://127.0.0.1:{server.server_address[1]}/query/")
+    server.serve_forever()
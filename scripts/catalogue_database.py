@@ -0,0 +1,179 @@
+"""
+This module loads the /dataframes/ CSVs into a SQLite database, one table row
+per catalogue entry, and builds the indexes used to look entries up by year,
+author, title and publisher. Each row stores the digest of its CSV row, so that
+reloading a year only deletes and inserts the entries that changed. Every load
+that changes a year bumps its version in LOADS_TABLE, which lets readers such as
+catalogue_api.py tell when their cached results for that year are out of date.
+"""
+
+import json
+import sqlite3
+
+import pandas as pd
+
+from dataframe_dtypes import DATAFRAME_DTYPE_PLAN, read_dataframe_csv, restore_csv_columns, to_boolean_flag
+from entry_ids import ENTRY_ID_COLUMN, compute_delta, entry_ids, read_text_csv, row_digests
+
+CATALOGUE_TABLE = "catalogue_entries"
+LOADS_TABLE = "catalogue_loads"
+
+# Column name -> SQLite column type, in table order.
+CATALOGUE_COLUMNS = {
+    column: "INTEGER" if dtype in ("flag", "uint8", "UInt16") else "TEXT"
+    for column, dtype in DATAFRAME_DTYPE_PLAN.items()
+}
+CATALOGUE_COLUMNS["catalogue_year"] = "INTEGER"
+CATALOGUE_COLUMNS["row_digest"] = "TEXT"
+
+# Index name -> indexed columns.
+CATALOGUE_INDEXES = {
+    "idx_catalogue_year": ["catalogue_year"],
+    "idx_author": ["last_name", "first_name"],
+    "idx_title": ["title"],
+    "idx_publisher": ["publisher"],
+    "idx_entry_id": ["entry_id"],
+}
+
+
+def connect(db_path, timeout=60):
+    """
+    Open the catalogue database, creating the table and indexes if needed.
+
+    Arguments:
+        db_path: String; SQLite database file path.
+        timeout: Float; seconds to wait on a database locked by another process.
+
+    Returns:
+        connection: sqlite3.Connection; open connection.
+    """
+    connection = sqlite3.connect(db_path, timeout=timeout)
+    columns = ", ".join(f"{column} {sql_type}" for column, sql_type in CATALOGUE_COLUMNS.items())
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {CATALOGUE_TABLE} ({columns})")
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {LOADS_TABLE} "
+                       f"(catalogue_year INTEGER PRIMARY KEY, version INTEGER NOT NULL, loaded_at TEXT)")
+
+    # Databases created before a column was added to the dtype plan lack it
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({CATALOGUE_TABLE})")}
+    for column, sql_type in CATALOGUE_COLUMNS.items():
+        if column not in existing:
+            connection.execute(f"ALTER TABLE {CATALOGUE_TABLE} ADD COLUMN {column} {sql_type}")
+    for name, indexed_columns in CATALOGUE_INDEXES.items():
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} "
+                           f"ON {CATALOGUE_TABLE} ({', '.join(indexed_columns)})")
+    connection.commit()
+    return connection
+
+
+def to_sql_rows(lean_df):
+    """
+    Convert a dataframe using the dtype plan into rows for CATALOGUE_TABLE:
+    creators as a JSON list, flags as 0/1 and missing values as NULL.
+
+    Arguments:
+        lean_df: Pandas Dataframe; dataframe using DATAFRAME_DTYPE_PLAN, with a
+                 row_digest column.
+
+    Returns:
+        rows: List; one tuple per dataframe row, in CATALOGUE_COLUMNS order.
+    """
+    df = restore_csv_columns(lean_df)
+
+    values = {}
+    for column in CATALOGUE_COLUMNS:
+        if column not in df:
+            values[column] = [None] * len(df.index)
+        elif DATAFRAME_DTYPE_PLAN.get(column) == "list":
+            values[column] = [None if value is None else json.dumps(value) for value in df[column]]
+        elif DATAFRAME_DTYPE_PLAN.get(column) == "flag":
+            values[column] = [int(value) for value in to_boolean_flag(df[column]).tolist()]
+        else:
+            values[column] = [None if pd.isna(value) else value
+                              for value in df[column].astype(object).tolist()]
+
+    for column, sql_type in CATALOGUE_COLUMNS.items():
+        if sql_type == "INTEGER":
+            values[column] = [None if value is None else int(value) for value in values[column]]
+
+    return list(zip(*values.values()))
+
+
+def read_year_digests(connection, catalogue_year):
+    """
+    Row digests of the entries of one catalogue year already in the database.
+
+    Returns:
+        digests: Pandas Series or None; row_digest per entry_id, or None if the year
+                 has rows loaded without entry IDs.
+    """
+    rows = connection.execute(f"SELECT entry_id, row_digest FROM {CATALOGUE_TABLE} "
+                              f"WHERE catalogue_year = ?", (catalogue_year,)).fetchall()
+    if any(entry_id is None or digest is None for entry_id, digest in rows):
+        return None
+    return pd.Series([digest for _, digest in rows], index=[entry_id for entry_id, _ in rows],
+                     dtype=object)
+
+
+def load_year(db_path, year_string, df_path):
+    """
+    Bring one catalogue year in the database up to date with its dataframe CSV.
+    Only entries that were added, removed or changed since the last load are
+    deleted and inserted; a year loaded without entry IDs is replaced in full.
+    The year's version in LOADS_TABLE is bumped in the same transaction when
+    anything changed.
+
+    Arguments:
+        db_path: String; SQLite database file path.
+        year_string: String; string representation of year.
+        df_path: String; df_19YY.csv written by create_dataframes.py.
+
+    Returns:
+        delta: Dictionary; added, removed and changed entry IDs, see entry_ids.compute_delta.
+    """
+    catalogue_year = int("19" + year_string)
+    lean_df = read_dataframe_csv(df_path)
+
+    # Dataframes written before entry IDs were introduced get them from their entries
+    text_df = read_text_csv(df_path)
+    if ENTRY_ID_COLUMN not in text_df:
+        pages = (pd.to_numeric(text_df["page_num"], errors="coerce") if "page_num" in text_df
+                 else [None] * len(text_df.index))
+        text_df[ENTRY_ID_COLUMN] = entry_ids(text_df["original_entry"], pages, catalogue_year)
+        lean_df[ENTRY_ID_COLUMN] = pd.array(text_df[ENTRY_ID_COLUMN], dtype=DATAFRAME_DTYPE_PLAN[ENTRY_ID_COLUMN])
+
+    digests = row_digests(text_df)
+    lean_df = lean_df.drop_duplicates(ENTRY_ID_COLUMN)
+    lean_df["row_digest"] = digests[lean_df[ENTRY_ID_COLUMN].tolist()].to_numpy()
+
+    placeholders = ", ".join("?" * len(CATALOGUE_COLUMNS))
+
+    connection = connect(db_path)
+    try:
+        previous_digests = read_year_digests(connection, catalogue_year)
+        delta = compute_delta(previous_digests, digests)
+
+        stale_ids = delta["removed"] + delta["changed"]
+        new_ids = set(delta["added"] + delta["changed"])
+        rows = to_sql_rows(lean_df[lean_df[ENTRY_ID_COLUMN].isin(new_ids)])
+
+        with connection:
+            if previous_digests is None:
+                connection.execute(f"DELETE FROM {CATALOGUE_TABLE} WHERE catalogue_year = ?",
+                                   (catalogue_year,))
+            else:
+                connection.executemany(f"DELETE FROM {CATALOGUE_TABLE} "
+                                       f"WHERE catalogue_year = ? AND entry_id = ?",
+                                       [(catalogue_year, entry_id) for entry_id in stale_ids])
+            connection.executemany(f"INSERT INTO {CATALOGUE_TABLE} "
+                                   f"({', '.join(CATALOGUE_COLUMNS)}) VALUES ({placeholders})", rows)
+            if stale_ids or rows:
+                connection.execute(f"INSERT INTO {LOADS_TABLE} (catalogue_year, version, loaded_at) "
+                                   f"VALUES (?, 1, datetime('now')) ON CONFLICT (catalogue_year) "
+                                   f"DO UPDATE SET version = version + 1, loaded_at = excluded.loaded_at",
+                                   (catalogue_year,))
+        if stale_ids or rows:
+            connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+    return delta
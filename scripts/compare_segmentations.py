@@ -0,0 +1,254 @@
+"""
+This module compares the entry boundaries found by the regex segmenter
+(create_entries.py, /entries/) with those found by the fuzzy segmenter
+(scaled_fuzzy_matching.py, /entries_fuzzy/).
+
+Both write entries that are pieces of the same /princeton_years/ OCR file, but
+they join lines differently and the regex entries carry page markers. Every
+entry is therefore mapped back to a character offset in the OCR file with all
+whitespace removed, and the two sorted boundary sets are aligned with a linear
+merge within a tolerance window. Boundaries only the regex segmenter has are
+splits (of an entry the fuzzy segmenter kept whole), boundaries only the fuzzy
+segmenter has are merges, and both are reported per page:
+``(python prefix) compare_segmentations.py --years 1908-1918``
+"""
+
+import os
+import re
+import csv
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import iter_pages, open_text, resolve_path
+
+# Page markers written into older /entries/ full entries by get_clean_entries.
+PAGE_MARKER_RE = re.compile(r"<PAGE_NUM:[0-9]{0,3}><DOCUMENT_PAGE_NUM:[0-9]{0,3}>")
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Compares regex and fuzzy entry boundaries.')
+
+    parser.add_argument("--years", nargs="+", default=["1908-1918"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1908-1918.")
+    parser.add_argument("--tolerance", type=int, default=3,
+            help="Largest distance, in non-whitespace characters, between two boundaries that agree.")
+    parser.add_argument("--regex-directory", type=str, default="entries",
+            help="Directory, relative to the repository root, holding the regex full_entries.")
+    parser.add_argument("--fuzzy-directory", type=str, default="entries_fuzzy",
+            help="Directory, relative to the repository root, holding the fuzzy full_entries.")
+    parser.add_argument("--pages", type=str, default=None,
+            help="Write the disagreeing pages of every year to this CSV file.")
+
+    return parser.parse_args(args)
+
+
+def load_reference(ocr_path):
+    """
+    Read an OCR file as one string without whitespace, along with where each
+    page (separated by \\f) starts in that string.
+
+    Arguments:
+        ocr_path: String; OCR full file path.
+
+    Returns:
+        reference: String; file contents with all whitespace removed.
+        page_starts: Numpy Array; offset in reference at which each page starts.
+    """
+    pages = [WHITESPACE_RE.sub("", page) for page in iter_pages(ocr_path)]
+
+    page_starts = np.zeros(len(pages), dtype=np.int64)
+    np.cumsum([len(page) for page in pages[:-1]], out=page_starts[1:])
+
+    return "".join(pages), page_starts
+
+
+def read_entries(entries_path):
+    """
+    Read the entries of a full_entries CSV file, without page markers or whitespace.
+    Both the files with an entry header and page columns and the older files with
+    one entry per row and page markers are read.
+
+    Arguments:
+        entries_path: String; full_entries CSV full file path.
+
+    Returns:
+        entries: List; stripped entries.
+    """
+    with open_text(resolve_path(entries_path), newline="") as f:
+        rows = csv.reader(f)
+        first = next(rows, [])
+        if first[:1] != ["entry"]:
+            rows = [first] + list(rows)
+        return [WHITESPACE_RE.sub("", PAGE_MARKER_RE.sub("", row[0])) for row in rows if row]
+
+
+def entry_offsets(entries, reference, window=4000, key_length=24, min_length=8):
+    """
+    Locate each entry in the reference, in order. Each entry is searched for
+    by its first key_length characters within window characters after the
+    end of the previous located entry (anywhere, for the first one, since the
+    front matter is not segmented); entries shorter than min_length are
+    too ambiguous to place and are skipped, as are entries that are not found.
+
+    Arguments:
+        entries: List; stripped entries, in segmentation order.
+        reference: String; output of load_reference.
+        window: Integer; number of reference characters searched per entry.
+        key_length: Integer; number of leading characters searched for.
+        min_length: Integer; shortest entry that is placed.
+
+    Returns:
+        starts: Numpy Array; sorted reference offsets at which the placed entries start.
+        unplaced: Integer; number of entries that could not be placed.
+    """
+    starts = []
+    unplaced = 0
+    cursor = 0
+
+    for entry in entries:
+        if len(entry) < min_length:
+            unplaced += 1
+            continue
+        end = cursor + window + len(entry) if starts else len(reference)
+        start = reference.find(entry[:key_length], cursor, end)
+        if start < 0:
+            unplaced += 1
+            continue
+        starts.append(start)
+        cursor = start + len(entry)
+
+    return np.array(starts, dtype=np.int64), unplaced
+
+
+def merge_boundaries(left, right, tolerance):
+    """
+    Align two sorted boundary arrays with a single linear merge. Two
+    boundaries agree when they are at most tolerance characters apart.
+
+    Arguments:
+        left: Numpy Array; sorted boundary offsets.
+        right: Numpy Array; sorted boundary offsets.
+        tolerance: Integer; largest distance between agreeing boundaries.
+
+    Returns:
+        matched: Numpy Array; left offsets that agree with a right offset.
+        left_only: Numpy Array; left offsets without a right counterpart.
+        right_only: Numpy Array; right offsets without a left counterpart.
+    """
+    matched, left_only, right_only = [], [], []
+    i = j = 0
+
+    while i < len(left) and j < len(right):
+        if abs(left[i] - right[j]) <= tolerance:
+            matched.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            left_only.append(left[i])
+            i += 1
+        else:
+            right_only.append(right[j])
+            j += 1
+
+    left_only.extend(left[i:])
+    right_only.extend(right[j:])
+
+    return (np.array(matched, dtype=np.int64), np.array(left_only, dtype=np.int64),
+            np.array(right_only, dtype=np.int64))
+
+
+def compare_year(year_string, cwd_path, tolerance=3, regex_directory="entries",
+                 fuzzy_directory="entries_fuzzy"):
+    """
+    Compare the regex and fuzzy full entries of one year.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        tolerance: Integer; largest distance between agreeing boundaries.
+        regex_directory: String; directory holding the regex full_entries, e.g. a
+                         segmenter change written somewhere other than /entries/.
+        fuzzy_directory: String; directory holding the fuzzy full_entries.
+
+    Returns:
+        summary: Dictionary; boundary counts, agreement, splits and merges.
+        pages: Pandas Dataframe; page, splits and merges of every page with a disagreement.
+    """
+    ocr_path = os.path.join(cwd_path, "princeton_years", f"ecb_19{year_string}.txt")
+    regex_path = os.path.join(cwd_path, regex_directory, "full_entries", f"entries_19{year_string}.csv")
+    fuzzy_path = os.path.join(cwd_path, fuzzy_directory, "full_entries", f"entries_19{year_string}.csv")
+
+    reference, page_starts = load_reference(ocr_path)
+    regex_starts, regex_unplaced = entry_offsets(read_entries(regex_path), reference)
+    fuzzy_starts, fuzzy_unplaced = entry_offsets(read_entries(fuzzy_path), reference)
+
+    matched, splits, merges = merge_boundaries(regex_starts, fuzzy_starts, tolerance)
+
+    union = len(matched) + len(splits) + len(merges)
+    summary = {
+        "year": "19" + year_string,
+        "regex_boundaries": len(regex_starts),
+        "fuzzy_boundaries": len(fuzzy_starts),
+        "regex_unplaced": regex_unplaced,
+        "fuzzy_unplaced": fuzzy_unplaced,
+        "matched": len(matched),
+        "splits": len(splits),
+        "merges": len(merges),
+        "agreement": len(matched) / union if union else 1.0,
+    }
+
+    # Page numbers count \f separated pages from 1, as in the OCR file
+    num_pages = len(page_starts)
+    split_pages = np.bincount(np.searchsorted(page_starts, splits, side="right"), minlength=num_pages + 1)
+    merge_pages = np.bincount(np.searchsorted(page_starts, merges, side="right"), minlength=num_pages + 1)
+    disagreeing = np.flatnonzero(split_pages + merge_pages)
+    pages = pd.DataFrame({
+        "year": "19" + year_string,
+        "page": disagreeing,
+        "splits": split_pages[disagreeing],
+        "merges": merge_pages[disagreeing],
+    })
+    summary["disagreeing_pages"] = len(pages.index)
+
+    return summary, pages
+
+
+if __name__ == "__main__":
+
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    summaries = []
+    all_pages = []
+    for year_string in parse_years(args.years):
+        paths = [os.path.join(cwd_path, directory, "full_entries", f"entries_19{year_string}.csv")
+                 for directory in (args.regex_directory, args.fuzzy_directory)]
+        if not all(os.path.exists(resolve_path(path)) for path in paths):
+            print(f"19{year_string}: no regex or fuzzy full entries, skipped")
+            continue
+        summary, pages = compare_year(year_string, cwd_path, args.tolerance,
+                                      args.regex_directory, args.fuzzy_directory)
+        summaries.append(summary)
+        all_pages.append(pages)
+
+    if summaries:
+        print(pd.DataFrame(summaries).set_index("year").to_string())
+
+    if args.pages and all_pages:
+        pd.concat(all_pages, ignore_index=True).to_csv(args.pages, index=False)
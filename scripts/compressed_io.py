@@ -0,0 +1,164 @@
+"""
+This module lets the OCR readers and the CSV writers work on gzip, zstd and xz
+files as well as plain ones. The compression is chosen by the file suffix
+(.gz, .zst, .xz); files are decompressed as a stream, and OCR files can be
+read one \\f separated page at a time. Readers are given the plain path and
+use whichever variant of it exists, so keeping a file compressed needs no
+change to the code that reads it.
+"""
+
+import os
+import io
+import gzip
+import lzma
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression name -> file suffix.
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "xz": ".xz",
+}
+
+# Compression choices for the --compression argument; "none" writes plain files.
+COMPRESSION_CHOICES = ["none"] + list(COMPRESSION_SUFFIXES)
+
+BLOCK_SIZE = 1 << 20
+
+
+def compression_of(path):
+    """
+    Compression name of a path from its suffix, or None for a plain file.
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def plain_path(path):
+    """
+    Path without its compression suffix.
+    """
+    compression = compression_of(path)
+    return path[:-len(COMPRESSION_SUFFIXES[compression])] if compression else path
+
+
+def path_variants(path):
+    """
+    The plain path and every compressed variant of it, plain first.
+    """
+    path = plain_path(path)
+    return [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+
+
+def resolve_path(path):
+    """
+    The existing variant of a path: the plain file if it exists, otherwise the
+    first compressed one that does, otherwise the path itself.
+    """
+    for variant in path_variants(path):
+        if os.path.exists(variant):
+            return variant
+    return path
+
+
+def output_path(path, compression=None):
+    """
+    Path an output is written to.
+
+    Arguments:
+        path: String; plain output path.
+        compression: String or None; one of COMPRESSION_CHOICES, or None to keep
+                     the format of the variant already on disk.
+
+    Returns:
+        path: String; output path with the suffix of its compression.
+    """
+    if compression is None:
+        return resolve_path(path)
+    if compression == "none":
+        return plain_path(path)
+    return plain_path(path) + COMPRESSION_SUFFIXES[compression]
+
+
+def remove_stale_variants(path):
+    """
+    Delete the other variants of an output about to be written to path, so
+    that readers never pick up an out of date copy in another format.
+    """
+    for variant in path_variants(path):
+        if variant != path and os.path.exists(variant):
+            os.remove(variant)
+
+
+def open_binary(path, mode="rb"):
+    """
+    Open a file as a stream of (de)compressed bytes, by its suffix.
+    """
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "xz":
+        return lzma.open(path, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError(f"zstandard is required to read and write {path}")
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def open_text(path, mode="r", encoding="utf-8", errors="ignore", newline=None):
+    """
+    Open a plain or compressed file as text, like open().
+
+    Arguments:
+        path: String; file path; its suffix selects the compression.
+        mode: String; "r", "w" or "a".
+        encoding: String; text encoding.
+        errors: String; encoding error handling.
+        newline: String or None; as for open().
+
+    Returns:
+        file: Text file object.
+    """
+    if compression_of(path) is None:
+        return open(path, mode, encoding=encoding, errors=errors, newline=newline)
+    return io.TextIOWrapper(open_binary(path, mode.replace("t", "") + "b"), encoding=encoding,
+                            errors=errors, newline=newline)
+
+
+def read_text(path):
+    """
+    Read the whole of a plain or compressed text file, e.g. an OCR file.
+    """
+    with open_text(resolve_path(path)) as f:
+        return f.read()
+
+
+def iter_pages(path, block_size=BLOCK_SIZE):
+    """
+    Read a plain or compressed OCR file one \\f separated page at a time, so
+    that only one page and one block are held in memory.
+
+    Arguments:
+        path: String; OCR file path.
+        block_size: Integer; number of characters decompressed per read.
+
+    Yields:
+        page: String; the text of each page, in order.
+    """
+    with open_text(resolve_path(path)) as f:
+        rest = ""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            pages = (rest + block).split("\f")
+            rest = pages.pop()
+            yield from pages
+        yield rest
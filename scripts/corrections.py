@@ -0,0 +1,269 @@
+"""
+This module stores manual corrections as patches keyed by entry ID instead of
+as hand-edited copies of a year's entries. A patch replaces a run of
+consecutive target entries with new entries:
+
+    {"op": "replace", "targets": ["1912-041-3fa2b9c01d4e"], "entries": ["..."]}
+    {"op": "split", "targets": ["1912-041-3fa2b9c01d4e"], "entries": ["...", "..."]}
+    {"op": "merge", "targets": ["1912-041-3fa2b9c01d4e", "1912-041-91c0e2d4b7aa"], "entries": ["..."]}
+
+Patches live in /entries/corrections/corrections_19YY.jsonl, one per line, and
+are applied by create_dataframes.py while it reads the clean entries. Since
+entry IDs are derived from entry text, a patch still applies after
+re-segmentation as long as its targets are segmented the same way; a target
+that moved page is matched by its text alone.
+
+Running it as a script turns a hand-edited copy of a year's clean entries
+(e.g. one of the revised CSVs) into patches against those clean entries:
+``(python prefix) corrections.py 1910 ../ecb_1910_revised.csv``
+"""
+
+import os
+import sys
+import json
+import difflib
+import argparse
+
+import pandas as pd
+
+from entry_ids import ENTRY_ID_COLUMN, entry_ids, normalise_entry
+
+
+def content_key(entry_id):
+    """
+    The part of an entry ID that does not depend on the page: the text hash
+    and any occurrence suffix.
+    """
+    return entry_id.split("-", 2)[-1]
+
+
+def patch_op(num_targets, num_entries):
+    """
+    Name of a patch replacing num_targets entries with num_entries entries.
+    """
+    if num_targets == 1 and num_entries > 1:
+        return "split"
+    if num_targets > 1 and num_entries == 1:
+        return "merge"
+    return "replace"
+
+
+class CorrectionStore:
+    """
+    The patches of one catalogue year, indexed by target entry ID.
+
+    Arguments:
+        patches: List; patch dictionaries with op, targets and entries. No two
+                 patches may have the same first target.
+    """
+
+    def __init__(self, patches):
+        self.patches = patches
+        self.by_id = {}
+        self.by_key = {}
+        for number, patch in enumerate(patches):
+            if patch["op"] not in ("replace", "split", "merge") or not patch["targets"]:
+                raise ValueError(f"Invalid correction patch: {patch}")
+            if patch["targets"][0] in self.by_id:
+                raise ValueError(f"Correction patches {self.by_id[patch['targets'][0]]} and {number} "
+                                 f"have the same first target: {patch['targets'][0]}")
+            self.by_id[patch["targets"][0]] = number
+            self.by_key.setdefault(content_key(patch["targets"][0]), []).append(number)
+
+    def __len__(self):
+        return len(self.patches)
+
+    def find(self, entry_id):
+        """
+        Number of the patch whose first target is entry_id, or None. An entry that
+        moved page is matched by its content key if only one patch has that key.
+        """
+        if entry_id in self.by_id:
+            return self.by_id[entry_id]
+        numbers = self.by_key.get(content_key(entry_id), [])
+        return numbers[0] if len(numbers) == 1 else None
+
+    def apply(self, rows, counters=None):
+        """
+        Apply the patches to a stream of clean entries. Replaced and merged entries
+        keep the ID of their first target, split pieces get ".2", ".3", ... after
+        it. A patch whose targets are not all found, consecutively and in order,
+        is left unapplied.
+
+        Arguments:
+            rows: Iterable; (entry, page_num, doc_page_num, entry_id) tuples.
+            counters: Dictionary or None; if given, applied and unmatched patch counts
+                      are added to it as corrections_applied and corrections_unmatched.
+
+        Yields:
+            row: Tuple; (entry, page_num, doc_page_num, entry_id) of each corrected entry.
+        """
+        applied = set()
+        pending = []
+        patch = None
+
+        for row in rows:
+            if patch is not None:
+                target = patch["targets"][len(pending)]
+                if row[3] == target or content_key(row[3]) == content_key(target):
+                    pending.append(row)
+                else:
+                    # The targets are no longer consecutive, so leave them as they are
+                    yield from pending
+                    pending, patch = [], None
+
+            if patch is None:
+                number = self.find(row[3])
+                if number is None or number in applied:
+                    yield row
+                    continue
+                patch = self.patches[number]
+                pending = [row]
+
+            if len(pending) == len(patch["targets"]):
+                yield from self.patched_rows(patch, pending)
+                applied.add(number)
+                pending, patch = [], None
+
+        yield from pending
+
+        if counters is not None:
+            counters["corrections_applied"] = counters.get("corrections_applied", 0) + len(applied)
+            counters["corrections_unmatched"] = (counters.get("corrections_unmatched", 0)
+                                                 + len(self.patches) - len(applied))
+
+    @staticmethod
+    def patched_rows(patch, targets):
+        """
+        Rows replacing the target rows of one patch, on the page of the first target.
+        """
+        _, page_num, doc_page_num, entry_id = targets[0]
+        for number, entry in enumerate(patch["entries"], start=1):
+            yield (entry, page_num, doc_page_num, entry_id if number == 1 else f"{entry_id}.{number}")
+
+
+def get_corrections_path(year_string, cwd_path):
+    """
+    Gets a year's correction patches file.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+
+    Returns:
+        file_path: String; corrections JSON lines full file path.
+    """
+    return os.path.join(cwd_path, "entries", "corrections", f"corrections_19{year_string}.jsonl")
+
+
+def read_corrections(path):
+    """
+    Read a corrections file.
+
+    Arguments:
+        path: String; corrections JSON lines file path.
+
+    Returns:
+        store: CorrectionStore or None; None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return CorrectionStore([json.loads(line) for line in f if line.strip()])
+
+
+def write_corrections(patches, path):
+    """
+    Write patches to a corrections file, one JSON object per line.
+
+    Arguments:
+        patches: List; patch dictionaries.
+        path: String; target JSON lines file path.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for patch in patches:
+            f.write(json.dumps(patch, ensure_ascii=False) + "\n")
+
+
+def corrections_from_revision(ids, entries, revised_entries):
+    """
+    Patches that turn a year's clean entries into a hand-edited copy of them.
+    The two are aligned on their normalised text; each run of differing entries
+    becomes one patch, and entries only in the copy are added by splitting the
+    entry before them (or after them, at the start).
+
+    Arguments:
+        ids: List; entry IDs of the clean entries.
+        entries: List; clean entry texts.
+        revised_entries: List; entry texts of the hand-edited copy.
+
+    Returns:
+        patches: List; patch dictionaries, in entry order.
+    """
+    matcher = difflib.SequenceMatcher(None, [normalise_entry(entry) for entry in entries],
+                                      [normalise_entry(entry) for entry in revised_entries],
+                                      autojunk=False)
+
+    patches = []
+    leading_entries = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        new_entries = list(revised_entries[j1:j2])
+        if tag == "insert" and i1 == 0:
+            leading_entries = new_entries
+            continue
+        if tag == "insert":
+            i1, new_entries = i1 - 1, [entries[i1 - 1]] + new_entries
+        patches.append({
+            "op": patch_op(i2 - i1, len(new_entries)),
+            "targets": ids[i1:i2],
+            "entries": new_entries,
+        })
+
+    # Entries only in the copy, before the first clean entry
+    if leading_entries:
+        if not (patches and patches[0]["targets"][0] == ids[0]):
+            patches.insert(0, {"targets": ids[:1], "entries": entries[:1]})
+        patch = patches[0]
+        patch["entries"] = leading_entries + patch["entries"]
+        patch["op"] = patch_op(len(patch["targets"]), len(patch["entries"]))
+
+    return patches
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Writes the corrections that turn a year's "
+                                     "clean entries into a hand-edited copy.")
+    parser.add_argument("year", help="Catalogue year, e.g. 1910.")
+    parser.add_argument("revised_path", help="Hand-edited entries CSV; entries are read from "
+                        "its last column.")
+    parser.add_argument("--no-header", action="store_true",
+                        help="The hand-edited CSV has no header row, e.g. ecv_1912_revised.csv.")
+    args = parser.parse_args(sys.argv[1:])
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    year_string = args.year[-2:]
+
+    clean_df = pd.read_csv(os.path.join(cwd_path, "entries", "clean_entries", f"entries_19{year_string}.csv"),
+                           dtype=str, keep_default_na=False)
+    entries = clean_df.iloc[:, 0].tolist()
+    if ENTRY_ID_COLUMN in clean_df:
+        ids = clean_df[ENTRY_ID_COLUMN].tolist()
+    else:
+        pages = (pd.to_numeric(clean_df["page_num"], errors="coerce") if "page_num" in clean_df
+                 else [None] * len(entries))
+        ids = entry_ids(entries, pages, "19" + year_string)
+
+    revised_df = pd.read_csv(args.revised_path, dtype=str, keep_default_na=False,
+                             header=None if args.no_header else 0)
+    # Blank rows of the copy are not entries; kept, they would replace entries with ""
+    revised_entries = [" ".join(entry.split()) for entry in revised_df.iloc[:, -1]]
+    revised_entries = [entry for entry in revised_entries if entry]
+
+    patches = corrections_from_revision(ids, entries, revised_entries)
+    path = get_corrections_path(year_string, cwd_path)
+    write_corrections(patches, path)
+    print(f"{len(patches)} corrections written to {path}")
@@ -2,41 +2,299 @@ import os
 import re
 import csv
 import sys
+import argparse
+from itertools import chain, islice
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
-from create_entries import argparse_create
+from entry_ids import ENTRY_ID_COLUMN, compute_delta, delta_counters, entry_ids, file_digests, write_delta
+from compressed_io import COMPRESSION_CHOICES, open_text, output_path, remove_stale_variants, resolve_path
+from corrections import get_corrections_path, read_corrections
+from creators import creators_table, head_names, split_creators
+from dataframe_dtypes import apply_dtype_plan, memory_usage_report, restore_csv_columns
+from instrumentation import RunRecorder
+from middle_lexer import MIDDLE_FIELDS, middle_fields
+from missing_fields import (MEASURE_LABELS, MISSING_FIELDS_COLUMN, NUM_PATTERNS, missing_field_mask,
+                            missing_field_measures, pattern_counts, write_dataframe_measures)
+
+# Columns of the dataframes written to /dataframes/, before the missing_fields column.
+DATAFRAME_COLUMNS = [
+    "entry",
+    "last_name",
+    "first_name",
+    "title",
+    "publisher",
+    "price",
+    # "price_in_pounds",
+    "format",
+    "original_entry",
+    "author_name",
+    # new fields
+    "creators",
+    "is_editor",
+    "date",
+    "catalogue_year",
+    "is_net",
+    "page_num",
+    "doc_page_num",
+    ENTRY_ID_COLUMN
+]
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Argument parser for creating the dataframe CSVs from the clean entries.')
+
+    parser.add_argument("--verbose", type=str,
+            help="Prints out dataframe metrics into the CLI.",
+            default="False")
+
+    parser.add_argument("--chunksize", type=int,
+            help="Number of clean entries processed per batch. By default each year is "
+                 "processed in one go.",
+            default=None)
 
-def create_dataframes(file_path, year_string):
+    parser.add_argument("--compression", type=str, choices=COMPRESSION_CHOICES,
+            help="Compression of the dataframe CSVs written. By default each output keeps "
+                 "the format it already has on disk.",
+            default=None)
+
+    parser.add_argument("--metrics", type=str,
+            help="JSON lines file, relative to the repository root, that per-stage run metrics are appended to.",
+            default="metrics/pipeline_metrics.jsonl")
+
+    # Parse arguments.
+    parsed_args = parser.parse_args(args)
+
+    return parsed_args
+
+def create_dataframes(file_path, year_string, counters=None, corrections=None):
     """
     Create more subsidiary dataframes and measures, and save to the /dataframes/ directory.
 
     Arguments:
         file_path: String; path to the clean entry file to be analyzed.
         year_string: String; represents what (19)year is being analyzed.
+        counters: Dictionary or None; if given, filled with entry and regex hit counts for
+                  instrumentation instead of printing them.
+        corrections: CorrectionStore or None; manual corrections applied to the clean entries.
 
     Returns:
         full_df: Pandas Dataframe; object that contains all extracted information from all of the 
                  clean_entries.
     """
-    with open(file_path, mode="r", newline='', errors="ignore",
-        encoding="utf-8") as f:
-        reader = csv.reader(f)
-        clean_entries = list(reader)
+    year_variations = get_year_variations(year_string)
 
-    # When reading through CSVs from /clean_entries, some rows begin and end with "
-    clean_entries = [entry[0].replace("\"", "") for entry in clean_entries]
+    read_counters = {}
+    main_entries = []
+    for batch in read_main_entries(file_path, year_variations, "19" + year_string, counters=read_counters,
+                                   corrections=corrections):
+        main_entries += batch
 
-    # pub_date_pattern = fr"[A-ZÀ-ž][A-ZÀ-ž\.\s&,'\-]+,\W\w[^A-ZÀ-ž]+(?:\.|,)?\W{year_string}\.?$"
+    # sys.exit("Clean and main entries testing")
+
+    full_df = extract_entry_fields(main_entries, year_string, year_variations)
+
+    missing_publisher_df = full_df[full_df["publisher"].isna()]
+    total_missing_publisher = len(missing_publisher_df.index)
+
+    if counters is None:
+        print("\nMain entries:", len(main_entries))
+        print(total_missing_publisher)
+    else:
+        counters.update(read_counters)
+        counters["missing_publisher"] = total_missing_publisher
+        counters["entries_out"] = len(full_df.index)
+
+    # sys.exit("Stop create_dataframes")
+
+    return full_df
+
+def iter_dataframes(file_path, year_string, chunksize, counters=None, corrections=None):
+    """
+    Streaming version of create_dataframes: reads the clean entry file in batches
+    and yields one dataframe per batch, so memory stays bounded by chunksize.
+    Concatenating the yielded dataframes gives the same result as create_dataframes.
+
+    Arguments:
+        file_path: String; path to the clean entry file to be analyzed.
+        year_string: String; represents what (19)year is being analyzed.
+        chunksize: Integer; number of clean entries read per batch.
+        counters: Dictionary or None; if given, filled with entry and regex hit counts.
+        corrections: CorrectionStore or None; manual corrections applied to the clean entries.
+
+    Yields:
+        full_df: Pandas Dataframe; extracted information for one batch of main entries.
+    """
+    clean_entries = read_clean_entries(file_path, "19" + year_string, counters)
+    yield from iter_entry_dataframes(clean_entries, year_string, chunksize, counters, corrections)
+
+def iter_entry_dataframes(clean_entries, year_string, chunksize, counters=None, corrections=None):
+    """
+    Yield one dataframe per batch of a stream of clean entries, wherever they come
+    from: a clean entry file, or the segmenter directly (see handoff.py).
+
+    Arguments:
+        clean_entries: Iterable; (entry, page_num, doc_page_num, entry_id) tuples.
+        year_string: String; represents what (19)year is being analyzed.
+        chunksize: Integer; number of clean entries per batch.
+        counters: Dictionary or None; if given, filled with main entry and correction counts.
+        corrections: CorrectionStore or None; manual corrections applied to the clean entries.
+
+    Yields:
+        full_df: Pandas Dataframe; extracted information for one batch of main entries.
+    """
     year_variations = get_year_variations(year_string)
+
+    start = 0
+    for batch in main_entry_batches(clean_entries, year_variations, chunksize, counters, corrections):
+        if len(batch) > 0:
+            yield extract_entry_fields(batch, year_string, year_variations, start)
+        start += len(batch)
+
+def read_main_entries(file_path, year_variations, catalogue_year, chunksize=None, counters=None,
+                      corrections=None):
+    """
+    Read a clean entry file, apply its corrections and yield its main entries
+    (entries ending with a publisher and date) in batches.
+
+    Arguments:
+        file_path: String; path to the clean entry file to be analyzed.
+        year_variations: List; OCR variations of the catalogue year.
+        catalogue_year: String; catalogue year, e.g. "1912", for files without entry IDs.
+        chunksize: Integer or None; number of clean entries read per batch. If None,
+                   the whole file is returned as a single batch.
+        counters: Dictionary or None; if given, clean entries read (entries_in), main entry
+                  pattern hits (main_entries) and corrections applied are added to it.
+        corrections: CorrectionStore or None; manual corrections applied to the clean entries.
+
+    Yields:
+        main_entries: List; (entry, page_num, doc_page_num, entry_id) of the main entries
+                      found in one batch of clean entries. Page numbers are None when the
+                      file has no page columns.
+    """
+    clean_entries = read_clean_entries(file_path, catalogue_year, counters)
+    yield from main_entry_batches(clean_entries, year_variations, chunksize, counters, corrections)
+
+def main_entry_batches(clean_entries, year_variations, chunksize=None, counters=None, corrections=None):
+    """
+    Apply corrections to a stream of clean entries and yield its main entries in batches.
+
+    Arguments:
+        clean_entries: Iterable; (entry, page_num, doc_page_num, entry_id) tuples.
+        year_variations: List; OCR variations of the catalogue year.
+        chunksize: Integer or None; number of clean entries per batch, or None for one batch.
+        counters: Dictionary or None; if given, main entry pattern hits (main_entries) and
+                  corrections applied are added to it.
+        corrections: CorrectionStore or None; manual corrections applied to the clean entries.
+
+    Yields:
+        main_entries: List; (entry, page_num, doc_page_num, entry_id) of the main entries
+                      found in one batch of clean entries.
+    """
+    # pub_date_pattern = fr"[A-ZÀ-ž][A-ZÀ-ž\.\s&,'\-]+,\W\w[^A-ZÀ-ž]+(?:\.|,)?\W{year_string}\.?$"
     pub_date_pattern = r"[A-ZÀ-ž][A-ZÀ-ž\.\s&,'\-]+,\W\w[^A-ZÀ-ž]+(?:\.|,)?\W{}\.?$".format('|'.join(year_variations))
+    pub_date_re = re.compile(pub_date_pattern)
 
-    main_entries = [entry for entry in clean_entries if re.search(pub_date_pattern, entry)]
+    clean_entries = iter(clean_entries)
+    if corrections is not None:
+        clean_entries = corrections.apply(clean_entries, counters)
 
-    print("\nMain entries:", len(main_entries))
-    
-    # sys.exit("Clean and main entries testing")
+    while True:
+        batch = list(islice(clean_entries, chunksize))
+
+        main_entries = [row for row in batch if pub_date_re.search(row[0])]
+
+        if counters is not None:
+            counters["main_entries"] = counters.get("main_entries", 0) + len(main_entries)
+
+        yield main_entries
+
+        if chunksize is None or len(batch) < chunksize:
+            break
+
+def read_clean_entries(file_path, catalogue_year, counters=None):
+    """
+    Read a clean entry file one entry at a time.
+
+    Arguments:
+        file_path: String; path to the clean entry file to be analyzed.
+        catalogue_year: String; catalogue year, e.g. "1912", for files without entry IDs.
+        counters: Dictionary or None; if given, clean entries read (entries_in) are added to it.
+
+    Yields:
+        clean_entry: Tuple; (entry, page_num, doc_page_num, entry_id). Page numbers are None
+                     when the file has no page columns; entry IDs are derived from the
+                     entries when the file has no entry_id column.
+    """
+    with open_text(file_path, mode="r", newline='') as f:
+        reader = csv.reader(f)
+
+        # Clean entry files have an entry header, and page_num, doc_page_num and entry_id
+        # columns when they were written with page numbers and IDs
+        header = next(reader, [])
+        page_columns = [header.index(column) if column in header else None
+                        for column in ("page_num", "doc_page_num")]
+        id_column = header.index(ENTRY_ID_COLUMN) if ENTRY_ID_COLUMN in header else None
+        rows = reader if header[:1] == ["entry"] else chain([header], reader)
+        seen_ids = {}
+
+        num_entries = 0
+        for row in rows:
+            # When reading through CSVs from /clean_entries, some rows begin and end with "
+            entry = row[0].replace("\"", "")
+            page_num, doc_page_num = (page_number(row, column) for column in page_columns)
+
+            if id_column is None:
+                entry_id = entry_ids([entry], [page_num], catalogue_year, seen_ids)[0]
+            else:
+                entry_id = row[id_column] if id_column < len(row) else None
+
+            num_entries += 1
+            yield entry, page_num, doc_page_num, entry_id
+
+    if counters is not None:
+        counters["entries_in"] = counters.get("entries_in", 0) + num_entries
+
+def page_number(row, column):
+    """
+    Integer page number in a clean entries row, or None if it is missing or, as
+    for rows added by hand to the corrected entries, not a number.
+    """
+    if column is None or column >= len(row):
+        return None
+    try:
+        return int(float(row[column]))
+    except ValueError:
+        return None
+
+def extract_entry_fields(main_entries, year_string, year_variations, start=0):
+    """
+    Repair common OCR errors in main entries and extract the creators, title,
+    format, price, publisher and date fields from them.
 
-    entries = pd.Series(main_entries)
+    Arguments:
+        main_entries: List; (entry, page_num, doc_page_num, entry_id) of the main entries to be analyzed.
+        year_string: String; represents what (19)year is being analyzed.
+        year_variations: List; OCR variations of the catalogue year.
+        start: Integer; index of the first entry, so that batches keep the
+               index they would have in a whole-year run.
+
+    Returns:
+        full_df: Pandas Dataframe; object that contains all extracted information from
+                 the main entries.
+    """
+    index = pd.RangeIndex(start, start + len(main_entries))
+    main_entries, page_nums, doc_page_nums, ids = zip(*main_entries) if main_entries else ((), (), (), ())
+    entries = pd.Series(list(main_entries), index=index)
 
     # Replace I with 1 when in close juncture with a number
     entries = entries.str.replace(r"I(\d)", "1\\1", regex=True)
@@ -98,85 +356,27 @@ def create_dataframes(file_path, year_string):
     full_df["middle"] = entry_fronts["middle"]
     full_df = full_df[["entry", "front", "creators", "is_editor", "middle", "publisher", "date", "catalogue_year"]]
 
-    # Substitute "Surname (Name1) and Surname (Name 2)" for "Surname (Name1 and 2)"
-    full_df["creators"] = full_df["creators"].str.replace(
-        r"([^()]+)\(([^)]+) and ([^)]+)\)", "\\1(\\2) and \\1(\\3)", regex=True
-    )
-
-    # Remove full cross-reference "see [other header]." expressions.
-    # Takes everything from "see" to the first period not in parenthesis.
-    full_df["creators"] = full_df["creators"].str.replace(
-        r"see.*\.(?![^(]*\))\s*", " and ", regex=True
-    )
-
-    # Get rid of any trailing ands.
-    full_df["creators"] = full_df["creators"].str.replace(r"\s+and\s+$", "", regex=True)
-
-    # Split each entry into a list of authors by " and " not in parenthesis.
-    full_df["creators"] = full_df["creators"].str.split(r"\s+(?:and)(?![^(]*\))\s+")
-    
-    # Get last name and first name column values.
-    head_names = full_df["creators"].apply(lambda x: x[0] if isinstance(x, list) else x)
-    head_names = head_names.str.extract(r"^(?P<last_name>[^()]+)\s\((?P<first_name>[^)]+)\)$")
-    full_df["last_name"] = head_names["last_name"]
-    full_df["first_name"] = head_names["first_name"]
-
-    # Get medial information
-    full_df["title"] = full_df["middle"].str.extract(
-        r"(?!^(?:No\.|Cr\.|Vo\.|fo\.|\d+\s?\}?\w|Illus\.|Ryl\.).*)"
-        + r"^[^\dA-ZÀ-ž]*([\dA-ZÀ-ž].+?)"
-        + r"(?:(?<!\W[A-ZÀ-ž]|No|id|pp)\.|"
-        + r"[,.]?\W(?=No\.|Cr\.|Vo\.|fo\.|\d+\s?\}?\w|Illus\.|Ryl\.))"
-    )
-
-    # Extract English Publishing Formats
-    full_df["format"] = full_df["middle"].str.extract(
-        r"\W(fo\.|\d+[tvm]o[,.]?)\W"
-    )
-
-    # Extract Price Information.
-    price_df = full_df["middle"].str.extract(
-        r"(?P<price>\d+s\.?,?\s*\d+d\.?,?|\d+s\.?,?|\d+d\.?,?)"
-        + r"\s*(?P<is_net>net)?"
-        + r"(?!.*\1)(?=(?:\s*\([^\)]+\))*[\s.]*$)"
-    )
-    full_df["price_dirty"] = price_df["price"]
-    full_df["is_net"] = price_df["is_net"]
-    full_df["price"] = full_df["price_dirty"].str.replace(r"([ds]),", "\\1.", regex=True)
-    full_df["price"] = full_df["price"].str.replace(r"s\.?\s+", "s. ", regex=True)
-    full_df["price"] = full_df["price"].str.strip(",\s")
+    # Split the creators into lists of authors, and get the last name and first
+    # name of the head author from the long table of creators
+    full_df["creators"] = split_creators(full_df["creators"])
+    names = head_names(creators_table(full_df["creators"]), full_df.index)
+    full_df["last_name"] = names["last_name"]
+    full_df["first_name"] = names["first_name"]
+
+    # Get medial information: title, English publishing format and price, in one pass
+    middle_df = middle_fields(full_df["middle"])
+    for field in MIDDLE_FIELDS:
+        full_df[field] = middle_df[field]
     # full_df["shillings"] = full_df["price"].str.extract(r"(\d+)s").fillna(0).astype(int)
     # full_df["pence"] = full_df["price"].str.extract(r"(\d+)d").fillna(0).astype(int)
     # full_df["price_in_pounds"] = full_df["pence"] / 240 + full_df["shillings"] / 20
 
-    full_df["original_entry"] = pd.Series(main_entries)
+    full_df["original_entry"] = pd.Series(list(main_entries), index=index)
+    full_df["page_num"] = pd.Series(page_nums, index=index, dtype="Int64")
+    full_df["doc_page_num"] = pd.Series(doc_page_nums, index=index, dtype="Int64")
+    full_df[ENTRY_ID_COLUMN] = pd.Series(list(ids), index=index)
     full_df["author_name"] = full_df["first_name"].str.cat(full_df["last_name"], sep=" ")
-    full_df = full_df[
-        [
-            "entry",
-            "last_name",
-            "first_name",
-            "title",
-            "publisher",
-            "price",
-            # "price_in_pounds",
-            "format",
-            "original_entry",
-            "author_name",
-            # new fields
-            "creators",
-            "is_editor",
-            "date",
-            "catalogue_year",
-            "is_net"
-        ]
-    ]
-
-    missing_publisher_df = full_df[full_df["publisher"].isna()]
-    total_missing_publisher = len(missing_publisher_df.index)
-    print(total_missing_publisher)
-
-    # sys.exit("Stop create_dataframes")
+    full_df = full_df[DATAFRAME_COLUMNS]
 
     return full_df
 
@@ -204,180 +404,259 @@ def save_dataframes(full_df, df_paths, verbose):
     """
     Create more subsidiary dataframes and measures, and save to the /dataframes/ directory.
 
+    The missing-field categories (missing_first_name, missing_format, ..., clean_dataframe,
+    missing_title_and_publisher) are no longer written as separate CSVs: the full
+    dataframe is written once with a missing_fields bitmask column, see missing_fields.py
+    for filtered views of each category.
+
     Arguments:
         full_df: Pandas Dataframe; object that contains all extracted information from all of the 
                  clean_entries.
         df_paths: Array; object that contains all target CSV and txt file paths.
+        verbose: Boolean; If true, prints out metrics into CLI.
     """
 
     full_df_path = df_paths[0]
-    missing_first_df_path = df_paths[1]
-    missing_format_df_path = df_paths[2]
-    missing_last_df_path = df_paths[3]
-    missing_price_df_path = df_paths[4]
-    missing_publisher_df_path = df_paths[5]
-    missing_title_df_path = df_paths[6]
-    clean_df_path = df_paths[7]
     full_data_measures_path = df_paths[8]
-    missing_title_and_publisher_path = df_paths[9]
-
-    catalogue_year = full_df["catalogue_year"][1]
 
-    total_full = len(full_df.index)
-    full_df.to_csv(full_df_path, index=False)
+    catalogue_year = full_df["catalogue_year"].iloc[0]
 
-    # missing_first_name_df = full_df[full_df["first_name"].isna()]
-    # total_missing_first_name = len(missing_first_name_df.index)
-    # percent_missing_first_name = total_missing_first_name / total_full
-    # missing_first_name_df.to_csv(missing_first_df_path, index=False)
+    # One vectorised pass over the tracked columns
+    mask = missing_field_mask(full_df)
+    full_df = full_df.assign(**{MISSING_FIELDS_COLUMN: mask})
+    restore_csv_columns(full_df).to_csv(full_df_path, index=False)
 
-    # missing_format_df = full_df[full_df["format"].isna()]
-    # total_missing_format = len(missing_format_df.index)
-    # percent_missing_format = total_missing_format / total_full
-    # missing_format_df.to_csv(missing_format_df_path, index=False)
+    measures = missing_field_measures(pattern_counts(mask))
+    write_dataframe_measures(measures, full_data_measures_path)
 
-    # missing_last_name_df = full_df[full_df["last_name"].isna()]
-    # total_missing_last_name = len(missing_last_name_df.index)
-    # percent_missing_last_name = total_missing_last_name / total_full
-    # missing_last_name_df.to_csv(missing_last_df_path, index=False)
-
-    # missing_price_df = full_df[full_df["price"].isna()]
-    # total_missing_price = len(missing_price_df.index)
-    # percent_missing_price = total_missing_price / total_full
-    # missing_price_df.to_csv(missing_price_df_path, index=False)
+    if verbose:
+        print_dataframe_measures(measures, catalogue_year)
 
-    # missing_publisher_df = full_df[full_df["publisher"].isna()]
-    # total_missing_publisher = len(missing_publisher_df.index)
-    # percent_missing_publisher = total_missing_publisher / total_full
-    # missing_publisher_df.to_csv(missing_publisher_df_path, index=False)
+def print_dataframe_measures(measures, catalogue_year):
+    """
+    Print missing-field measures into the CLI.
 
-    # missing_title_df = full_df[full_df["title"].isna()]
-    # total_missing_title = len(missing_title_df.index)
-    # percent_missing_title = total_missing_title / total_full
-    # missing_title_df.to_csv(missing_title_df_path, index=False)
+    Arguments:
+        measures: Dictionary; output of missing_field_measures.
+        catalogue_year: Integer; catalogue year of the measured dataframe.
+    """
+    for category, label in MEASURE_LABELS.items():
+        total, percent = measures[category]
+        print(f"Total {label} Rows: {total}")
+        print(f"Percent {label} Rows: {percent}")
+    print(f"Total Dataframe Rows: {measures['full']}")
+    print(f"Catalogue Year: {catalogue_year}")
+
+def save_dataframe_chunks(df_chunks, df_paths, verbose, counters=None):
+    """
+    Streaming version of save_dataframes: appends each dataframe chunk to the full
+    dataframe CSV as it is produced, so that the whole year is never held in memory.
 
-    # # Filter for Rows with No Null Values in Any Column
-    # clean_df = full_df[full_df["publisher"].notnull() & full_df["title"].notnull()]
-    # total_clean = len(clean_df.index)
-    # percent_clean = total_clean / total_full
-    # clean_df.to_csv(clean_df_path)
+    Arguments:
+        df_chunks: Iterable; Pandas Dataframes, e.g. from iter_dataframes.
+        df_paths: Array; object that contains all target CSV and txt file paths.
+        verbose: Boolean; If true, prints out metrics into CLI.
+        counters: Dictionary or None; if given, filled with row counts instead of printing them.
+    """
+    full_df_path = df_paths[0]
+    full_data_measures_path = df_paths[8]
 
-    # missing_title_and_publisher = full_df[full_df["publisher"].isnull() | full_df["title"].isnull()]
-    # missing_title_and_publisher.to_csv(missing_title_and_publisher_path)
+    counts = np.zeros(NUM_PATTERNS, dtype=np.int64)
+    catalogue_year = None
+    written = False
+    for full_df in df_chunks:
+        if full_df.empty:
+            continue
+        full_df = apply_dtype_plan(full_df)
+        mask = missing_field_mask(full_df)
+        full_df = full_df.assign(**{MISSING_FIELDS_COLUMN: mask})
+
+        restore_csv_columns(full_df).to_csv(full_df_path, index=False,
+                                            mode="a" if written else "w",
+                                            header=not written)
+        written = True
+        counts += pattern_counts(mask)
+        catalogue_year = full_df["catalogue_year"].iloc[0]
+
+    # A year without main entries still replaces the dataframe of the previous run
+    if not written:
+        pd.DataFrame(columns=DATAFRAME_COLUMNS + [MISSING_FIELDS_COLUMN]).to_csv(full_df_path, index=False)
+
+    measures = missing_field_measures(counts)
+    write_dataframe_measures(measures, full_data_measures_path)
+
+    if counters is None:
+        print("\nMain entries:", measures["full"])
+        print(measures["publisher"][0])
+    else:
+        counters["missing_publisher"] = measures["publisher"][0]
+        counters["entries_out"] = measures["full"]
 
     if verbose:
-        # print(f"Total Missing First Name Rows: {total_missing_first_name}")
-        # print(f"Percent Missing First Name Rows: {percent_missing_first_name}")
-        # print(f"Total Missing Last Name Rows: {total_missing_last_name}")
-        # print(f"Percent Missing Last Name Rows: {percent_missing_last_name}")
-        # print(f"Total Missing Format Rows: {total_missing_format}")
-        # print(f"Percent Missing Format Rows: {percent_missing_format}")
-        # print(f"Total Missing Price Rows: {total_missing_price}")
-        # print(f"Percent Missing Price Rows: {percent_missing_price}")
-        # print(f"Total Missing Publisher Rows: {total_missing_publisher}")
-        # print(f"Percent Missing Publisher Rows: {percent_missing_publisher}")
-        # print(f"Total Missing Title Rows: {total_missing_title}")
-        # print(f"Percent Missing Title Rows: {percent_missing_title}")
-        # print(f"Total Clean Dataframe Rows: {total_clean}")
-        # print(f"Percent Clean Dataframe Rows: {percent_clean}")
-        print(f"Total Dataframe Rows: {total_full}")
-        print(f"Catalogue Year: {catalogue_year}")
-
-    # with open(full_data_measures_path, "w", newline='', encoding="utf-8", errors="ignore") as f:
-    #     f.write(f"Total Missing First Name Rows: {total_missing_first_name}\n")
-    #     f.write(f"Percent Missing First Name Rows: {percent_missing_first_name}\n\n")
-    #     f.write(f"Total Missing Last Name Rows: {total_missing_last_name}\n")
-    #     f.write(f"Percent Missing Last Name Rows: {percent_missing_last_name}\n\n")
-    #     f.write(f"Total Missing Format Rows: {total_missing_format}\n")
-    #     f.write(f"Percent Missing Format Rows: {percent_missing_format}\n\n")
-    #     f.write(f"Total Missing Price Rows: {total_missing_price}\n")
-    #     f.write(f"Percent Missing Price Rows: {percent_missing_price}\n\n")
-    #     f.write(f"Total Missing Publisher Rows: {total_missing_publisher}\n")
-    #     f.write(f"Percent Missing Publisher Rows: {percent_missing_publisher}\n\n")
-    #     f.write(f"Total Missing Title Rows: {total_missing_title}\n")
-    #     f.write(f"Percent Missing Title Rows: {percent_missing_title}\n\n")
-    #     f.write(f"Total Clean Dataframe Rows: {total_clean}\n")
-    #     f.write(f"Percent Clean Dataframe Rows: {percent_clean}\n\n")
-    #     f.write(f"Total Dataframe Rows: {total_full}")
+        print_dataframe_measures(measures, catalogue_year)
     
-if __name__ == "__main__":
+def save_dataframe_delta(previous_digests, df_paths, counters=None):
+    """
+    Write the delta between the full dataframe CSV just written and the previous one.
 
-    # Parse args
-    args = argparse_create((sys.argv[1:]))
-    verbose_string = args.verbose
-    if verbose_string == "True":
-        verbose = True
-    else:
-        verbose = False
+    Arguments:
+        previous_digests: Pandas Series or None; file_digests of the previous full dataframe CSV.
+        df_paths: Array; object that contains all target CSV and txt file paths.
+        counters: Dictionary or None; if given, filled with the delta sizes.
+    """
+    delta = compute_delta(previous_digests, file_digests(df_paths[0]))
+    write_delta(delta, df_paths[10])
+    if counters is not None:
+        counters.update(delta_counters(delta))
+
+def get_clean_entries_file_path(year_string, cwd_path):
+    """
+    Gets the clean entries CSV a year's dataframes are built from. 1918 and 1919
+    are read from /entries/clean_entries/; other years use their hand corrected
+    entries, falling back to /entries/clean_entries/ where none exist yet. Either
+    may be kept gzip, zstd or xz compressed.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
 
+    Returns:
+        file_path: String; clean entries CSV full file path.
+    """
     # Iterate through Clean Entries Folder
     folder_path = '/entries/clean_entries/'
     manually_corrected_folder_path = 'entries/corrected_entries/'
 
-    # Only cover years 1902 and 1922
-    for year in tqdm(range(12,22)):
-        if year < 10:
-            year = "0" + str(year)
-        
-    # Get appropriate paths.
+    file_name = "entries_19" + year_string + ".csv"
+    clean_file_path = resolve_path(cwd_path + os.path.join(folder_path, file_name))
 
-        year_string = str(year)
-        file_name = "entries_19" + str(year) + ".csv" 
-        cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    if int(year_string) in (18, 19):
+        return clean_file_path
 
-        if year == 18 or year == 19:
-            file_path = cwd_path + os.path.join(folder_path, file_name)
-        else:
-            file_path = cwd_path + os.path.join(manually_corrected_folder_path, file_name)
-            
+    corrected_file_path = resolve_path(cwd_path + os.path.join(manually_corrected_folder_path, file_name))
+    if os.path.exists(corrected_file_path):
+        return corrected_file_path
+    return clean_file_path
 
-        dataframe_from_hand_corrected_csv_directory = "/dataframe_from_hand_corrected_csv/"
-        dataframe_from_hand_corrected_csv_path = f"{cwd_path}/dataframes/{dataframe_from_hand_corrected_csv_directory}/df_19{year_string}.csv"
+def get_dataframe_paths(year_string, cwd_path, compression=None):
+    """
+    Gets the output paths of a year's dataframes, in the order save_dataframes expects.
 
-        full_dataframe_directory = "/full_dataframe/"
-        full_df_path = f"{cwd_path}/dataframes/{full_dataframe_directory}/df_19{year_string}.csv"
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        compression: String or None; compression of the full dataframe CSV, see
+                     compressed_io.output_path. By default it is the variant on disk.
 
-        missing_first_dataframe_directory = "/missing_first_name/"
-        missing_first_df_path = f"{cwd_path}/dataframes/{missing_first_dataframe_directory}/df_19{year_string}.csv"
-        
-        missing_format_dataframe_directory = "/missing_format/"
-        missing_format_df_path = f"{cwd_path}/dataframes/{missing_format_dataframe_directory}/df_19{year_string}.csv"
+    Returns:
+        df_paths: array; dataframe CSV paths, with the dataframe measures path at index 8
+                  and the dataframe delta path at index 10.
+    """
+    dataframe_from_hand_corrected_csv_directory = "/dataframe_from_hand_corrected_csv/"
+    dataframe_from_hand_corrected_csv_path = f"{cwd_path}/dataframes/{dataframe_from_hand_corrected_csv_directory}/df_19{year_string}.csv"
 
-        missing_last_dataframe_directory = "/missing_last_name/"
-        missing_last_df_path = f"{cwd_path}/dataframes/{missing_last_dataframe_directory}/df_19{year_string}.csv"
+    missing_first_dataframe_directory = "/missing_first_name/"
+    missing_first_df_path = f"{cwd_path}/dataframes/{missing_first_dataframe_directory}/df_19{year_string}.csv"
+    
+    missing_format_dataframe_directory = "/missing_format/"
+    missing_format_df_path = f"{cwd_path}/dataframes/{missing_format_dataframe_directory}/df_19{year_string}.csv"
 
-        missing_price_dataframe_directory = "/missing_price/"
-        missing_price_df_path = f"{cwd_path}/dataframes/{missing_price_dataframe_directory}/df_19{year_string}.csv"
+    missing_last_dataframe_directory = "/missing_last_name/"
+    missing_last_df_path = f"{cwd_path}/dataframes/{missing_last_dataframe_directory}/df_19{year_string}.csv"
 
-        missing_publisher_dataframe_directory = "/missing_publisher/"
-        missing_publisher_df_path = f"{cwd_path}/dataframes/{missing_publisher_dataframe_directory}/df_19{year_string}.csv"
+    missing_price_dataframe_directory = "/missing_price/"
+    missing_price_df_path = f"{cwd_path}/dataframes/{missing_price_dataframe_directory}/df_19{year_string}.csv"
 
-        missing_title_dataframe_directory = "/missing_title/"
-        missing_title_df_path = f"{cwd_path}/dataframes/{missing_title_dataframe_directory}/df_19{year_string}.csv"
+    missing_publisher_dataframe_directory = "/missing_publisher/"
+    missing_publisher_df_path = f"{cwd_path}/dataframes/{missing_publisher_dataframe_directory}/df_19{year_string}.csv"
 
-        clean_dataframe_directory = "/clean_dataframe/"
-        clean_df_path = f"{cwd_path}/dataframes/{clean_dataframe_directory}/df_19{year_string}.csv"
+    missing_title_dataframe_directory = "/missing_title/"
+    missing_title_df_path = f"{cwd_path}/dataframes/{missing_title_dataframe_directory}/df_19{year_string}.csv"
 
-        full_data_measures_directory = "dataframe_measures"
-        full_data_measures_path = f"{cwd_path}/dataframes/{full_data_measures_directory}/df_measures_19{year_string}.txt"
+    clean_dataframe_directory = "/clean_dataframe/"
+    clean_df_path = f"{cwd_path}/dataframes/{clean_dataframe_directory}/df_19{year_string}.csv"
 
-        missing_title_and_publisher_directory = "missing_title_and_publisher_dataframes"
-        missing_title_and_publisher_path = f"{cwd_path}/dataframes/{missing_title_and_publisher_directory}/df_measures_19{year_string}.csv"
+    full_data_measures_directory = "dataframe_measures"
+    full_data_measures_path = f"{cwd_path}/dataframes/{full_data_measures_directory}/df_measures_19{year_string}.txt"
 
-        df_paths = [dataframe_from_hand_corrected_csv_path,
-                    #full_df_path, 
-                    missing_first_df_path,
-                    missing_format_df_path,
-                    missing_last_df_path,
-                    missing_price_df_path,
-                    missing_publisher_df_path,
-                    missing_title_df_path,
-                    clean_df_path,
-                    full_data_measures_path,
-                    missing_title_and_publisher_path]
-        
-        # Create dataframes
-        full_df = create_dataframes(file_path, year_string)
+    missing_title_and_publisher_directory = "missing_title_and_publisher_dataframes"
+    missing_title_and_publisher_path = f"{cwd_path}/dataframes/{missing_title_and_publisher_directory}/df_measures_19{year_string}.csv"
+
+    dataframe_deltas_directory = "dataframe_deltas"
+    dataframe_delta_path = f"{cwd_path}/dataframes/{dataframe_deltas_directory}/df_delta_19{year_string}.json"
+
+    return [output_path(dataframe_from_hand_corrected_csv_path, compression),
+            missing_first_df_path,
+            missing_format_df_path,
+            missing_last_df_path,
+            missing_price_df_path,
+            missing_publisher_df_path,
+            missing_title_df_path,
+            clean_df_path,
+            full_data_measures_path,
+            missing_title_and_publisher_path,
+            dataframe_delta_path]
 
-        # Save dataframes (and relevant dataframe measures)
-        save_dataframes(full_df, df_paths, verbose)
\ No newline at end of file
+def create_year_dataframes(year_string, cwd_path, verbose, recorder, chunksize=None, compression=None):
+    """
+    Creates and saves one year's dataframes (and dataframe measures).
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        verbose: Boolean; If true, prints out metrics into CLI.
+        recorder: RunRecorder; records the "dataframes" and "save_dataframes" stages.
+        chunksize: Integer or None; if given, streams the year in batches of this many entries.
+        compression: String or None; compression of the full dataframe CSV, see compressed_io.output_path.
+    """
+    file_path = get_clean_entries_file_path(year_string, cwd_path)
+    df_paths = get_dataframe_paths(year_string, cwd_path, compression)
+    output_paths = [df_paths[0], df_paths[8], df_paths[10]]
+
+    # Manual corrections are applied while the clean entries are read
+    corrections_path = get_corrections_path(year_string, cwd_path)
+    corrections = read_corrections(corrections_path)
+    input_paths = [file_path] if corrections is None else [file_path, corrections_path]
+
+    # Compare the dataframe with the previous run's (in whichever format it was kept)
+    # by entry ID once it is written
+    previous_digests = file_digests(resolve_path(df_paths[0]))
+    remove_stale_variants(df_paths[0])
+
+    # Stream dataframes in fixed-size batches straight to disk
+    if chunksize:
+        with recorder.stage(year_string, "dataframes", input_paths=input_paths,
+                            output_paths=output_paths) as counters:
+            df_chunks = iter_dataframes(file_path, year_string, chunksize, counters, corrections)
+            save_dataframe_chunks(df_chunks, df_paths, verbose, counters)
+            save_dataframe_delta(previous_digests, df_paths, counters)
+        return
+
+    # Create dataframes
+    with recorder.stage(year_string, "dataframes", input_paths=input_paths) as counters:
+        full_df = create_dataframes(file_path, year_string, counters, corrections)
+
+        # Convert to the memory-lean dtype plan
+        lean_df = apply_dtype_plan(full_df)
+        if verbose:
+            print(memory_usage_report(full_df, lean_df))
+        full_df = lean_df
+
+    # Save dataframes (and relevant dataframe measures)
+    with recorder.stage(year_string, "save_dataframes", output_paths=output_paths) as counters:
+        save_dataframes(full_df, df_paths, verbose)
+        save_dataframe_delta(previous_digests, df_paths, counters)
+        counters["entries_in"] = len(full_df.index)
+
+if __name__ == "__main__":
+
+    # Parse args
+    args = argparse_create((sys.argv[1:]))
+    verbose = args.verbose == "True"
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    recorder = RunRecorder(os.path.join(cwd_path, args.metrics), verbose)
+
+    # Only cover years 1912 and 1921
+    for year in tqdm(range(12,22)):
+        create_year_dataframes(f"{year:02d}", cwd_path, verbose, recorder, args.chunksize, args.compression)
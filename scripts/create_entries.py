@@ -5,6 +5,14 @@ import sys
 from tqdm import tqdm
 import argparse
 import pandas as pd
+from compressed_io import COMPRESSION_CHOICES, open_text, output_path, read_text, remove_stale_variants, resolve_path
+from instrumentation import RunRecorder, entries_measures_counters, format_entries_measures
+from entry_ids import ENTRY_ID_COLUMN, compute_delta, delta_counters, file_digests, write_delta
+from reconcile_ocr import OCR_SOURCES, get_reconciled_paths
+from entry_spans import (FLAG_FRONT_TRUNC, FLAG_LINE_MID, EntryTexts, flag_front_trunc, flag_line_mid,
+                         split_line_mid)
+from page_cache import PAGE_CACHE_PATH, PageCache, tag_pages
+from entry_density import check_entry_density
 
 def argparse_create(args):
     """
@@ -23,6 +31,24 @@ def argparse_create(args):
             help="Prints out clean entry metrics into the CLI.",
             default="False")
 
+    parser.add_argument("--compression", type=str, choices=COMPRESSION_CHOICES,
+            help="Compression of the entry and dataframe CSVs written. By default each output "
+                 "keeps the format it already has on disk.",
+            default=None)
+
+    parser.add_argument("--ocr-source", type=str, choices=OCR_SOURCES,
+            help="OCR file segmented: the file selected for each year, or the merge of both "
+                 "OCR sources written by reconcile_ocr.py.",
+            default="selected")
+
+    parser.add_argument("--page-cache", type=str,
+            help="SQLite file, relative to the repository root, that header-stripped and tagged "
+                 "pages are cached in. An empty string disables the cache.",
+            default=PAGE_CACHE_PATH)
+
+    parser.add_argument("--metrics", type=str,
+            help="JSON lines file, relative to the repository root, that per-stage run metrics are appended to.",
+            default="metrics/pipeline_metrics.jsonl")
 
     # Parse arguments.
     parsed_args = parser.parse_args(args)
@@ -59,27 +85,68 @@ def get_splitters_by_year(year):
 
     return patternFrontDict[year], appendixPatternDict[year], yearPatterns[year]
 
-def get_clean_entries(year_string, file_path, pattern, verbose):
+def get_header_patterns(year_string):
+    """
+    Gets the page header patterns removed from every page before segmentation.
+
+    Arguments:
+        year_string: String; string representation of year.
+
+    Returns:
+        header_patterns: array; raw regex strings.
+    """
+    # Define multiple header patterns
+    header_patterns = [
+        r"(^\b[A-Z ]+\b\s?\n)",  # Capital heading pattern
+        r"(##(?s:.*?)$)",  # Page number pattern
+        r"(^.?19{}.?\n)".format(year_string), # Header year pattern
+        r"(^\d+\n)", # Random page numbers
+    ]
+
+    return header_patterns
+
+def get_clean_entries(year_string, file_path, pattern, verbose, counters=None, page_cache=None):
+    """
+    Gets clean entries from a single new_text_files OCR file's year, with the clean
+    entries as a dataframe of entry, page_num, doc_page_num and entry_id.
+
+    Arguments and returns are those of segment_entries, except that clean_entries
+    is a dataframe containing entries and few categories.
     """
-    Gets clean entries from a single new_text_files OCR file's year.
+    full_entries, clean_entries, clean_entries_measures, line_mid_entries, front_trunc_entries = segment_entries(
+        year_string, file_path, pattern, verbose, counters, page_cache)
+
+    _, _, year_variations = get_splitters_by_year(year_string)
+    clean_entries_df = create_dataframe_from_clean_enties(clean_entries, year_variations, "19" + year_string)
+
+    return full_entries, clean_entries_df, clean_entries_measures, line_mid_entries, front_trunc_entries
+
+def segment_entries(year_string, file_path, pattern, verbose, counters=None, page_cache=None):
+    """
+    Segments a single new_text_files OCR file's year into entries.
 
     Arguments:
         year_string: String; string representation of year.
         file_path: String; new_text_files OCR full file path.
         pattern: Raw String; header pattern string.
         verbose: Boolean; If true, prints out metrics into CLI, and if false, does not print out entries.
+        counters: Dictionary or None; if given, filled with page and regex hit counts for
+                  instrumentation.
+        page_cache: PageCache or None; if given, header-stripped and tagged pages are
+                    reused from and stored in it, see page_cache.py.
     
     Returns:
-        full_entries: array; object containing all entries.
-        clean_entries: array; object containing clean entries.
+        full_entries: EntryTexts; object containing all entries.
+        clean_entries: EntryTexts; object containing the entries that are not front truncated.
         clean_entries_measures: array; object containing clean entries measures.
-        line_mid_entries: array; object containing entries with dates in the middle.
-        front_trunc_entries: array; object containing entries with front truncation.
+        line_mid_entries: EntryTexts; object containing entries with dates in the middle.
+        front_trunc_entries: EntryTexts; object containing entries with front truncation.
+
+    Entries are spans over one buffer of header-stripped pages (see entry_spans.py);
+    their text is only built when they are written out.
     """
-    # Get file contents
-    infile = open(file_path, "r", encoding="utf-8", errors="ignore")
-    contents = infile.read()
-    infile.close()
+    # Get file contents, decompressing gzip, zstd or xz files
+    contents = read_text(file_path)
     
     if verbose:
         print("CATALOGUE YEAR:", year_string, "\n")
@@ -109,25 +176,16 @@ def get_clean_entries(year_string, file_path, pattern, verbose):
     # Get pages
     ecb_pages = ecb_content.split("\f")
     
-    # Apply the function to each page
-    ecb_pe = [remove_patterns(page, pattern) for page in ecb_pages]
+    entry_terminator_regex = re.compile(r'(\W({})\.?$)'.format('|'.join(year_variations)), flags=re.M)
 
-    entry_terminator_regex = r'(\W({})\.?$)'.format('|'.join(year_variations))
-    
-    #split up into entires and modify each entry with catalogue page number and document page number 
-    ecb_pe = [re.sub(entry_terminator_regex, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>".format(i, i+document_page_delta), page, flags=re.M) for i, page in enumerate(ecb_pe, start=1)]
-    
-    # replace year variations with correct year
-    # ecb_pe = [re.sub(entry_terminator_regex, " {}<ENTRY_CUT>".format(year_string), page, flags=re.M) for page in ecb_pe]
+    # Remove the header patterns from each page and split it up into entries: spans over
+    # the page buffer, with the catalogue page number and where the terminator starts.
+    # Pages already in the page cache are not processed again
+    ecb_pe, spans, terminator_hits = tag_pages(ecb_pages, lambda page: remove_patterns(page, pattern),
+                                               entry_terminator_regex, document_page_delta,
+                                               page_cache, pattern, counters)
 
-    #split on year
-    ecb_pe = [re.split(r"<ENTRY_CUT>", page, flags=re.M) for page in ecb_pe]
-
-    entries = [
-        re.sub(r"\n", " ", entry.strip()) for entries in ecb_pe for entry in entries
-    ]
-
-    total_entries = len(entries)
+    total_entries = len(spans)
 
     if verbose:
         print(f"Total Entries: {total_entries}")
@@ -146,57 +204,45 @@ def get_clean_entries(year_string, file_path, pattern, verbose):
         "Nov",
         "Dec",
     ]
+    months = "|".join(month_abbrvs)
 
-    line_mid_re = re.compile(r".*({})\.?\W{}\.?[^\.]+".format("|".join(month_abbrvs),year))
-    line_mid_entries = [entry for entry in entries if line_mid_re.search(entry)]
+    # A month and year followed by more text; for entries that have a terminator,
+    # the terminator counts as the text that follows
+    line_mid_re = re.compile(r"({})\.?\W{}\.?[^\.]".format(months, year_string))
+    line_mid_marked_re = re.compile(r"({})\.?\W{}\.?(?:[^\.]|$)".format(months, year_string))
+    flag_line_mid(ecb_pe, spans, line_mid_marked_re, line_mid_re)
+    line_mid_entries = EntryTexts(ecb_pe, spans[(spans["flags"] & FLAG_LINE_MID) != 0])
 
     len_line_mid_entries = len(line_mid_entries)
-    percent_line_mid_entries = len(line_mid_entries) / len(entries)
+    percent_line_mid_entries = len(line_mid_entries) / len(spans)
 
     if verbose:
         print(f"\nTotal Line Mid Entries: {len_line_mid_entries}")
         print(f"Percent Line Mid Entries: {percent_line_mid_entries}")
 
     # Corrects line mid entries by splitting entries using month + year regex pattern
-    
-    split_line_mid_re = re.compile(r"(({})\.?\W{}\.?(?!$))".format("|".join(month_abbrvs), year))
-    line_mid_index = [entries.index(entry) for entry in line_mid_entries]
-
-    counter = 0
-    for index in line_mid_index:
-        match = re.search(r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>", entries[index + counter])
-        if match:
-            page_num, document_page_num = match.group(1), match.group(2)
-            entries[index + counter] = re.sub(split_line_mid_re, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>\\1<ENTRY_CUT>".format(page_num, document_page_num), entries[index + counter])
-        else:
-            print("main is empty, here's the index", index+counter)
-            entries[index + counter] = re.sub(split_line_mid_re, "\\1<ENTRY_CUT>", entries[index + counter])
-        new_entry = re.split(r"<ENTRY_CUT>", entries[index + counter], flags=re.M)
-        new_entry[1] = re.sub(r"^\W+(?=[A-Z])", "", new_entry[1])
-        entries[index + counter] = new_entry[1]
-        entries.insert(index + counter, new_entry[0])
-        counter += 1
-
-    new_total_entries = len(entries)
+    split_line_mid_re = re.compile(r"(({})\.?\W{}\.?(?!$))".format(months, year_string))
+    split_line_mid_marked_re = re.compile(r"(({})\.?\W{}\.?)".format(months, year_string))
+    spans, missing_page_marker = split_line_mid(ecb_pe, spans, split_line_mid_marked_re,
+                                                split_line_mid_re, re.compile(r"\W+(?=[A-Z])"))
+
+    new_total_entries = len(spans)
 
     if verbose:
         print(f"\nNew Total Entries After Line Mid Correction: {new_total_entries}")
 
-    # Finds truncated entries: entries with length <25 characters and entries that don't begin with a capital letter
+    # Compare the entries per page with the publication page counts
+    check_entry_density(year_string, "segment", spans["page"], spans["page"][spans["cut"] >= 0],
+                        len(ecb_pages), counters)
 
-    truncated_entry_regex_patterns = [
-        "^\s+",
-        "^[^A-Za-z0-9]*$"
-        # "^.{0,25}$",
-        # "^[^A-ZÆÅ\"“]"
-    ]
-
-    front_trunc_re = re.compile(r'({})'.format('|'.join(truncated_entry_regex_patterns)))
-
-    front_trunc_entries = [entry for entry in entries if front_trunc_re.search(entry)]
+    # Finds truncated entries: entries that begin with whitespace and entries without
+    # letters or digits
+    flag_front_trunc(ecb_pe, spans)
+    front_trunc = (spans["flags"] & FLAG_FRONT_TRUNC) != 0
+    front_trunc_entries = EntryTexts(ecb_pe, spans[front_trunc])
     
     len_front_trunc_entries = len(front_trunc_entries)
-    percent_front_trunc_entries = len(front_trunc_entries) / len(entries)
+    percent_front_trunc_entries = len(front_trunc_entries) / len(spans)
 
     if verbose:
         print(f"\nTotal Trunc Entries: {len_front_trunc_entries}")
@@ -206,18 +252,13 @@ def get_clean_entries(year_string, file_path, pattern, verbose):
 
     # extracts clean entries from full entries by checking if entry is 
     # front truncated or line mid (latter check no longer necessary after fix)
-        
-    clean_entries = [
-        entry
-        for entry in entries
-        if not front_trunc_re.search(entry)
-    ]
+    clean_entries = EntryTexts(ecb_pe, spans[~front_trunc])
     len_clean_entries = len(clean_entries)
 
     if verbose:
         print(f"\nTotal Clean Entries: {len_clean_entries}")
 
-    percent_clean_entries = len_clean_entries / len(entries)
+    percent_clean_entries = len_clean_entries / len(spans)
 
     if verbose:
         print(f"Percent Clean Entries: {percent_clean_entries}")
@@ -225,26 +266,29 @@ def get_clean_entries(year_string, file_path, pattern, verbose):
     clean_entries_measures = [len_line_mid_entries, percent_line_mid_entries, 
                               len_front_trunc_entries, percent_front_trunc_entries, 
                                 len_clean_entries, percent_clean_entries, 
-                                new_total_entries]
-    
-    clean_entries_df = create_dataframe_from_clean_enties(clean_entries, year_variations)
-
-    return entries, clean_entries_df, clean_entries_measures, line_mid_entries, front_trunc_entries
-
-def create_dataframe_from_clean_enties(clean_entries, year_variations):
-    entries = pd.Series(clean_entries)
+                                new_total_entries, total_entries]
+
+    if counters is not None:
+        counters.update({
+            "entries_out": new_total_entries,
+            "pages": len(ecb_pages),
+            "terminator_hits": terminator_hits,
+            "line_mid_hits": len_line_mid_entries,
+            "line_mid_missing_page_marker": missing_page_marker,
+            "front_trunc_hits": len_front_trunc_entries,
+        })
+        counters.update(entries_measures_counters(clean_entries_measures))
+
+    return EntryTexts(ecb_pe, spans), clean_entries, clean_entries_measures, line_mid_entries, front_trunc_entries
+
+def create_dataframe_from_clean_enties(clean_entries, year_variations, catalogue_year):
+    clean_entries_df = clean_entries.to_frame(catalogue_year)
+    entries = clean_entries_df["entry"]
+    pages = clean_entries_df["page_num"]
+    document_pages = clean_entries_df["doc_page_num"]
 
     df = pd.DataFrame()
 
-    page_data = entries.str.extract(r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>")
-    pages = page_data[0]
-    document_pages = page_data[1]
-
-    if not (len(pages) == len(document_pages) == len(entries)):
-        raise ValueError("pages, document_pages, and entries not same length")
-
-    entries = entries.str.replace("<PAGE_NUM:[0-9]{0,3}><DOCUMENT_PAGE_NUM:[0-9]{0,3}>", "", regex=True)
-
     pub_date_pattern = fr"[A-ZÀ-ž][A-ZÀ-ž\.\s&,'\-]+,\W\w[^A-ZÀ-ž]+(?:\.|,)?\W({'|'.join(year_variations)})\.?$"
     
     # pub_pattern_for_doubling is pub_date_pattern without the "$" end of line check so we can check for two publishers
@@ -312,8 +356,9 @@ def create_dataframe_from_clean_enties(clean_entries, year_variations):
 
     #Set columns
     df["entry"] = entries
-    # df["page_num"] = pages
-    # df["doc_page_num"] = document_pages
+    df["page_num"] = pages
+    df["doc_page_num"] = document_pages
+    df[ENTRY_ID_COLUMN] = clean_entries_df[ENTRY_ID_COLUMN]
     # df["main_entry"] = main_entries
     # # df["flagged"] = flag_for_manual_correction
     # df["two_publishers"] = two_publishers
@@ -326,6 +371,25 @@ def create_dataframe_from_clean_enties(clean_entries, year_variations):
 
     return df
 
+def write_entries_csv(entries, path, catalogue_year=None):
+    """
+    Write entries to a CSV file: with entry, page_num, doc_page_num and entry_id
+    columns for entries from get_clean_entries, one entry per row otherwise.
+
+    Arguments:
+        entries: EntryTexts or array; entries to write.
+        path: String; target CSV file path; a .gz, .zst or .xz suffix compresses it.
+        catalogue_year: String or None; catalogue year the entry IDs are derived from.
+    """
+    if isinstance(entries, EntryTexts):
+        entries.to_frame(catalogue_year).to_csv(path, index=False, encoding="utf-8", quotechar='"')
+        return
+
+    with open_text(path, "w", newline='') as f:
+        csv_writer = csv.writer(f, quotechar='"')
+        for entry in entries:
+            csv_writer.writerow([entry])
+
 def clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entries_measures, 
                                       line_mid_entries, front_trunc_entries,
                                       year_string, cwd_path, full_entries_directory,
@@ -333,18 +397,18 @@ def clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entr
                                       clean_entries_measures_directory,
                                       front_trunc_entries_directory,
                                       line_mid_entries_directory,
-                                      pattern = ""):
+                                      pattern = "", compression=None):
     """
     Prints clean entries from a single new_text_files OCR file's year to a CSV file and
     prints clean entries measures from a single new_text_files OCR file's year to a text
     file.
 
     Arguments:
-        full_entries: array; object containing all entries.
+        full_entries: EntryTexts or array; object containing all entries.
         clean_entries_df: dataframe containing entries and few categories.
         clean_entries_measures: array; object containing clean entries measures.
-        line_mid_entries: array; object containing entries with dates in the middle.
-        front_trunc_entries: array; object containing entries with front truncation.
+        line_mid_entries: EntryTexts or array; object containing entries with dates in the middle.
+        front_trunc_entries: EntryTexts or array; object containing entries with front truncation.
         year_string: String; string representation of year.
         cwd_path: String; current working directory path.
         full_entries_directory: String; full_entries directory.
@@ -353,6 +417,7 @@ def clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entr
         line_mid_entries_directory: String; clean entries directory.
         front_trunc_entries_directory: String; clean entries directory.
         pattern: Raw String; header pattern string.
+        compression: String or None; compression of the entry CSVs, see compressed_io.output_path.
     """
     # Make sure entries directory exists
     if not os.path.exists(f"{cwd_path}/{full_entries_directory}"):
@@ -374,11 +439,15 @@ def clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entr
     if not os.path.exists(f"{cwd_path}/{front_trunc_entries_directory}"):
         os.makedirs(f"{cwd_path}/{front_trunc_entries_directory}")
 
-    with open(f"{cwd_path}/{full_entries_directory}/entries_19{year_string}.csv", 
-        "w", newline='', encoding="utf-8", errors="ignore") as f:
-        csv_writer = csv.writer(f, quotechar='"')
-        for entry in full_entries:
-            csv_writer.writerow([entry])
+    full_entries_path, clean_entries_path, line_mid_entries_path, front_trunc_entries_path = [
+        output_path(f"{cwd_path}/{directory}/entries_19{year_string}.csv", compression)
+        for directory in [full_entries_directory, clean_entries_directory,
+                          line_mid_entries_directory, front_trunc_entries_directory]
+    ]
+    for path in [full_entries_path, clean_entries_path, line_mid_entries_path, front_trunc_entries_path]:
+        remove_stale_variants(path)
+
+    write_entries_csv(full_entries, full_entries_path, "19" + year_string)
 
     # with open(f"{cwd_path}/{clean_entries_directory}/entries_19{year_string}.csv", 
     #         "w", newline='', encoding="utf-8", errors="ignore") as f:
@@ -386,51 +455,33 @@ def clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entr
     #     for entry in clean_entries_df:
     #         csv_writer.writerow([entry])
 
-    clean_entries_df.to_csv(f"{cwd_path}/{clean_entries_directory}/entries_19{year_string}.csv", 
-                        index=False, encoding="utf-8", quotechar='"')
+    clean_entries_df.to_csv(clean_entries_path, index=False, encoding="utf-8", quotechar='"')
     
-    with open(f"{cwd_path}/{line_mid_entries_directory}/entries_19{year_string}.csv", 
-        "w", newline='', encoding="utf-8", errors="ignore") as f:
-        csv_writer = csv.writer(f, quotechar='"')
-        for entry in line_mid_entries:
-            csv_writer.writerow([entry])
+    write_entries_csv(line_mid_entries, line_mid_entries_path, "19" + year_string)
 
-    with open(f"{cwd_path}/{front_trunc_entries_directory}/entries_19{year_string}.csv", 
-        "w", newline='', encoding="utf-8", errors="ignore") as f:
-        csv_writer = csv.writer(f, quotechar='"')
-        for entry in front_trunc_entries:
-            csv_writer.writerow([entry])
+    write_entries_csv(front_trunc_entries, front_trunc_entries_path, "19" + year_string)
 
-    len_line_mid_entries = clean_entries_measures[0]
-    percent_line_mid_entries = clean_entries_measures[1]
-    len_front_trunc_entries = clean_entries_measures[2]
-    percent_front_trunc_entries = clean_entries_measures[3]
-    len_clean_entries = clean_entries_measures[4]
-    percent_clean_entries = clean_entries_measures[5]
-    len_full_entries = clean_entries_measures[6]
     with open(f"{cwd_path}/{clean_entries_measures_directory}/entries_measures_19{year_string}.txt", 
             "w", newline='', encoding="utf-8", errors="ignore") as f:
-        f.write(f"Total Line Mid Entries: {len_line_mid_entries}\n")
-        f.write(f"Percent of Line Mid Entries: {percent_line_mid_entries}\n\n")
-        f.write(f"Total Front Trunc Entries: {len_front_trunc_entries}\n")
-        f.write(f"Percent Front Trunc Entries: {percent_front_trunc_entries}\n\n")
-        f.write(f"Total Clean Entries: {len_clean_entries}\n")
-        f.write(f"Percent Clean Entries: {percent_clean_entries}\n\n")
-        f.write(f"Total Full Entries: {len_full_entries}\n\n")
-        if len(pattern) > 0:
-            f.write(f"Pattern: {pattern}")
+        f.write(format_entries_measures(entries_measures_counters(clean_entries_measures), pattern))
 
-if __name__ == "__main__":
-
-    args = argparse_create((sys.argv[1:]))
+def get_ocr_file_path(year_string, cwd_path, ocr_source="selected"):
+    """
+    Gets the OCR file a year is segmented from: the 070724 Princeton files for
+    1902-1907, the 070724 NYPL files for 1919 and 1921, and the /princeton_years/
+    files otherwise; a gzip, zstd or xz copy is used where there is no plain file.
 
-    #verbose_string = args.verbose
-    verbose_string = "True"
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        ocr_source: String; one of OCR_SOURCES. "reconciled" gets the /reconciled/
+                    merge of both OCR sources instead.
 
-    if verbose_string == "True":
-        verbose = True
-    else:
-        verbose = False
+    Returns:
+        file_path: String; OCR full file path.
+    """
+    if ocr_source == "reconciled":
+        return resolve_path(get_reconciled_paths(year_string, cwd_path)[0])
 
     # Iterate through Princeton OCR folder
     old_data_folder_path = '/princeton_years/'
@@ -438,66 +489,85 @@ if __name__ == "__main__":
     # Iterate through new_text_files OCR folder
     new_data_folder_path = '/new_text_files/'
 
+    if int(year_string) < 8:
+        file_name = "ecb_19" + year_string + "_princeton_070724.txt"
+        return resolve_path(cwd_path + os.path.join(new_data_folder_path, file_name))
+
+    if int(year_string) in (19, 21):
+        file_name = "ecb_19" + year_string + "_nypl_070724.txt"
+        return resolve_path(cwd_path + os.path.join(new_data_folder_path, file_name))
+
+    file_name = "ecb_19" + year_string + ".txt"
+    return resolve_path(cwd_path + os.path.join(old_data_folder_path, file_name))
+
+def create_year_entries(year_string, cwd_path, verbose, recorder, compression=None, ocr_source="selected",
+                        page_cache_path=None):
+    """
+    Segments one year's OCR file and writes its entries and entries measures.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        verbose: Boolean; If true, prints out metrics into CLI.
+        recorder: RunRecorder; records the "segment" and "write_entries" stages.
+        compression: String or None; compression of the entry CSVs, see compressed_io.output_path.
+        ocr_source: String; one of OCR_SOURCES, see get_ocr_file_path.
+        page_cache_path: String or None; page cache file relative to the repository root,
+                         or None to process every page.
+    """
+    file_path = get_ocr_file_path(year_string, cwd_path, ocr_source)
+
     full_entries_directory = "/entries/full_entries/"
     clean_entries_directory = "/entries/clean_entries/"
     clean_entries_measures_directory = "/entries/entries_measures/"
     front_trunc_entries_directory = "/entries/front_trunc_entries/"
     line_mid_entries_directory = "/entries/line_mid_entries/"
+    entries_deltas_directory = "/entries/entries_deltas/"
 
-    # Only cover years 1902 and 1922
-    for year in tqdm(range(2,23)):
-        if year < 10:
-            year = "0" + str(year)
-        
-        # Get appropriate paths 
-        year_string = str(year)
-
-        cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
-
-        if int(year) < 8:
-            file_name = "ecb_19" + year_string + "_princeton_070724.txt"
-            file_path = cwd_path + os.path.join(new_data_folder_path, file_name)
-            
-        elif year == 19 or year == 21:
-            file_name = "ecb_19" + year_string + "_nypl_070724.txt"
-            file_path = cwd_path + os.path.join(new_data_folder_path, file_name)
-
-        else:
-            file_name = "ecb_19" + year_string + ".txt" 
-            file_path = cwd_path + os.path.join(old_data_folder_path, file_name)
-            
-            
-        full_entries_directory = "/entries/full_entries/"
-        clean_entries_directory = "/entries/clean_entries/"
-        clean_entries_measures_directory = "/entries/entries_measures/"
-        front_trunc_entries_directory = "/entries/front_trunc_entries/"
-        line_mid_entries_directory = "/entries/line_mid_entries/"
-        
+    pattern = get_header_patterns(year_string)
 
-        full_entries_directory = "/entries/full_entries/"
-        clean_entries_directory = "/entries/clean_entries/"
-        clean_entries_measures_directory = "/entries/entries_measures/"
-        front_trunc_entries_directory = "/entries/front_trunc_entries/"
-        line_mid_entries_directory = "/entries/line_mid_entries/"
-        
-        # Define multiple header patterns
-        header_patterns = [
-            r"(^\b[A-Z ]+\b\s?\n)",  # Capital heading pattern
-            r"(##(?s:.*?)$)",  # Page number pattern
-            r"(^.?19{}.?\n)".format(year), # Header year pattern
-            r"(^\d+\n)", # Random page numbers
-        ]
-
-        pattern = header_patterns
-
-        full_entries, clean_entries_df, clean_entries_measures, line_mid_entries, front_trunc_entries = get_clean_entries(year_string, 
-                                                                                                    file_path, 
-                                                                                                    pattern, verbose)   
-                
+    page_cache = PageCache(os.path.join(cwd_path, page_cache_path)) if page_cache_path else None
+    try:
+        with recorder.stage(year_string, "segment", input_paths=[file_path]) as counters:
+            full_entries, clean_entries_df, clean_entries_measures, line_mid_entries, front_trunc_entries = get_clean_entries(year_string, 
+                                                                                                        file_path, 
+                                                                                                        pattern, verbose,
+                                                                                                        counters, page_cache)
+    finally:
+        if page_cache is not None:
+            page_cache.close()
+
+    output_paths = [output_path(f"{cwd_path}/{directory}/entries_19{year_string}.csv", compression)
+                    for directory in [full_entries_directory, clean_entries_directory,
+                                      front_trunc_entries_directory, line_mid_entries_directory]]
+    clean_entries_path = output_paths[1]
+    delta_path = f"{cwd_path}/{entries_deltas_directory}/entries_delta_19{year_string}.json"
+    with recorder.stage(year_string, "write_entries", output_paths=output_paths + [delta_path]) as counters:
+        # Compare the clean entries with the previous run's (in whichever format it was kept) by entry ID
+        previous_digests = file_digests(resolve_path(clean_entries_path))
         clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entries_measures, 
                                 line_mid_entries, front_trunc_entries, 
                                 year_string, cwd_path, full_entries_directory,
                                 clean_entries_directory,
                                 clean_entries_measures_directory, 
                                 front_trunc_entries_directory,
-                                line_mid_entries_directory, pattern)
\ No newline at end of file
+                                line_mid_entries_directory, pattern, compression)
+        delta = compute_delta(previous_digests, file_digests(clean_entries_path))
+        write_delta(delta, delta_path)
+        counters.update(delta_counters(delta))
+        counters["entries_in"] = len(full_entries)
+        counters["entries_out"] = len(clean_entries_df.index)
+
+if __name__ == "__main__":
+
+    args = argparse_create((sys.argv[1:]))
+
+    verbose = args.verbose == "True"
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    recorder = RunRecorder(os.path.join(cwd_path, args.metrics), verbose)
+
+    # Only cover years 1902 and 1922
+    for year in tqdm(range(2,23)):
+        create_year_entries(f"{year:02d}", cwd_path, verbose, recorder, args.compression, args.ocr_source,
+                            args.page_cache or None)
@@ -0,0 +1,112 @@
+"""
+This module splits the creators of catalogue entries into a long table with
+one row per creator: the entry's row, the creator's position among the
+entry's creators, the creator as written, its surname and forenames, and
+whether the entry's creators are editors. The head author columns of the
+dataframes (last_name, first_name) are the position 0 rows of that table.
+
+The table can be built from extract_entry_fields output or from a dataframe
+read back with dataframe_dtypes.read_dataframe_csv:
+
+    table = creators_table(df["creators"], df["is_editor"], df["entry_id"])
+    co_authored = table[table["position"] > 0]
+"""
+
+import numpy as np
+import pandas as pd
+
+from dataframe_dtypes import to_boolean_flag
+
+# "Surname (Name1 and 2)" -> "Surname (Name1) and Surname (Name 2)"
+SHARED_SURNAME_PATTERN = r"([^()]+)\(([^)]+) and ([^)]+)\)"
+
+# Full cross-reference "see [other header]." expressions: everything from "see"
+# to the first period not in parenthesis.
+CROSS_REFERENCE_PATTERN = r"see.*\.(?![^(]*\))\s*"
+
+TRAILING_AND_PATTERN = r"\s+and\s+$"
+
+# " and " not in parenthesis, between two creators.
+CREATOR_SEPARATOR_PATTERN = r"\s+(?:and)(?![^(]*\))\s+"
+
+HEAD_NAME_PATTERN = r"^(?P<surname>[^()]+)\s\((?P<forenames>[^)]+)\)$"
+
+CREATORS_COLUMNS = ["row", "position", "creator", "surname", "forenames", "is_editor"]
+
+
+def split_creators(creators):
+    """
+    Split the creators matched at the front of each entry into lists of creators.
+
+    Arguments:
+        creators: Pandas Series; creators text, NaN where an entry has none.
+
+    Returns:
+        creators: Pandas Series; list of creators per entry, NaN where an entry has none.
+    """
+    creators = creators.str.replace(SHARED_SURNAME_PATTERN, "\\1(\\2) and \\1(\\3)", regex=True)
+    creators = creators.str.replace(CROSS_REFERENCE_PATTERN, " and ", regex=True)
+    creators = creators.str.replace(TRAILING_AND_PATTERN, "", regex=True)
+    return creators.str.split(CREATOR_SEPARATOR_PATTERN)
+
+
+def creators_table(creators, is_editor=None, rows=None):
+    """
+    Long table of creators, one row per creator of every entry.
+
+    Arguments:
+        creators: Pandas Series; list of creators per entry, as split_creators returns
+                  or as a dataframe read with the dtype plan holds.
+        is_editor: Pandas Series or None; extracted ("ed.") or boolean editor flag per entry.
+        rows: Pandas Series or None; row ID per entry (e.g. entry_id). By default the
+              index label of the entry.
+
+    Returns:
+        table: Pandas Dataframe; CREATORS_COLUMNS, ordered by entry and position.
+    """
+    if rows is None:
+        rows = pd.Series(creators.index, index=creators.index)
+
+    # One row per creator, labelled with the position of its entry. Positions
+    # count empty creators, so that an entry whose first creator is empty has no head.
+    exploded = pd.Series(creators.to_numpy(dtype=object), index=pd.RangeIndex(len(creators.index))).explode()
+    entries = exploded.index.to_numpy()
+    offsets = np.arange(len(entries))
+    firsts = np.ones(len(entries), dtype=bool)
+    firsts[1:] = entries[1:] != entries[:-1]
+    positions = offsets - np.maximum.accumulate(np.where(firsts, offsets, 0))
+
+    kept = (exploded.notna() & (exploded != "")).to_numpy()
+    exploded, entries, positions = exploded[kept], entries[kept], positions[kept]
+
+    names = exploded.str.extract(HEAD_NAME_PATTERN)
+    table = pd.DataFrame({
+        "row": rows.to_numpy()[entries],
+        "position": positions,
+        "creator": exploded.to_numpy(),
+        "surname": names["surname"].to_numpy(),
+        "forenames": names["forenames"].to_numpy(),
+    })
+    if is_editor is not None:
+        table["is_editor"] = to_boolean_flag(is_editor).to_numpy()[entries]
+    else:
+        table["is_editor"] = pd.array([pd.NA] * len(table.index), dtype="boolean")
+
+    return table[CREATORS_COLUMNS]
+
+
+def head_names(table, rows):
+    """
+    Surname and forenames of the first creator of every entry.
+
+    Arguments:
+        table: Pandas Dataframe; creators_table output.
+        rows: Pandas Series or Index; row IDs of the entries, in the order wanted.
+
+    Returns:
+        names: Pandas Dataframe; last_name and first_name columns indexed like rows,
+               NaN where an entry has no creators or its first creator has no forenames.
+    """
+    head = table[table["position"] == 0].set_index("row")
+    names = head[["surname", "forenames"]].reindex(rows)
+    return names.rename(columns={"surname": "last_name", "forenames": "first_name"})
@@ -0,0 +1,246 @@
+"""
+This module resolves the "see" cross-references of the catalogue, e.g.
+"Acharyya (B. K.) see Pearson (H. G.) and Acharyya.", to the main entries they
+point to. create_dataframes drops these clauses from the creators, so the
+references are read from the clean entries instead.
+
+The main entries of a year are indexed by hash keys: an author key (surname
+and forename initials) for every creator, a surname key, and the first words
+of every entry as heading keys for series and corporate headings such as
+"British Museum (Nat. Hist.)". Each reference is then resolved with a few
+dictionary lookups, most specific key first, and written as one row per
+(reference, target entry) to /dataframes/cross_references/:
+``(python prefix) cross_references.py --years 1912``
+"""
+
+import os
+import re
+import sys
+import argparse
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+from compressed_io import resolve_path
+from creators import creators_table
+from create_dataframes import get_clean_entries_file_path, get_dataframe_paths, read_clean_entries
+from dataframe_dtypes import read_dataframe_csv
+from entry_ids import ENTRY_ID_COLUMN, entry_ids, read_text_csv
+
+# "see", "see also" or "see under" (or "See" after a heading) and the heading
+# referred to. The heading ends at the first period, comma or semicolon outside
+# parentheses that does not end an initial or a two letter abbreviation such as "St.".
+SEE_RE = re.compile(r"(?:\bsee|(?<=\)\s)See)\s+(?:also\s+)?(?:under\s+)?(?P<target>.+?)"
+                    r"(?:(?<!\b[A-Z])(?<!\b[A-Z][a-z])[.,;](?![^(]*\))(?=\s|$)|$)")
+
+# Heading referred to by name: "Surname (Forenames)"
+TARGET_NAME_RE = re.compile(r"^(?P<surname>[^()]+?)\s*\((?P<forenames>[^)]+)\)")
+
+# The heading a "see" clause is part of: the last "Surname (Forenames)" before it
+SOURCE_NAME_RE = re.compile(r"(?:[^\s().]+\s){0,2}[^\s()]+\s?\([^)]*\)$")
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Number of leading words of an entry indexed as heading keys.
+HEADING_WORDS = 4
+
+REFERENCE_COLUMNS = ["source_entry_id", "source_heading", "target_heading", "match", "target_entry_id"]
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Resolves "see" cross-references to the main entries they point to.')
+
+    parser.add_argument("--years", nargs="+", default=["1902-1922"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1908-1918.")
+    parser.add_argument("--verbose", type=str, default="False",
+            help="Prints out the number of references resolved by each kind of key.")
+
+    return parser.parse_args(args)
+
+
+def fold(text):
+    """
+    Lower case text without accents, e.g. "Béck" -> "beck".
+    """
+    return unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+
+
+def normalise(text):
+    """
+    Lower case letters of a heading, without accents, spaces, punctuation or digits.
+    """
+    return "".join(WORD_RE.findall(fold(text)))
+
+
+def author_key(surname, forenames):
+    """
+    Surname and forename initials, e.g. ("Pearson", "H. G.") -> "pearson|hg".
+    """
+    return normalise(surname) + "|" + "".join(word[0] for word in WORD_RE.findall(fold(forenames)))
+
+
+def heading_words(text):
+    """
+    Normalised leading words of a heading, up to its first parenthesis.
+    """
+    return WORD_RE.findall(fold(text.split("(", 1)[0]))[:HEADING_WORDS]
+
+
+class CrossReferenceIndex:
+    """
+    Hash index of one year's main entries by author, surname and heading keys.
+
+    Arguments:
+        df: Pandas Dataframe; a year's dataframe, with creators and entry columns.
+        ids: Pandas Series; entry ID of every row of df.
+    """
+
+    def __init__(self, df, ids):
+        self.authors = defaultdict(list)
+        self.surnames = defaultdict(list)
+        self.headings = defaultdict(list)
+
+        table = creators_table(df["creators"], rows=ids)
+        for entry_id, surname, forenames in zip(table["row"], table["surname"], table["forenames"]):
+            if isinstance(surname, str):
+                self.surnames[normalise(surname)].append(entry_id)
+                self.authors[author_key(surname, forenames)].append(entry_id)
+
+        for entry_id, entry in zip(ids, df["entry"]):
+            if isinstance(entry, str):
+                words = heading_words(entry)
+                for length in range(1, len(words) + 1):
+                    self.headings[" ".join(words[:length])].append(entry_id)
+
+    def resolve(self, target):
+        """
+        Main entries a heading refers to, by the most specific key that finds any.
+
+        Arguments:
+            target: String; heading after "see", e.g. "Pearson (H. G.) and Acharyya".
+
+        Returns:
+            match: String or None; "author", "surname" or "heading", or None if unresolved.
+            entry_ids: List; entry IDs of the main entries referred to.
+        """
+        name = TARGET_NAME_RE.match(target)
+        if name is not None:
+            found = self.authors.get(author_key(name["surname"], name["forenames"]))
+            if found:
+                return "author", found
+
+        found = self.surnames.get(normalise(name["surname"] if name is not None else target))
+        if found:
+            return "surname", found
+
+        # Longest heading prefix first; a single word only when that is the whole heading
+        words = heading_words(target)
+        for length in range(len(words), 0 if len(words) == 1 else 1, -1):
+            found = self.headings.get(" ".join(words[:length]))
+            if found:
+                return "heading", found
+
+        return None, []
+
+
+def see_references(entry):
+    """
+    (source heading, target heading) of every "see" clause of an entry.
+    """
+    references = []
+    for match in SEE_RE.finditer(entry):
+        prefix = entry[:match.start()].rstrip(" -—")
+        source = SOURCE_NAME_RE.search(prefix)
+        source = source.group(0) if source is not None else prefix.rsplit(". ", 1)[-1]
+        target = match["target"].strip(" -—")
+        if target:
+            references.append((source.strip(), target))
+    return references
+
+
+def read_year_dataframe(df_path, catalogue_year):
+    """
+    Read a year's dataframe CSV and the entry ID of every row. Dataframes written
+    before entry IDs were introduced get them from their entries, as when they
+    are loaded into the catalogue database.
+
+    Returns:
+        df: Pandas Dataframe; dataframe using the dtype plan.
+        ids: Pandas Series; entry ID per row.
+    """
+    df = read_dataframe_csv(df_path)
+    if ENTRY_ID_COLUMN in df:
+        return df, df[ENTRY_ID_COLUMN].astype(object)
+
+    text_df = read_text_csv(df_path)
+    pages = (pd.to_numeric(text_df["page_num"], errors="coerce") if "page_num" in text_df
+             else [None] * len(text_df.index))
+    return df, pd.Series(entry_ids(text_df["original_entry"], pages, catalogue_year), index=df.index)
+
+
+def resolve_year(year_string, cwd_path):
+    """
+    Resolve the "see" references in one year's clean entries against its main entries.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+
+    Returns:
+        references: Pandas Dataframe; REFERENCE_COLUMNS, one row per reference and
+                    target entry, with match and target_entry_id empty when unresolved.
+    """
+    catalogue_year = "19" + year_string
+    df, ids = read_year_dataframe(resolve_path(get_dataframe_paths(year_string, cwd_path)[0]), catalogue_year)
+    index = CrossReferenceIndex(df, ids)
+
+    rows = []
+    for entry, _, _, source_id in read_clean_entries(get_clean_entries_file_path(year_string, cwd_path),
+                                                       catalogue_year):
+        for source, target in see_references(entry):
+            match, target_ids = index.resolve(target)
+            for target_id in target_ids or [None]:
+                rows.append((source_id, source, target, match, target_id))
+
+    return pd.DataFrame(rows, columns=REFERENCE_COLUMNS)
+
+
+def get_references_path(year_string, cwd_path):
+    """
+    Gets the path a year's references table is written to.
+    """
+    return os.path.join(cwd_path, "dataframes", "cross_references", f"cross_references_19{year_string}.csv")
+
+
+if __name__ == "__main__":
+
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    verbose = args.verbose == "True"
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    for year_string in parse_years(args.years):
+        if not os.path.exists(resolve_path(get_dataframe_paths(year_string, cwd_path)[0])):
+            print(f"19{year_string}: no dataframe, skipped")
+            continue
+        references = resolve_year(year_string, cwd_path)
+        references_path = get_references_path(year_string, cwd_path)
+        os.makedirs(os.path.dirname(references_path), exist_ok=True)
+        references.to_csv(references_path, index=False)
+
+        clauses = references.drop_duplicates(["source_entry_id", "source_heading", "target_heading"])
+        print(f"19{year_string}: {len(clauses.index)} references, "
+              f"{clauses['match'].notna().sum()} resolved")
+        if verbose:
+            print(clauses["match"].value_counts(dropna=False).to_string())
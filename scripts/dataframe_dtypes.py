@@ -0,0 +1,253 @@
+"""
+This module contains the dtype plan used for the dataframes built by
+create_dataframes.py, along with helpers to apply it to an in-memory
+dataframe and to read the /dataframes/ CSVs back with it.
+
+Running it as a script checks that every committed year of every /dataframes/
+directory loads into a single dataframe with the plan's dtypes:
+``(python prefix) dataframe_dtypes.py``
+"""
+
+import os
+import ast
+import sys
+from glob import glob
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# Arrow-backed strings when pyarrow is installed, plain pandas strings otherwise.
+STRING_DTYPE = "string[pyarrow]" if pa is not None else "string"
+
+# Column name -> dtype name. "list" marks columns holding a list of strings per row,
+# "flag" columns holding the token a flag was extracted from ("ed.", "eds.", "net").
+DATAFRAME_DTYPE_PLAN = {
+    "entry": STRING_DTYPE,
+    "last_name": STRING_DTYPE,
+    "first_name": STRING_DTYPE,
+    "title": STRING_DTYPE,
+    "publisher": "category",
+    "price": STRING_DTYPE,
+    "format": "category",
+    "original_entry": STRING_DTYPE,
+    "author_name": STRING_DTYPE,
+    "creators": "list",
+    "is_editor": "flag",
+    "date": STRING_DTYPE,
+    "catalogue_year": "category",
+    "is_net": "flag",
+    "page_num": "UInt16",
+    "doc_page_num": "UInt16",
+    "entry_id": STRING_DTYPE,
+    "missing_fields": "uint8",
+}
+
+
+def to_boolean_flag(column):
+    """
+    Convert an extracted flag column ("ed.", "net", NaN, or already boolean)
+    into a nullable boolean column.
+
+    Arguments:
+        column: Pandas Series; extracted flag values.
+
+    Returns:
+        flags: Pandas Series; nullable boolean flags.
+    """
+    if pd.api.types.is_bool_dtype(column.dtype):
+        return column.astype("boolean")
+
+    lowered = column.astype("string").str.lower()
+    flags = column.notna() & ~lowered.isin(["false", "0", ""]).fillna(False)
+    return flags.astype("boolean")
+
+
+def to_creators_list(column):
+    """
+    Convert a creators column (Python lists, or their string representation as
+    written to CSV) into a column with one list of strings per row.
+
+    Arguments:
+        column: Pandas Series; creators values.
+
+    Returns:
+        creators: Pandas Series; Arrow list column when pyarrow is installed,
+                  object column of lists otherwise.
+    """
+    def parse(value):
+        if isinstance(value, list):
+            return value
+        if isinstance(value, str):
+            if value.startswith("["):
+                return ast.literal_eval(value)
+            return [value]
+        return None
+
+    values = [parse(value) for value in column]
+
+    if pa is None:
+        return pd.Series(values, index=column.index, dtype=object)
+
+    array = pa.array(values, type=pa.list_(pa.string()))
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=column.index)
+
+
+def apply_dtype_plan(df):
+    """
+    Convert a full dataframe to the memory-lean dtype plan. Duplicate text is
+    stored by reference: original_entry is only kept where it differs from entry.
+
+    Arguments:
+        df: Pandas Dataframe; full dataframe as built by create_dataframes or read from CSV.
+
+    Returns:
+        lean_df: Pandas Dataframe; copy of df using DATAFRAME_DTYPE_PLAN.
+    """
+    lean_df = pd.DataFrame(index=df.index)
+
+    for column in df.columns:
+        dtype = DATAFRAME_DTYPE_PLAN.get(column)
+        values = df[column]
+
+        if dtype is None:
+            lean_df[column] = values
+        elif dtype == "list":
+            lean_df[column] = to_creators_list(values)
+        elif dtype in ("category", "flag"):
+            # Categories are always strings, even for a year whose column is all NaN (read
+            # as float), so that read_dataframes can union them across years. Flag tokens
+            # are kept as they are, so the CSVs still tell "ed." from "eds."; to_boolean_flag
+            # turns them into booleans where needed
+            lean_df[column] = values.astype(STRING_DTYPE).astype("category")
+        else:
+            lean_df[column] = values.astype(dtype)
+
+    if "original_entry" in lean_df and "entry" in lean_df:
+        same = (lean_df["original_entry"] == lean_df["entry"]).fillna(False)
+        lean_df["original_entry"] = lean_df["original_entry"].mask(same.to_numpy(), pd.NA)
+
+    return lean_df
+
+
+def restore_csv_columns(lean_df):
+    """
+    Undo the by-reference storage of original_entry and turn list columns back
+    into Python lists so the dataframe is written to CSV as before.
+
+    Arguments:
+        lean_df: Pandas Dataframe; dataframe returned by apply_dtype_plan.
+
+    Returns:
+        df: Pandas Dataframe; copy of lean_df ready for to_csv.
+    """
+    df = lean_df.copy()
+    if "original_entry" in df and "entry" in df:
+        df["original_entry"] = df["original_entry"].fillna(df["entry"])
+    for column, dtype in DATAFRAME_DTYPE_PLAN.items():
+        if dtype == "list" and column in df:
+            values = [
+                list(value) if isinstance(value, (list, tuple)) else None
+                for value in df[column].tolist()
+            ]
+            df[column] = pd.Series(values, index=df.index, dtype=object)
+    return df
+
+
+def read_dataframe_csv(path):
+    """
+    Read one /dataframes/ CSV file straight into the dtype plan.
+
+    Arguments:
+        path: String; path to a df_19YY.csv file.
+
+    Returns:
+        lean_df: Pandas Dataframe; dataframe using DATAFRAME_DTYPE_PLAN.
+    """
+    read_dtypes = {
+        column: dtype for column, dtype in DATAFRAME_DTYPE_PLAN.items()
+        if dtype == STRING_DTYPE
+    }
+    df = pd.read_csv(path, dtype=read_dtypes, keep_default_na=True)
+
+    return apply_dtype_plan(df)
+
+
+def read_dataframes(paths):
+    """
+    Read several /dataframes/ CSV files (e.g. every catalogue year) into a
+    single dataframe that keeps the dtype plan, including categoricals.
+
+    Arguments:
+        paths: List; paths to df_19YY.csv files.
+
+    Returns:
+        lean_df: Pandas Dataframe; concatenated dataframe using DATAFRAME_DTYPE_PLAN.
+    """
+    frames = [read_dataframe_csv(path) for path in paths]
+
+    # Categoricals with different categories turn into object columns on
+    # concatenation, so union the categories up front.
+    for column, dtype in DATAFRAME_DTYPE_PLAN.items():
+        if dtype not in ("category", "flag") or not all(column in frame for frame in frames):
+            continue
+        union = pd.api.types.union_categoricals(
+            [frame[column].array for frame in frames]
+        ).categories
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(union)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_usage_report(before_df, after_df):
+    """
+    Compare the memory used by a dataframe before and after applying the dtype plan.
+
+    Arguments:
+        before_df: Pandas Dataframe; dataframe before apply_dtype_plan.
+        after_df: Pandas Dataframe; dataframe after apply_dtype_plan.
+
+    Returns:
+        report: Pandas Dataframe; bytes used per column before and after, with a total row.
+    """
+    report = pd.DataFrame({
+        "before": before_df.memory_usage(deep=True, index=False),
+        "after": after_df.memory_usage(deep=True, index=False),
+    })
+    report.loc["total"] = report.sum()
+    report["ratio"] = report["after"] / report["before"]
+
+    return report
+
+
+if __name__ == "__main__":
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    failed = False
+    for directory in sorted(glob(os.path.join(cwd_path, "dataframes", "*", ""))):
+        paths = sorted(glob(os.path.join(directory, "df_19*.csv")))
+        if not paths:
+            continue
+        name = os.path.basename(os.path.dirname(directory))
+        try:
+            lean_df = read_dataframes(paths)
+        except Exception as error:
+            print(f"{name}: {len(paths)} years failed to load: {error!r}")
+            failed = True
+            continue
+        wrong = [column for column, dtype in DATAFRAME_DTYPE_PLAN.items()
+                 if dtype in ("category", "flag") and column in lean_df
+                 and lean_df[column].dtype != "category"]
+        if wrong:
+            print(f"{name}: {', '.join(wrong)} not categorical after loading {len(paths)} years")
+            failed = True
+            continue
+        print(f"{name}: {len(paths)} years, {len(lean_df.index)} rows loaded")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,461 @@
+"""
+This module fills gaps in incomplete catalogue rows (missing publisher, title
+or date) from the WorldCat Search API v2 /bibs request. One query is built per
+incomplete row; the queries are sent concurrently by an asyncio client with a
+pooled connection limit and a request rate limit, and every response is cached
+on disk by query, so reruns only send queries that have not been answered
+yet. Returned records are scored against the row, and the best record of each
+row is written to /enrichment/enrichment_19YY.csv.
+
+Run it against worldcat_stub.py (and the recorded /worldcat_fixtures/) to
+work offline:
+``(python prefix) worldcat_stub.py --port 8765``
+``(python prefix) enrichment.py --years 1912 --base-url http://127.0.0.1:8765``
+
+Against WorldCat itself, pass the OAuth access token in WORLDCAT_TOKEN:
+``(python prefix) enrichment.py --years 1912 --rate 5``
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import difflib
+import hashlib
+import argparse
+import datetime
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+WORLDCAT_BASE_URL = "https://americas.discovery.api.oclc.org"
+BIBS_PATH = "/worldcat/search/v2/bibs"
+
+# Response statuses retried with exponential backoff.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Weight of each field in a record's score; the weights of fields the row lacks are dropped.
+SCORE_WEIGHTS = {"title": 0.5, "author": 0.3, "publisher": 0.1, "date": 0.1}
+
+WORD_RE = re.compile(r"[A-Za-zÀ-ž]{3,}")
+
+# Entry words that describe the listing (price, format, month) rather than the book.
+LISTING_WORDS = {"net", "swd", "illus", "vol", "vols", "and", "the", "jan", "feb", "mar", "apr",
+                 "may", "june", "july", "aug", "sept", "oct", "nov", "dec"}
+NON_ALPHANUMERIC_RE = re.compile(r"[\W_]+")
+
+# Columns of the enrichment CSV, after the row's entry_id and catalogue_year.
+ENRICHMENT_COLUMNS = ["query", "num_records", "oclc_number", "score", "worldcat_title",
+                      "worldcat_author", "worldcat_publisher", "worldcat_date"]
+
+
+def normalise_text(text):
+    """
+    Lowercase letters and digits, separated by single spaces; "" for missing values.
+    """
+    if not isinstance(text, str):
+        return ""
+    return NON_ALPHANUMERIC_RE.sub(" ", text.casefold()).strip()
+
+
+def incomplete_rows(full_df):
+    """
+    Rows missing a publisher, a title or a date.
+
+    Arguments:
+        full_df: Pandas Dataframe; dataframe read from a df_19YY.csv file.
+
+    Returns:
+        incomplete_df: Pandas Dataframe; the incomplete rows.
+    """
+    missing = full_df["publisher"].isna() | full_df["title"].isna() | full_df["date"].isna()
+    return full_df[missing.to_numpy()]
+
+
+def build_query(row, max_keywords=8):
+    """
+    WorldCat /bibs query parameters for one row: title, author and publisher
+    terms where the row has them, keywords from the entry text where it has no
+    title, and the catalogue year and the year before as the publication dates.
+
+    Arguments:
+        row: Pandas Series; one dataframe row.
+        max_keywords: Integer; largest number of entry words used as keywords.
+
+    Returns:
+        params: Dictionary or None; query parameters, or None if the row has too
+                little text to query.
+    """
+    terms = []
+    if isinstance(row.get("title"), str):
+        terms.append(f"ti:{normalise_text(row['title'])}")
+    elif isinstance(row.get("entry"), str):
+        # Entries without a title start with their subject or title words
+        words = [word for word in WORD_RE.findall(row["entry"])
+                 if word.casefold() not in LISTING_WORDS][:max_keywords]
+        if len(words) < 2:
+            return None
+        terms.append(f"kw:{' '.join(words).casefold()}")
+    else:
+        return None
+
+    if isinstance(row.get("last_name"), str):
+        terms.append(f"au:{normalise_text(row['last_name'])}")
+    if isinstance(row.get("publisher"), str):
+        terms.append(f"pb:{normalise_text(row['publisher'])}")
+
+    year = int(row["catalogue_year"])
+    return {"q": " AND ".join(terms), "datePublished": f"{year - 1}-{year}", "limit": 10}
+
+
+def query_key(params):
+    """
+    Cache key of a query: a hash of its parameters, as they appear in the request
+    URL, in a canonical order.
+    """
+    canonical = {name: str(value) for name, value in params.items()}
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of /bibs responses, one JSON file per query key.
+
+    Arguments:
+        directory: String; cache directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """
+        Cached response of a query key, or None.
+        """
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, response):
+        """
+        Cache a response; written to a temporary file first so that readers never
+        see a partial one.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(response, f)
+        os.replace(temporary_path, path)
+
+
+class RateLimiter:
+    """
+    Spaces requests at least 1 / rate seconds apart across every task sharing it.
+
+    Arguments:
+        rate: Float; largest number of requests started per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def retry_delay(retry_after, attempt):
+    """
+    Seconds to wait before retrying: the Retry-After header, given either as
+    seconds or as an HTTP-date, or exponential backoff without a usable header.
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            retry_at = None
+        if retry_at is not None:
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+            return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+    return 2 ** attempt * 0.5
+
+
+async def fetch_query(session, url, params, limiter, headers, retries=4):
+    """
+    Send one /bibs query, retrying rate limited and failed requests with
+    exponential backoff.
+
+    Returns:
+        response: Dictionary; decoded JSON response.
+    """
+    for attempt in range(retries + 1):
+        await limiter.wait()
+        async with session.get(url, params=params, headers=headers) as response:
+            if response.status not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return await response.json()
+            retry_after = response.headers.get("Retry-After")
+        await asyncio.sleep(retry_delay(retry_after, attempt))
+
+
+async def fetch_all(queries, cache, base_url=WORLDCAT_BASE_URL, token=None, concurrency=8, rate=10):
+    """
+    Answer every query, from the cache where possible and otherwise from the
+    /bibs endpoint, with at most concurrency requests in flight over one pooled
+    session.
+
+    Arguments:
+        queries: List; query parameter dictionaries.
+        cache: ResponseCache; response cache, filled with the new responses.
+        base_url: String; API root, e.g. the worldcat_stub.py address.
+        token: String or None; OAuth access token.
+        concurrency: Integer; largest number of open connections.
+        rate: Float; largest number of requests started per second.
+
+    Returns:
+        responses: List; response of each query, None where the request failed.
+        counters: Dictionary; cache hits, requests sent and failed requests.
+    """
+    responses = [None] * len(queries)
+    counters = {"cache_hits": 0, "requests": 0, "failed_requests": 0}
+
+    pending = {}
+    for index, params in enumerate(queries):
+        key = query_key(params)
+        cached = cache.get(key)
+        if cached is not None:
+            responses[index] = cached
+            counters["cache_hits"] += 1
+        else:
+            pending.setdefault(key, []).append(index)
+
+    if not pending:
+        return responses, counters
+
+    url = base_url.rstrip("/") + BIBS_PATH
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(session, key, indexes):
+        async with semaphore:
+            try:
+                response = await fetch_query(session, url, queries[indexes[0]], limiter, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                # ValueError: a response body that is not JSON
+                counters["failed_requests"] += 1
+                return
+        counters["requests"] += 1
+        cache.put(key, response)
+        for index in indexes:
+            responses[index] = response
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(answer(session, key, indexes) for key, indexes in pending.items()))
+
+    return responses, counters
+
+
+def parse_records(response):
+    """
+    The fields of each bibliographic record of a /bibs response.
+
+    Arguments:
+        response: Dictionary; decoded /bibs response.
+
+    Returns:
+        records: List; dictionaries with oclc_number, title, author, publisher and date.
+    """
+    records = []
+    for bib in response.get("bibRecords") or []:
+        titles = (bib.get("title") or {}).get("mainTitles") or [{}]
+        creators = (bib.get("contributor") or {}).get("creators") or [{}]
+        publishers = bib.get("publishers") or [{}]
+        records.append({
+            "oclc_number": (bib.get("identifier") or {}).get("oclcNumber"),
+            "title": titles[0].get("text"),
+            "author": " ".join(filter(None, [(creators[0].get("firstName") or {}).get("text"),
+                                             (creators[0].get("secondName") or {}).get("text")])) or None,
+            "publisher": (publishers[0].get("publisherName") or {}).get("text"),
+            "date": (bib.get("date") or {}).get("publicationDate"),
+        })
+    return records
+
+
+def text_similarity(row_text, record_text):
+    """
+    Similarity of two normalised strings in [0, 1].
+    """
+    if not row_text or not record_text:
+        return 0.0
+    return difflib.SequenceMatcher(None, row_text, record_text, autojunk=False).ratio()
+
+
+def score_record(row, record):
+    """
+    Score a record against a row. The title is compared with the row's title,
+    or where it has none with the start of its entry text; the author with the
+    row's last name; the publisher with its publisher; and the record's date
+    must fall in the catalogue year or the year before.
+
+    Arguments:
+        row: Pandas Series; one dataframe row.
+        record: Dictionary; one record from parse_records.
+
+    Returns:
+        score: Float; weighted similarity in [0, 1].
+    """
+    record_title = normalise_text(record["title"])
+    if isinstance(row.get("title"), str):
+        title = text_similarity(normalise_text(row["title"]), record_title)
+    else:
+        title = text_similarity(normalise_text(row.get("entry"))[:len(record_title)], record_title)
+
+    similarities = {"title": title}
+    if isinstance(row.get("last_name"), str):
+        similarities["author"] = float(normalise_text(row["last_name"]) in normalise_text(record["author"]))
+    if isinstance(row.get("publisher"), str):
+        similarities["publisher"] = text_similarity(normalise_text(row["publisher"]),
+                                                    normalise_text(record["publisher"]))
+    years = [int(year) for year in re.findall(r"1[0-9]{3}", record["date"] or "")]
+    year = int(row["catalogue_year"])
+    similarities["date"] = float(any(year - 1 <= found <= year for found in years))
+
+    total_weight = sum(SCORE_WEIGHTS[field] for field in similarities)
+    return sum(SCORE_WEIGHTS[field] * value for field, value in similarities.items()) / total_weight
+
+
+def best_matches(rows, queries, responses):
+    """
+    The best scoring record of each queried row.
+
+    Arguments:
+        rows: Pandas Dataframe; queried rows.
+        queries: List; query of each row.
+        responses: List; response of each query, None where the request failed.
+
+    Returns:
+        matches: Pandas Dataframe; entry_id, catalogue_year and ENRICHMENT_COLUMNS of each row.
+    """
+    matches = []
+    for (_, row), params, response in zip(rows.iterrows(), queries, responses):
+        records = parse_records(response) if response is not None else []
+        scores = [score_record(row, record) for record in records]
+        best = records[int(np.argmax(scores))] if records else {}
+        matches.append({
+            "entry_id": row.get("entry_id"),
+            "catalogue_year": row["catalogue_year"],
+            "query": params["q"],
+            "num_records": None if response is None else len(records),
+            "oclc_number": best.get("oclc_number"),
+            "score": max(scores) if scores else None,
+            "worldcat_title": best.get("title"),
+            "worldcat_author": best.get("author"),
+            "worldcat_publisher": best.get("publisher"),
+            "worldcat_date": best.get("date"),
+        })
+    return pd.DataFrame(matches, columns=["entry_id", "catalogue_year"] + ENRICHMENT_COLUMNS)
+
+
+def enrich_year(df_path, output_path, cache, base_url=WORLDCAT_BASE_URL, token=None,
+                concurrency=8, rate=10, limit=None):
+    """
+    Query, score and write the best WorldCat record of every incomplete row of one year.
+
+    Arguments:
+        df_path: String; df_19YY.csv written by create_dataframes.py.
+        output_path: String; target enrichment CSV path.
+        cache: ResponseCache; response cache.
+        base_url: String; API root.
+        token: String or None; OAuth access token.
+        concurrency: Integer; largest number of open connections.
+        rate: Float; largest number of requests started per second.
+        limit: Integer or None; only enrich this many incomplete rows.
+
+    Returns:
+        counters: Dictionary; rows queried, cache hits, requests and failed requests.
+    """
+    rows = incomplete_rows(pd.read_csv(df_path, dtype=str))
+    queries = [build_query(row) for _, row in rows.iterrows()]
+    queried = [index for index, params in enumerate(queries) if params is not None][:limit]
+    rows = rows.iloc[queried]
+    queries = [queries[index] for index in queried]
+
+    responses, counters = asyncio.run(fetch_all(queries, cache, base_url, token, concurrency, rate))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    best_matches(rows, queries, responses).to_csv(output_path, index=False)
+
+    counters["entries_in"] = len(rows.index)
+    return counters
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Enriches incomplete rows from WorldCat.')
+
+    parser.add_argument("--years", nargs="+", default=["1912-1921"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1912-1921.")
+    parser.add_argument("--base-url", type=str, default=WORLDCAT_BASE_URL,
+            help="API root, e.g. http://127.0.0.1:8765 for worldcat_stub.py.")
+    parser.add_argument("--concurrency", type=int, default=8,
+            help="Largest number of requests in flight.")
+    parser.add_argument("--rate", type=float, default=10,
+            help="Largest number of requests started per second.")
+    parser.add_argument("--cache", type=str, default="enrichment/cache",
+            help="Response cache directory, relative to the repository root.")
+    parser.add_argument("--limit", type=int, default=None,
+            help="Only enrich this many incomplete rows per year.")
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    from create_dataframes import get_dataframe_paths
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    cache = ResponseCache(os.path.join(cwd_path, args.cache))
+
+    for year_string in parse_years(args.years):
+        df_path = get_dataframe_paths(year_string, cwd_path)[0]
+        output_path = os.path.join(cwd_path, "enrichment", f"enrichment_19{year_string}.csv")
+        start = time.perf_counter()
+        counters = enrich_year(df_path, output_path, cache, args.base_url, os.environ.get("WORLDCAT_TOKEN"),
+                               args.concurrency, args.rate, args.limit)
+        print(f"19{year_string}: {counters} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,207 @@
+"""
+This module checks the number of entries the segmenters find on every page
+against the estimates in /publication_info/ecb_entries-page-counts.csv (entries
+per page and pages with entries, 1908-1922). The segmenters pass in the page
+of every entry they cut, so the check is a bincount over arrays they already
+hold, and any anomalies are printed with the run output and added to the
+stage's counters:
+
+    over-split      a page with more than OVER_SPLIT_RATIO times the expected entries
+    merged          a page with fewer than MERGED_RATIO times the expected entries
+    no terminators  a page with entries but no entry terminator (date) on it
+    page count      a year whose number of pages with entries is more than
+                    PAGE_COUNT_TOLERANCE away from the estimate, which usually
+                    means a patternFrontDict or appendixPatternDict boundary is off
+
+The first and last EDGE_PAGES pages of a volume hold the front and back
+remainders and the partial first and last pages of entries, so only the page
+count check covers them. To check the segmenters' current output for a few years:
+``(python prefix) entry_density.py --years 1912-1916``
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Estimated entries per page and pages with entries per year.
+ENTRY_PAGE_COUNTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                      "publication_info", "ecb_entries-page-counts.csv")
+
+OVER_SPLIT_RATIO = 1.5
+MERGED_RATIO = 0.5
+PAGE_COUNT_TOLERANCE = 5
+
+# Pages at each end of a volume left out of the per page checks.
+EDGE_PAGES = 2
+
+# Anomalous pages listed in the run output; the counters cover all of them.
+REPORTED_PAGES = 10
+
+ANOMALY_KINDS = ["over_split", "merged", "no_terminators"]
+
+_expectations = {}
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description="Checks the entries per page of the regex and fuzzy "
+                                                 "segmenters against the publication page counts.")
+
+    parser.add_argument("--years", nargs="+", default=["1908-1922"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1908-1918.")
+    parser.add_argument("--fuzzy", type=str, default="False",
+            help="Checks the fuzzy segmenter's entries instead of the regex segmenter's.")
+
+    return parser.parse_args(args)
+
+
+def read_expected_density(year_string, path=ENTRY_PAGE_COUNTS_PATH):
+    """
+    Estimated entries and pages of a year, or None if there are no estimates for it.
+
+    Arguments:
+        year_string: String; string representation of year.
+        path: String; page counts CSV.
+
+    Returns:
+        expected: Dictionary or None; entries, pages (with entries) and entries_per_page.
+    """
+    if path not in _expectations:
+        if not os.path.exists(path):
+            _expectations[path] = pd.DataFrame()
+        else:
+            _expectations[path] = pd.read_csv(path, encoding="utf-8-sig", thousands=",").set_index("Year")
+
+    counts = _expectations[path]
+    year = 1900 + int(year_string)
+    if year not in counts.index or pd.isna(counts.at[year, "Est total entries per page"]):
+        return None
+
+    return {
+        "entries": int(counts.at[year, "Est # entries"]),
+        "pages": int(counts.at[year, "# pages with entries"]),
+        "entries_per_page": float(counts.at[year, "Est total entries per page"]),
+    }
+
+
+def density_anomalies(entry_pages, terminated_pages, num_pages, expected):
+    """
+    Pages whose number of entries is out of line with the expected entries per page.
+
+    Arguments:
+        entry_pages: Numpy Array; 1-based page of every entry.
+        terminated_pages: Numpy Array or None; 1-based page of every entry that ends
+                          with a terminator, or None if the segmenter has no such notion.
+        num_pages: Integer; number of pages segmented.
+        expected: Dictionary; read_expected_density output.
+
+    Returns:
+        counts: Numpy Array; entries per page, index 0 for page 1.
+        anomalies: List; (page, kind, entries) of every anomalous page, in page order.
+    """
+    counts = np.bincount(np.asarray(entry_pages, dtype=np.int64), minlength=num_pages + 1)[1:num_pages + 1]
+    interior = np.zeros(num_pages, dtype=bool)
+    interior[EDGE_PAGES:num_pages - EDGE_PAGES] = True
+
+    checks = {
+        "over_split": interior & (counts > OVER_SPLIT_RATIO * expected["entries_per_page"]),
+        "merged": interior & (counts < MERGED_RATIO * expected["entries_per_page"]),
+    }
+    if terminated_pages is not None:
+        terminated = np.bincount(np.asarray(terminated_pages, dtype=np.int64),
+                                 minlength=num_pages + 1)[1:num_pages + 1]
+        checks["no_terminators"] = interior & (counts > 0) & (terminated == 0)
+
+    anomalies = sorted((int(page) + 1, kind, int(counts[page]))
+                       for kind, mask in checks.items() for page in np.flatnonzero(mask))
+    return counts, anomalies
+
+
+def format_density_report(year_string, stage, counts, anomalies, expected):
+    """
+    Run output lines for a year's density anomalies, or an empty string if there are none.
+    """
+    pages_with_entries = int((counts > 0).sum())
+    page_count_off = abs(pages_with_entries - expected["pages"]) > PAGE_COUNT_TOLERANCE
+    if not anomalies and not page_count_off:
+        return ""
+
+    text = (f"[19{year_string} {stage}] entry density: {int(counts.sum())} entries on {pages_with_entries} "
+            f"pages, expected about {expected['entries']} on {expected['pages']} "
+            f"({expected['entries_per_page']:.0f} per page)")
+    if page_count_off:
+        text += "\n    page count is off by more than {} pages: check patternFrontDict and appendixPatternDict".format(
+            PAGE_COUNT_TOLERANCE)
+    for page, kind, entries in anomalies[:REPORTED_PAGES]:
+        text += f"\n    page {page}: {kind.replace('_', ' ')} ({entries} entries)"
+    if len(anomalies) > REPORTED_PAGES:
+        text += f"\n    ... and {len(anomalies) - REPORTED_PAGES} more anomalous pages"
+    return text
+
+
+def check_entry_density(year_string, stage, entry_pages, terminated_pages, num_pages, counters=None):
+    """
+    Compare a segmenter's entries per page with the page counts, print any
+    anomalies and add them to the stage's counters.
+
+    Arguments:
+        year_string: String; string representation of year.
+        stage: String; stage name the report is printed under, e.g. "segment".
+        entry_pages: Numpy Array; 1-based page of every entry.
+        terminated_pages: Numpy Array or None; 1-based page of every terminated entry.
+        num_pages: Integer; number of pages segmented.
+        counters: Dictionary or None; if given, filled with density_* counters.
+
+    Returns:
+        anomalies: List; density_anomalies output, empty for years without estimates.
+    """
+    expected = read_expected_density(year_string)
+    if expected is None or num_pages == 0:
+        return []
+
+    counts, anomalies = density_anomalies(entry_pages, terminated_pages, num_pages, expected)
+
+    if counters is not None:
+        counters["density_pages_with_entries"] = int((counts > 0).sum())
+        counters["density_expected_pages"] = expected["pages"]
+        counters["density_expected_entries"] = expected["entries"]
+        for kind in ANOMALY_KINDS:
+            counters[f"density_{kind}"] = sum(anomaly[1] == kind for anomaly in anomalies)
+
+    report = format_density_report(year_string, stage, counts, anomalies, expected)
+    if report:
+        print(report)
+
+    return anomalies
+
+
+if __name__ == "__main__":
+
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    for year_string in parse_years(args.years):
+        if read_expected_density(year_string) is None:
+            continue
+        # The segmenters run the check themselves
+        if args.fuzzy == "True":
+            from scaled_fuzzy_matching import scaled_fuzzy_matching
+            from compressed_io import resolve_path
+            scaled_fuzzy_matching(resolve_path(f"{cwd_path}/princeton_years/ecb_19{year_string}.txt"), year_string)
+        else:
+            from create_entries import get_header_patterns, get_ocr_file_path, segment_entries
+            segment_entries(year_string, get_ocr_file_path(year_string, cwd_path),
+                            get_header_patterns(year_string), False)
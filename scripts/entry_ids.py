@@ -0,0 +1,199 @@
+"""
+This module gives every entry a stable ID derived from its catalogue year, its
+page and a hash of its normalised text, e.g. "1912-041-3fa2b9c01d4e". IDs do
+not depend on row positions, so a stage can compare its new output with the
+previous one and emit a delta (added, removed and changed IDs) that later
+stages and the database loader use to process only the rows that changed.
+
+Running it as a script adds an entry_id column to an entries CSV, e.g. one of
+the revised CSVs:
+``(python prefix) entry_ids.py ../ecb_1910_revised.csv 1910 ecb_1910_revised_ids.csv``
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import unicodedata
+
+import pandas as pd
+
+ENTRY_ID_COLUMN = "entry_id"
+
+NON_ALPHANUMERIC_RE = re.compile(r"[\W_]+")
+
+# Page markers written into older entry files by get_clean_entries.
+PAGE_MARKER_RE = re.compile(r"<PAGE_NUM:[0-9]{0,3}><DOCUMENT_PAGE_NUM:[0-9]{0,3}>")
+
+# Joins the values of a row before it is hashed; the unit separator does not occur in the CSVs.
+ROW_SEPARATOR = "\x1f"
+
+
+def normalise_entry(entry):
+    """
+    Normalise entry text so that whitespace, punctuation, case and page marker
+    differences do not change its ID.
+
+    Arguments:
+        entry: String; entry text.
+
+    Returns:
+        normalised: String; lowercase letters and digits of the entry.
+    """
+    entry = PAGE_MARKER_RE.sub("", entry)
+    return NON_ALPHANUMERIC_RE.sub("", unicodedata.normalize("NFKC", entry).casefold())
+
+
+def entry_ids(entries, pages, catalogue_year, seen=None):
+    """
+    Stable IDs for a year's entries. Entries with the same normalised text on
+    the same page get an occurrence suffix ("-2", "-3", ...) in order.
+
+    Arguments:
+        entries: Iterable; entry texts.
+        pages: Iterable; catalogue page numbers, None or NA where unknown.
+        catalogue_year: Integer or String; catalogue year, e.g. 1912.
+        seen: Dictionary or None; occurrence counts, passed again with each batch
+              when a year's entries are read in batches.
+
+    Returns:
+        ids: List; one ID per entry.
+    """
+    ids = []
+    seen = {} if seen is None else seen
+    for entry, page in zip(entries, pages):
+        digest = hashlib.blake2b(normalise_entry(str(entry)).encode("utf-8"), digest_size=6).hexdigest()
+        page_text = "000" if page is None or pd.isna(page) else f"{int(page):03d}"
+        entry_id = f"{catalogue_year}-{page_text}-{digest}"
+
+        seen[entry_id] = seen.get(entry_id, 0) + 1
+        ids.append(entry_id if seen[entry_id] == 1 else f"{entry_id}-{seen[entry_id]}")
+
+    return ids
+
+
+def row_digests(text_df):
+    """
+    Digest of every row of a dataframe read as strings, keyed by entry_id, so
+    that any change to any column changes the digest. Rows are hashed as their
+    NFC-normalised values joined by ROW_SEPARATOR, so the digests stored in the
+    catalogue database do not change with the pandas version.
+
+    Arguments:
+        text_df: Pandas Dataframe; CSV contents read with dtype=str, with an entry_id column.
+
+    Returns:
+        digests: Pandas Series; hex digest per entry_id.
+    """
+    text_df = text_df.drop_duplicates(ENTRY_ID_COLUMN).set_index(ENTRY_ID_COLUMN)
+    digests = [
+        hashlib.blake2b(unicodedata.normalize("NFC", ROW_SEPARATOR.join(row)).encode("utf-8"),
+                        digest_size=8).hexdigest()
+        for row in text_df.astype(str).itertuples(index=False, name=None)
+    ]
+    return pd.Series(digests, index=text_df.index)
+
+
+def read_text_csv(path):
+    """
+    Read a CSV file with every value as a string and missing values as "".
+    """
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def file_digests(path):
+    """
+    Row digests of a CSV file written by a stage, see row_digests.
+
+    Arguments:
+        path: String; CSV file path.
+
+    Returns:
+        digests: Pandas Series or None; hex digest per entry_id, or None if the
+                 file does not exist or has no entry_id column.
+    """
+    if not os.path.exists(path):
+        return None
+
+    text_df = read_text_csv(path)
+    if ENTRY_ID_COLUMN not in text_df:
+        return None
+
+    return row_digests(text_df)
+
+
+def compute_delta(previous, current):
+    """
+    Compare two sets of row digests.
+
+    Arguments:
+        previous: Pandas Series or None; digests of the previous output, None if there was none.
+        current: Pandas Series; digests of the new output.
+
+    Returns:
+        delta: Dictionary; added, removed and changed IDs, the number of unchanged
+               rows, and full (True when there was no previous output to compare with).
+    """
+    if previous is None:
+        return {"added": current.index.tolist(), "removed": [], "changed": [],
+                "unchanged": 0, "full": True}
+
+    common = current.index.intersection(previous.index)
+    changed = common[current[common].to_numpy() != previous[common].to_numpy()]
+
+    return {
+        "added": current.index.difference(previous.index).tolist(),
+        "removed": previous.index.difference(current.index).tolist(),
+        "changed": changed.tolist(),
+        "unchanged": len(common) - len(changed),
+        "full": False,
+    }
+
+
+def write_delta(delta, path):
+    """
+    Write a delta as JSON.
+
+    Arguments:
+        delta: Dictionary; output of compute_delta.
+        path: String; target JSON file path.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(delta, f)
+
+
+def delta_counters(delta):
+    """
+    Sizes of a delta, for instrumentation counters.
+    """
+    return {
+        "delta_added": len(delta["added"]),
+        "delta_removed": len(delta["removed"]),
+        "delta_changed": len(delta["changed"]),
+        "delta_unchanged": delta["unchanged"],
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Adds an entry_id column to an entries CSV.")
+    parser.add_argument("input_path", help="Entries CSV; entries are read from its entry column, "
+                        "or its last column if it has none.")
+    parser.add_argument("catalogue_year", help="Catalogue year, e.g. 1912.")
+    parser.add_argument("output_path", help="Output CSV.")
+    parser.add_argument("--no-header", action="store_true",
+                        help="The input has no header row, e.g. ecv_1912_revised.csv.")
+    args = parser.parse_args(sys.argv[1:])
+
+    df = pd.read_csv(args.input_path, dtype=str, keep_default_na=False,
+                     header=None if args.no_header else 0)
+    entry_column = "entry" if "entry" in df else df.columns[-1]
+    pages = (pd.to_numeric(df["page_num"], errors="coerce") if "page_num" in df
+             else [None] * len(df.index))
+    df[ENTRY_ID_COLUMN] = entry_ids(df[entry_column], pages, args.catalogue_year)
+    df.to_csv(args.output_path, index=False)
@@ -0,0 +1,256 @@
+"""
+This module represents segmented entries as span records over a single page
+buffer instead of as copied substrings. A span is (page, start, cut, end,
+flags): the entry is buffer[start:end], its terminator starts at cut (-1 when
+the entry has no terminator, e.g. the last piece of a page) and flags holds
+the FLAG_* bits. Entry text is only materialised when it is written out; the
+catalogue and document page numbers travel alongside it as columns.
+"""
+
+import re
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from entry_ids import ENTRY_ID_COLUMN, entry_ids
+
+SPAN_DTYPE = np.dtype([
+    ("page", np.int32),
+    ("start", np.int64),
+    ("cut", np.int64),
+    ("end", np.int64),
+    ("flags", np.uint8),
+])
+
+# Entry contains a month and year before its terminator.
+FLAG_LINE_MID = 1
+# Entry starts with whitespace or has no letters or digits.
+FLAG_FRONT_TRUNC = 2
+
+NON_WHITESPACE_RE = re.compile(r"\S")
+TRAILING_WHITESPACE_RE = re.compile(r"\s*\Z")
+ALPHANUMERIC_RE = re.compile(r"[A-Za-z0-9]")
+
+
+class PageBuffer:
+    """
+    The header-stripped pages of one volume, concatenated into one string.
+
+    Arguments:
+        pages: List; header-stripped page strings, in order.
+        document_page_delta: Integer; document page number minus catalogue page number.
+    """
+
+    def __init__(self, pages, document_page_delta=0):
+        self.text = "".join(pages)
+        self.page_starts = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum([len(page) for page in pages], out=self.page_starts[1:])
+        self.document_page_delta = document_page_delta
+
+    def __len__(self):
+        return len(self.page_starts) - 1
+
+    def page_bounds(self, page):
+        """
+        Start and end offsets of a 1-based catalogue page.
+        """
+        return int(self.page_starts[page - 1]), int(self.page_starts[page])
+
+    def strip_bounds(self, start, end):
+        """
+        Bounds of buffer[start:end] with leading and trailing whitespace removed.
+        """
+        return strip_bounds(self.text, start, end)
+
+    def entry_text(self, span):
+        """
+        Materialise the text of one span, with newlines replaced by spaces.
+        """
+        return self.text[int(span["start"]):int(span["end"])].replace("\n", " ")
+
+
+def strip_bounds(text, start, end):
+    """
+    Bounds of text[start:end] with leading and trailing whitespace removed.
+    """
+    match = NON_WHITESPACE_RE.search(text, start, end)
+    if match is None:
+        return end, end
+    return match.start(), TRAILING_WHITESPACE_RE.search(text, match.start(), end).start()
+
+
+class EntryTexts(Sequence):
+    """
+    Read-only sequence of entry strings backed by spans; each entry's text is
+    built when it is accessed.
+
+    Arguments:
+        buffer: PageBuffer; buffer the spans point into.
+        spans: Numpy Array; records of SPAN_DTYPE.
+    """
+
+    def __init__(self, buffer, spans):
+        self.buffer = buffer
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EntryTexts(self.buffer, self.spans[index])
+        return self.buffer.entry_text(self.spans[index])
+
+    def __iter__(self):
+        for span in self.spans:
+            yield self.buffer.entry_text(span)
+
+    def to_frame(self, catalogue_year=None):
+        """
+        Materialise the entries as a dataframe with entry, page_num and doc_page_num
+        columns, and an entry_id column when the catalogue year is given.
+        """
+        pages = self.spans["page"].astype(np.int64)
+        df = pd.DataFrame({
+            "entry": list(self),
+            "page_num": pages,
+            "doc_page_num": pages + self.buffer.document_page_delta,
+        })
+        if catalogue_year is not None:
+            df[ENTRY_ID_COLUMN] = entry_ids(df["entry"], pages.tolist(), catalogue_year)
+        return df
+
+
+def page_terminator_spans(text, terminator_re, start=0, end=None):
+    """
+    Cut one page, text[start:end], into entries at each terminator match; what
+    follows the last terminator is one more entry without a terminator.
+
+    Returns:
+        records: List; (start, cut, end) of each entry, as offsets into text.
+        terminator_hits: Integer; number of terminator matches.
+    """
+    end = len(text) if end is None else end
+    records = []
+    piece_start = start
+    for match in terminator_re.finditer(text, start, end):
+        # The page marker ends leading whitespace stripping at the terminator
+        leading = NON_WHITESPACE_RE.search(text, piece_start, match.start())
+        entry_start = match.start() if leading is None else leading.start()
+        records.append((entry_start, match.start(), match.end()))
+        piece_start = match.end()
+    terminator_hits = len(records)
+    entry_start, entry_end = strip_bounds(text, piece_start, end)
+    records.append((entry_start, -1, entry_end))
+    return records, terminator_hits
+
+
+def terminator_spans(buffer, terminator_re):
+    """
+    Cut every page into entries at each terminator match, see page_terminator_spans.
+
+    Arguments:
+        buffer: PageBuffer; header-stripped pages.
+        terminator_re: Compiled regex; entry terminator, matched per page with re.M.
+
+    Returns:
+        spans: Numpy Array; records of SPAN_DTYPE, whitespace-stripped, in page order.
+        terminator_hits: Integer; number of terminator matches.
+    """
+    records = []
+    terminator_hits = 0
+
+    for page in range(1, len(buffer) + 1):
+        page_start, page_end = buffer.page_bounds(page)
+        page_records, page_hits = page_terminator_spans(buffer.text, terminator_re, page_start, page_end)
+        records.extend((page, start, cut, end, 0) for start, cut, end in page_records)
+        terminator_hits += page_hits
+
+    return np.array(records, dtype=SPAN_DTYPE), terminator_hits
+
+
+def flag_line_mid(buffer, spans, marked_re, unmarked_re):
+    """
+    Set FLAG_LINE_MID on spans with a month and year before their terminator.
+
+    Arguments:
+        buffer: PageBuffer; buffer the spans point into.
+        spans: Numpy Array; records of SPAN_DTYPE, modified in place.
+        marked_re: Compiled regex; searched up to the terminator of spans that have one.
+        unmarked_re: Compiled regex; searched over the whole of spans without a terminator.
+    """
+    text = buffer.text
+    for index, (start, cut, end) in enumerate(zip(spans["start"].tolist(), spans["cut"].tolist(),
+                                                  spans["end"].tolist())):
+        if cut >= 0:
+            found = marked_re.search(text, start, cut)
+        else:
+            found = unmarked_re.search(text, start, end)
+        if found:
+            spans["flags"][index] |= FLAG_LINE_MID
+
+
+def flag_front_trunc(buffer, spans):
+    """
+    Set FLAG_FRONT_TRUNC on spans that start with whitespace or have no
+    letters or digits. Spans that end in a terminator are complete entries, so
+    never qualify.
+
+    Arguments:
+        buffer: PageBuffer; buffer the spans point into.
+        spans: Numpy Array; records of SPAN_DTYPE, modified in place.
+    """
+    text = buffer.text
+    for index in np.flatnonzero(spans["cut"] < 0).tolist():
+        start, end = int(spans["start"][index]), int(spans["end"][index])
+        if (start < end and text[start].isspace()) or ALPHANUMERIC_RE.search(text, start, end) is None:
+            spans["flags"][index] |= FLAG_FRONT_TRUNC
+
+
+def split_line_mid(buffer, spans, marked_re, unmarked_re, leading_re):
+    """
+    Split every FLAG_LINE_MID span at its first month and year. A span with a
+    terminator becomes the text up to and including the month and year (which
+    takes the place of the terminator) followed by the month and year alone. A span without
+    one becomes the text up to and including the month and year followed by
+    the text up to and including the next month and year, or to the end.
+
+    Arguments:
+        buffer: PageBuffer; buffer the spans point into.
+        spans: Numpy Array; records of SPAN_DTYPE.
+        marked_re: Compiled regex; month and year, searched up to the terminator.
+        unmarked_re: Compiled regex; month and year not at the end of the span.
+        leading_re: Compiled regex; leading characters dropped from the second piece
+                    of a span without a terminator.
+
+    Returns:
+        split_spans: Numpy Array; records of SPAN_DTYPE.
+        missing_page_marker: Integer; number of split spans without a terminator.
+    """
+    text = buffer.text
+    line_mid = np.flatnonzero(spans["flags"] & FLAG_LINE_MID)
+    pieces = np.zeros(len(spans) + len(line_mid), dtype=SPAN_DTYPE)
+
+    # Every line mid span is followed by one inserted piece
+    positions = np.arange(len(spans)) + np.searchsorted(line_mid, np.arange(len(spans)))
+    pieces[positions] = spans
+
+    missing_page_marker = 0
+    for index, position in zip(line_mid.tolist(), positions[line_mid].tolist()):
+        page, start, cut, end, flags = spans[index].tolist()
+        if cut >= 0:
+            match = marked_re.search(text, start, cut)
+            pieces[position] = (page, start, match.start(), match.end(), flags)
+            pieces[position + 1] = (page, match.start(), -1, match.end(), flags)
+        else:
+            missing_page_marker += 1
+            match = unmarked_re.search(text, start, end)
+            following = unmarked_re.search(text, match.end(), end)
+            second_end = end if following is None else following.end()
+            leading = leading_re.match(text, match.end(), second_end)
+            second_start = match.end() if leading is None else leading.end()
+            pieces[position] = (page, start, -1, match.end(), flags)
+            pieces[position + 1] = (page, second_start, -1, second_end, flags)
+
+    return pieces, missing_page_marker
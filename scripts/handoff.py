@@ -0,0 +1,194 @@
+"""
+This module runs the entries and dataframes stages of a year in one process,
+handing the clean entries from the segmenter to the dataframe extractor in
+memory. The year is segmented first, in full: entries run across page breaks
+and the line mid and density checks look at the whole year, so segmentation
+itself does not overlap extraction. What does overlap is the materialisation
+of the clean entries: a producer thread builds the text and entry ID of each
+batch of entry spans and puts it on a bounded queue, while the dataframe
+extractor takes batches off the queue, extracts their fields and appends them
+to the dataframe CSV. The saving over running the two stages one after the
+other comes mostly from never writing the clean entries and reading them back,
+and the entry CSVs are only written if asked for:
+
+``(python prefix) pipeline.py --years 1912 --stages entries dataframes --handoff True``
+``(python prefix) pipeline.py --years 1912 --stages entries dataframes --handoff True --write-entries False``
+
+Years whose dataframes are built from hand corrected entries rather than the
+segmenter's clean entries (see create_dataframes.get_clean_entries_file_path)
+run the two stages one after the other as usual.
+"""
+
+import os
+import queue
+import threading
+
+import pandas as pd
+
+from compressed_io import output_path, remove_stale_variants, resolve_path
+from corrections import get_corrections_path, read_corrections
+from create_dataframes import (create_year_dataframes, get_clean_entries_file_path, get_dataframe_paths,
+                               iter_entry_dataframes, save_dataframe_chunks, save_dataframe_delta)
+from create_entries import (clean_entries_and_measures_to_csv, create_year_entries, get_header_patterns,
+                            get_ocr_file_path, segment_entries)
+from entry_ids import ENTRY_ID_COLUMN, compute_delta, delta_counters, entry_ids, file_digests, write_delta
+from page_cache import PageCache
+
+# Clean entries per batch handed over when no --chunksize is given.
+HANDOFF_CHUNKSIZE = 2000
+
+# Batches the producer may be ahead of the dataframe extractor.
+HANDOFF_QUEUE_SIZE = 4
+
+CLEAN_ENTRIES_COLUMNS = ["entry", "page_num", "doc_page_num", ENTRY_ID_COLUMN]
+
+
+def produce_entry_batches(clean_entries, catalogue_year, chunksize, batch_queue, stop, frames=None):
+    """
+    Put the clean entries on a queue in batches of (entry, page_num, doc_page_num,
+    entry_id) tuples, followed by None. Runs in the producer thread; an exception
+    is put on the queue in place of the batch it was raised for.
+
+    Arguments:
+        clean_entries: EntryTexts; clean entries from create_entries.segment_entries.
+        catalogue_year: String; catalogue year the entry IDs are derived from.
+        chunksize: Integer; number of clean entries per batch.
+        batch_queue: Queue; bounded queue the batches are put on.
+        stop: Event; set by the consumer when it gives up, so that the producer does
+              not wait on a full queue forever.
+        frames: List or None; if given, every batch is also appended to it as a
+                dataframe, for writing the clean entries CSV afterwards.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        seen = {}
+        for start in range(0, len(clean_entries), chunksize):
+            batch = clean_entries[start:start + chunksize]
+            texts = list(batch)
+            pages = batch.spans["page"].tolist()
+            ids = entry_ids(texts, pages, catalogue_year, seen)
+            doc_pages = [page + batch.buffer.document_page_delta for page in pages]
+            if frames is not None:
+                frames.append(pd.DataFrame({"entry": texts, "page_num": pages, "doc_page_num": doc_pages,
+                                            ENTRY_ID_COLUMN: ids}, columns=CLEAN_ENTRIES_COLUMNS))
+            # Quotes are removed as read_clean_entries removes them, so that the main entry
+            # pattern accepts quoted publishers ("ELECTRICIAN, Nov. 12) in both modes
+            rows = [(text.replace("\"", ""), page, doc_page, entry_id)
+                    for text, page, doc_page, entry_id in zip(texts, pages, doc_pages, ids)]
+            if not put(rows):
+                return
+        put(None)
+    except Exception as error:
+        put(error)
+
+
+def queued_rows(batch_queue):
+    """
+    Clean entry rows taken off the queue until the producer's None, re-raising
+    an exception the producer put on it.
+    """
+    while True:
+        batch = batch_queue.get()
+        if batch is None:
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield from batch
+
+
+def create_year_entries_and_dataframes(year_string, cwd_path, verbose, recorder, chunksize=None, compression=None,
+                                       ocr_source="selected", page_cache_path=None, write_entries=True,
+                                       queue_size=HANDOFF_QUEUE_SIZE):
+    """
+    Segments one year's OCR file and creates its dataframes from the clean entries
+    in memory, recording the "segment", "dataframes" and "write_entries" stages.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        verbose: Boolean; If true, prints out metrics into CLI.
+        recorder: RunRecorder; records the stages.
+        chunksize: Integer or None; clean entries per batch, HANDOFF_CHUNKSIZE by default.
+        compression: String or None; compression of the CSVs written, see compressed_io.output_path.
+        ocr_source: String; one of OCR_SOURCES, see create_entries.get_ocr_file_path.
+        page_cache_path: String or None; page cache file relative to the repository root.
+        write_entries: Boolean; whether the entry CSVs, entries measures and entries delta
+                       are written as well.
+        queue_size: Integer; number of batches the segmenter may be ahead of the extractor.
+    """
+    clean_entries_path = output_path(f"{cwd_path}/entries/clean_entries/entries_19{year_string}.csv", compression)
+    if resolve_path(get_clean_entries_file_path(year_string, cwd_path)) != resolve_path(clean_entries_path):
+        # The dataframes are not built from the segmenter's output
+        create_year_entries(year_string, cwd_path, verbose, recorder, compression, ocr_source, page_cache_path)
+        create_year_dataframes(year_string, cwd_path, verbose, recorder, chunksize, compression)
+        return
+
+    catalogue_year = "19" + year_string
+    chunksize = chunksize or HANDOFF_CHUNKSIZE
+    file_path = get_ocr_file_path(year_string, cwd_path, ocr_source)
+    pattern = get_header_patterns(year_string)
+
+    page_cache = PageCache(os.path.join(cwd_path, page_cache_path)) if page_cache_path else None
+    try:
+        with recorder.stage(year_string, "segment", input_paths=[file_path]) as counters:
+            full_entries, clean_entries, clean_entries_measures, line_mid_entries, front_trunc_entries = segment_entries(
+                year_string, file_path, pattern, verbose, counters, page_cache)
+    finally:
+        if page_cache is not None:
+            page_cache.close()
+
+    df_paths = get_dataframe_paths(year_string, cwd_path, compression)
+    corrections_path = get_corrections_path(year_string, cwd_path)
+    corrections = read_corrections(corrections_path)
+    previous_digests = file_digests(resolve_path(df_paths[0]))
+    remove_stale_variants(df_paths[0])
+
+    frames = [] if write_entries else None
+    batch_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce_entry_batches, daemon=True,
+                                args=(clean_entries, catalogue_year, chunksize, batch_queue, stop, frames))
+
+    input_paths = [] if corrections is None else [corrections_path]
+    with recorder.stage(year_string, "dataframes", input_paths=input_paths,
+                        output_paths=[df_paths[0], df_paths[8], df_paths[10]]) as counters:
+        producer.start()
+        try:
+            df_chunks = iter_entry_dataframes(queued_rows(batch_queue), year_string, chunksize, counters,
+                                              corrections)
+            save_dataframe_chunks(df_chunks, df_paths, verbose, counters)
+        finally:
+            stop.set()
+            producer.join()
+        save_dataframe_delta(previous_digests, df_paths, counters)
+        counters["entries_in"] = len(clean_entries)
+
+    if not write_entries:
+        return
+
+    # The entry CSVs are a sink for the segmenter's output, not the dataframes' input
+    directories = ["/entries/full_entries/", "/entries/clean_entries/", "/entries/entries_measures/",
+                   "/entries/front_trunc_entries/", "/entries/line_mid_entries/"]
+    output_paths = [output_path(f"{cwd_path}/{directory}/entries_19{year_string}.csv", compression)
+                    for directory in directories if directory != "/entries/entries_measures/"]
+    delta_path = f"{cwd_path}/entries/entries_deltas/entries_delta_19{year_string}.json"
+    with recorder.stage(year_string, "write_entries", output_paths=output_paths + [delta_path]) as counters:
+        previous_digests = file_digests(resolve_path(clean_entries_path))
+        clean_entries_df = (pd.concat(frames, ignore_index=True) if frames
+                            else pd.DataFrame(columns=CLEAN_ENTRIES_COLUMNS))
+        clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entries_measures,
+                                          line_mid_entries, front_trunc_entries,
+                                          year_string, cwd_path, *directories, pattern, compression)
+        delta = compute_delta(previous_digests, file_digests(clean_entries_path))
+        write_delta(delta, delta_path)
+        counters.update(delta_counters(delta))
+        counters["entries_in"] = len(full_entries)
+        counters["entries_out"] = len(clean_entries_df.index)
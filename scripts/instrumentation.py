@@ -0,0 +1,224 @@
+"""
+This module records per-year, per-stage run metrics (wall time, CPU time,
+peak RSS, input/output bytes, entries in/out and regex hit counters) as JSON
+lines, and rebuilds the entries_measures text files from those counters.
+
+Running it as a script compares the latest run in a metrics file with the
+previous one, so slow stages and regressions show up without a profiler:
+``(python prefix) instrumentation.py ../metrics/pipeline_metrics.jsonl``
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process in megabytes, or None where
+    the resource module is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def total_bytes(paths):
+    """
+    Total size of the existing files among paths.
+    """
+    return sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+
+
+class RunRecorder:
+    """
+    Collects stage records for one pipeline run and appends them, one JSON
+    object per line, to a metrics file.
+
+    Arguments:
+        metrics_path: String or None; JSON lines file to append records to.
+        verbose: Boolean; If true, prints a one-line summary per stage into the CLI.
+        run_id: String or None; identifier shared by every record of the run, e.g. when
+                several processes record stages of the same run. Defaults to a timestamp.
+    """
+
+    def __init__(self, metrics_path=None, verbose=False, run_id=None):
+        self.metrics_path = metrics_path
+        self.verbose = verbose
+        self.run_id = run_id or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.records = []
+
+        if metrics_path is not None:
+            directory = os.path.dirname(metrics_path)
+            os.makedirs(directory or ".", exist_ok=True)
+
+    @contextmanager
+    def stage(self, year_string, stage, input_paths=(), output_paths=()):
+        """
+        Time one stage of one year. The yielded dictionary is for counters the
+        stage fills in itself: entries_in, entries_out and any regex hit counts.
+
+        Arguments:
+            year_string: String; string representation of year.
+            stage: String; stage name, e.g. "segment" or "dataframes".
+            input_paths: List; files read by the stage.
+            output_paths: List; files written by the stage, measured when it ends.
+
+        Yields:
+            counters: Dictionary; counter name -> integer.
+        """
+        counters = {}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        yield counters
+
+        record = {
+            "run_id": self.run_id,
+            "year": year_string,
+            "stage": stage,
+            "wall_seconds": time.perf_counter() - wall_start,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "peak_rss_mb": peak_rss_mb(),
+            "input_bytes": total_bytes(input_paths),
+            "output_bytes": total_bytes(output_paths),
+            "entries_in": counters.pop("entries_in", None),
+            "entries_out": counters.pop("entries_out", None),
+            "counters": counters,
+        }
+        self.records.append(record)
+
+        if self.metrics_path is not None:
+            with open(self.metrics_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+        if self.verbose:
+            print(format_record(record))
+
+
+def format_record(record):
+    """
+    One-line human readable summary of a stage record.
+    """
+    counters = " ".join(f"{key}={value}" for key, value in record["counters"].items())
+    return (f"[19{record['year']} {record['stage']}] "
+            f"wall {record['wall_seconds']:.2f}s cpu {record['cpu_seconds']:.2f}s "
+            f"rss {record['peak_rss_mb'] or 0:.0f}MB "
+            f"in {record['entries_in']} out {record['entries_out']} {counters}")
+
+
+def entries_measures_counters(clean_entries_measures):
+    """
+    Turn the clean_entries_measures list returned by the segmenters into counters.
+
+    Arguments:
+        clean_entries_measures: array; [line mid, percent line mid, front trunc,
+                                percent front trunc, clean, percent clean, full] and,
+                                optionally, the number of entries before line mid splitting.
+
+    Returns:
+        counters: Dictionary; counter name -> integer.
+    """
+    full_entries = clean_entries_measures[6]
+    return {
+        "segmented_entries": clean_entries_measures[7] if len(clean_entries_measures) > 7 else full_entries,
+        "line_mid_entries": clean_entries_measures[0],
+        "front_trunc_entries": clean_entries_measures[2],
+        "clean_entries": clean_entries_measures[4],
+        "full_entries": full_entries,
+    }
+
+
+def format_entries_measures(counters, pattern=""):
+    """
+    Rebuild the text of an entries_measures_19YY.txt file from counters.
+
+    Arguments:
+        counters: Dictionary; output of entries_measures_counters or the counters
+                  of a segment stage record.
+        pattern: Raw String or array; header pattern(s), written at the end if given.
+
+    Returns:
+        text: String; measures file contents.
+    """
+    segmented_entries = counters["segmented_entries"]
+    full_entries = counters["full_entries"]
+
+    text = f"Total Line Mid Entries: {counters['line_mid_entries']}\n"
+    text += f"Percent of Line Mid Entries: {counters['line_mid_entries'] / segmented_entries}\n\n"
+    text += f"Total Front Trunc Entries: {counters['front_trunc_entries']}\n"
+    text += f"Percent Front Trunc Entries: {counters['front_trunc_entries'] / full_entries}\n\n"
+    text += f"Total Clean Entries: {counters['clean_entries']}\n"
+    text += f"Percent Clean Entries: {counters['clean_entries'] / full_entries}\n\n"
+    text += f"Total Full Entries: {full_entries}\n\n"
+    if len(pattern) > 0:
+        text += f"Pattern: {pattern}"
+
+    return text
+
+
+def read_records(metrics_path):
+    """
+    Read every record from a metrics file.
+    """
+    with open(metrics_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_runs(records, threshold=1.2):
+    """
+    Compare the wall time of each (year, stage) in the latest run with the most
+    recent earlier run that has the same (year, stage).
+
+    Arguments:
+        records: List; stage records, e.g. from read_records.
+        threshold: Float; ratio of wall times above which a stage is flagged.
+
+    Returns:
+        rows: List; (year, stage, previous seconds, latest seconds, ratio, flagged).
+    """
+    if not records:
+        return []
+
+    latest_run = max(record["run_id"] for record in records)
+    previous = {}
+    latest = {}
+    for record in sorted(records, key=lambda record: record["run_id"]):
+        key = (record["year"], record["stage"])
+        if record["run_id"] == latest_run:
+            latest[key] = record
+        else:
+            previous[key] = record
+
+    rows = []
+    for key, record in sorted(latest.items()):
+        if key not in previous:
+            rows.append((key[0], key[1], None, record["wall_seconds"], None, False))
+            continue
+        before = previous[key]["wall_seconds"]
+        ratio = record["wall_seconds"] / before if before else None
+        rows.append((key[0], key[1], before, record["wall_seconds"], ratio,
+                     ratio is not None and ratio > threshold))
+
+    return rows
+
+
+if __name__ == "__main__":
+
+    metrics_path = sys.argv[1] if len(sys.argv) > 1 else "../metrics/pipeline_metrics.jsonl"
+
+    for year, stage, before, after, ratio, flagged in compare_runs(read_records(metrics_path)):
+        before_text = "-" if before is None else f"{before:.2f}s"
+        ratio_text = "-" if ratio is None else f"{ratio:.2f}x"
+        print(f"19{year} {stage:>12} {before_text:>10} -> {after:.2f}s {ratio_text:>8}"
+              + ("  SLOWER" if flagged else ""))
@@ -0,0 +1,234 @@
+"""
+This module reads the title, format, price and "net" flag out of the middle
+of an entry (the text between its creators and its publisher) in one pass.
+The title ends at the first match of a single forward search from its start,
+and one walk over the digit runs and "fo." tokens of the middle finds the
+format and the price together.
+
+The fields are the ones the per-field regexes of extract_entry_fields used to
+extract:
+
+    title   (?!^(?:No\\.|Cr\\.|Vo\\.|fo\\.|\\d+\\s?\\}?\\w|Illus\\.|Ryl\\.).*)^[^\\dA-ZÀ-ž]*([\\dA-ZÀ-ž].+?)
+            (?:(?<!\\W[A-ZÀ-ž]|No|id|pp)\\.|[,.]?\\W(?=No\\.|Cr\\.|Vo\\.|fo\\.|\\d+\\s?\\}?\\w|Illus\\.|Ryl\\.))
+    format  \\W(fo\\.|\\d+[tvm]o[,.]?)\\W
+    price   (\\d+s\\.?,?\\s*\\d+d\\.?,?|\\d+s\\.?,?|\\d+d\\.?,?)\\s*(net)?(?!.*\\1)(?=(?:\\s*\\([^\\)]+\\))*[\\s.]*$)
+
+and lex_middle returns the same values for every middle. The price pattern
+tried every digit against a lookahead over the rest of the middle; the lexer
+only tries the price shaped tokens in the price, "net" and series text that
+ends the middle.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Digit runs and "fo.", the tokens a format or a price starts with.
+FIELD_TOKEN_RE = re.compile(r"\d+|fo\.")
+
+# End of a title: a period that does not follow an initial or a common
+# abbreviation, or the non-word character before a format, number or series.
+TITLE_END_RE = re.compile(r"(?<!\W[A-ZÀ-ž]|No|id|pp)\.|[,.]?\W(?=No\.|Cr\.|Vo\.|fo\.|\d+\s?\}?\w|Illus\.|Ryl\.)")
+
+# Price, "net" and parenthetical series characters, matched backwards from the
+# end of a middle.
+PRICE_SUFFIX_REVERSED_RE = re.compile(r"(?:[\d\s.,sdnet]|\)[^\)]+\()*")
+
+# What may follow a price: parenthetical series, whitespace and periods.
+PRICE_TRAILER_RE = re.compile(r"(?:\s*\([^\)]+\))*[\s.]*$")
+
+PRICE_COMMA_RE = re.compile(r"([ds]),")
+SHILLINGS_SPACE_RE = re.compile(r"s\.?\s+")
+
+TITLE_START_RE = re.compile(r"[\dA-ZÀ-ž]")
+
+TITLE_ABBREVIATIONS = ("No.", "Cr.", "Vo.", "fo.", "Illus.", "Ryl.")
+
+MIDDLE_FIELDS = ["title", "format", "price", "is_net"]
+
+
+def is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def digits_end(middle, start):
+    """
+    End of the run of digits starting at start.
+    """
+    end = start
+    while end < len(middle) and middle[end].isdecimal():
+        end += 1
+    return end
+
+
+def is_numbered(middle, start, end):
+    """
+    Whether the digit run middle[start:end] starts a "\\d+\\s?\\}?\\w" sequence,
+    e.g. "8vo", "12 mo" or "42".
+    """
+    if end - start >= 2:
+        return True
+    position = end
+    if position < len(middle) and middle[position].isspace():
+        position += 1
+    if position < len(middle) and middle[position] == "}":
+        position += 1
+    return position < len(middle) and is_word_char(middle[position])
+
+
+def starts_abbreviation(middle, start):
+    """
+    Whether a title-ending abbreviation or numbered word starts at start.
+    """
+    if middle.startswith(TITLE_ABBREVIATIONS, start):
+        return True
+    if start < len(middle) and middle[start].isdecimal():
+        return is_numbered(middle, start, digits_end(middle, start))
+    return False
+
+
+def optional_tails(middle, position):
+    """
+    Ends of "\\.?,?" matched at position, in the order a regex tries them.
+    """
+    ends = [position]
+    if position < len(middle) and middle[position] == ".":
+        ends.append(position + 1)
+        position += 1
+    if position < len(middle) and middle[position] == ",":
+        ends.append(position + 1)
+    return ends[::-1]
+
+
+def price_ends(middle, start, end):
+    """
+    Ends of the price shaped matches of a digit run middle[start:end], in the
+    order the price alternatives and their optional periods and commas are tried.
+    """
+    if end >= len(middle) or middle[end] not in "sd":
+        return []
+    ends = []
+    if middle[end] == "s":
+        # Shillings and pence: only the greedy separator can be followed by digits
+        position = end + 1
+        if position < len(middle) and middle[position] == ".":
+            position += 1
+        if position < len(middle) and middle[position] == ",":
+            position += 1
+        while position < len(middle) and middle[position].isspace():
+            position += 1
+        pence_end = digits_end(middle, position)
+        if pence_end > position and pence_end < len(middle) and middle[pence_end] == "d":
+            ends += optional_tails(middle, pence_end + 1)
+    ends += optional_tails(middle, end + 1)
+    return list(dict.fromkeys(ends))
+
+
+def price_follows(middle, price, position):
+    """
+    Whether the price is the last on its line from position and only a
+    parenthetical series, whitespace and periods follow it.
+    """
+    later = middle.find(price, position)
+    if later != -1 and "\n" not in middle[position:later]:
+        return False
+    return PRICE_TRAILER_RE.match(middle, position) is not None
+
+
+def match_price(middle, start, end):
+    """
+    Price and "net" of the digit run middle[start:end], or None if no price ends the middle there.
+    """
+    for price_end in price_ends(middle, start, end):
+        price = middle[start:price_end]
+        position = price_end
+        while position < len(middle) and middle[position].isspace():
+            position += 1
+        if middle.startswith("net", position) and price_follows(middle, price, position + 3):
+            return price, "net"
+        if price_follows(middle, price, position):
+            return price, None
+    return None
+
+
+def match_format(middle, start, end):
+    """
+    Format of the token middle[start:end] at a word start, or None.
+    """
+    if middle[start] == "f":
+        if end < len(middle) and not is_word_char(middle[end]):
+            return "fo."
+        return None
+    if end + 1 >= len(middle) or middle[end] not in "tvm" or middle[end + 1] != "o":
+        return None
+    format_end = end + 2
+    # "[,.]?" is greedy, but gives up its character if no non-word character follows it
+    if format_end + 1 < len(middle) and middle[format_end] in ",." and not is_word_char(middle[format_end + 1]):
+        return middle[start:format_end + 1]
+    if format_end < len(middle) and not is_word_char(middle[format_end]):
+        return middle[start:format_end]
+    return None
+
+
+def clean_price(price):
+    """
+    Normalise the punctuation of an extracted price, e.g. "3s.6d," -> "3s. 6d.".
+    """
+    price = PRICE_COMMA_RE.sub("\\1.", price)
+    price = SHILLINGS_SPACE_RE.sub("s. ", price)
+    return price.strip(",\\s")
+
+
+def lex_middle(middle):
+    """
+    Title, format, price and "net" of an entry's middle.
+
+    Arguments:
+        middle: String; the text between an entry's creators and its publisher.
+
+    Returns:
+        fields: Tuple; (title, format, price, is_net), None where a field is not found.
+    """
+    if not isinstance(middle, str):
+        return None, None, None, None
+
+    # A middle that starts with an abbreviation has no title
+    title = None
+    if not starts_abbreviation(middle, 0):
+        start = TITLE_START_RE.search(middle)
+        end = None if start is None else TITLE_END_RE.search(middle, start.start() + 2)
+        if end is not None and "\n" not in middle[start.start() + 1:end.start()]:
+            title = middle[start.start():end.start()]
+
+    # A price can only start in the run of price, "net" and series text that ends the middle
+    price_start = len(middle) - PRICE_SUFFIX_REVERSED_RE.match(middle[::-1]).end()
+    fmt = price = is_net = None
+
+    for token in FIELD_TOKEN_RE.finditer(middle):
+        start, end = token.span()
+        if fmt is None and start > 0 and not is_word_char(middle[start - 1]):
+            fmt = match_format(middle, start, end)
+        if price is None and start >= price_start and end < len(middle) and middle[end] in "sd":
+            matched = match_price(middle, start, end)
+            if matched is not None:
+                price, is_net = matched
+        if fmt is not None and price is not None:
+            break
+
+    return title, fmt, None if price is None else clean_price(price), is_net
+
+
+def middle_fields(middles):
+    """
+    Lex every middle of a column.
+
+    Arguments:
+        middles: Pandas Series; entry middles, NaN where an entry has none.
+
+    Returns:
+        fields: Pandas Dataframe; MIDDLE_FIELDS columns, with the index and string dtype of middles.
+    """
+    rows = [lex_middle(middle) for middle in middles.tolist()]
+    fields = pd.DataFrame(rows, index=middles.index, columns=MIDDLE_FIELDS, dtype=object)
+    return fields.fillna(np.nan).astype(middles.dtype)
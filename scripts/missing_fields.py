@@ -0,0 +1,142 @@
+"""
+This module partitions a full dataframe by which fields are missing. A single
+vectorised pass turns the nulls of every tracked column into one bitmask per
+row; the missing_* dataframes and the dataframe_measures percentages are all
+derived from that bitmask instead of filtering the dataframe once per field.
+"""
+
+import numpy as np
+
+# Bit set in the missing_fields column when the corresponding field is null.
+MISSING_FIELD_BITS = {
+    "first_name": 1,
+    "format": 2,
+    "last_name": 4,
+    "price": 8,
+    "publisher": 16,
+    "title": 32,
+}
+
+MISSING_FIELDS_COLUMN = "missing_fields"
+
+# Number of distinct bitmask values, used as the bincount length.
+NUM_PATTERNS = 1 << len(MISSING_FIELD_BITS)
+
+# Rows with both a publisher and a title.
+CLEAN_BITS = MISSING_FIELD_BITS["publisher"] | MISSING_FIELD_BITS["title"]
+
+# Category -> label used in the dataframe_measures files, in file order.
+MEASURE_LABELS = {
+    "first_name": "Missing First Name",
+    "last_name": "Missing Last Name",
+    "format": "Missing Format",
+    "price": "Missing Price",
+    "publisher": "Missing Publisher",
+    "title": "Missing Title",
+    "clean": "Clean Dataframe",
+}
+
+
+def missing_field_mask(full_df):
+    """
+    Compute the missing-field bitmask of every row in one vectorised pass.
+
+    Arguments:
+        full_df: Pandas Dataframe; object that contains all extracted information.
+
+    Returns:
+        mask: Numpy Array; uint8 bitmask per row, see MISSING_FIELD_BITS.
+    """
+    columns = list(MISSING_FIELD_BITS)
+    bits = np.array([MISSING_FIELD_BITS[column] for column in columns], dtype=np.uint8)
+    nulls = full_df[columns].isna().to_numpy()
+
+    return (nulls.astype(np.uint8) * bits).sum(axis=1, dtype=np.uint8)
+
+
+def category_selector(category, mask):
+    """
+    Boolean row selector for one missing-field category.
+
+    Arguments:
+        category: String; a key of MISSING_FIELD_BITS, "clean" (publisher and title
+                  present) or "missing_title_and_publisher" (publisher or title missing).
+        mask: Numpy Array; bitmask from missing_field_mask.
+
+    Returns:
+        selector: Numpy Array; boolean array, True for the rows in the category.
+    """
+    if category == "clean":
+        return (mask & CLEAN_BITS) == 0
+    if category == "missing_title_and_publisher":
+        return (mask & CLEAN_BITS) != 0
+    return (mask & MISSING_FIELD_BITS[category]) != 0
+
+
+def missing_view(full_df, category):
+    """
+    Rows of a partitioned dataframe that fall in one missing-field category.
+
+    Arguments:
+        full_df: Pandas Dataframe; dataframe with a missing_fields column.
+        category: String; see category_selector.
+
+    Returns:
+        view_df: Pandas Dataframe; rows of full_df in the category.
+    """
+    mask = full_df[MISSING_FIELDS_COLUMN].to_numpy()
+    return full_df.loc[category_selector(category, mask)]
+
+
+def pattern_counts(mask):
+    """
+    Count how many rows have each bitmask value. Counts from several chunks of
+    the same year can be added together.
+
+    Arguments:
+        mask: Numpy Array; bitmask from missing_field_mask.
+
+    Returns:
+        counts: Numpy Array; number of rows per bitmask value.
+    """
+    return np.bincount(mask, minlength=NUM_PATTERNS)
+
+
+def missing_field_measures(counts):
+    """
+    Derive the dataframe_measures totals and percentages from bitmask counts.
+
+    Arguments:
+        counts: Numpy Array; output of pattern_counts.
+
+    Returns:
+        measures: Dictionary; category -> (total rows, percent of all rows), plus
+                  "full" -> total number of rows.
+    """
+    patterns = np.arange(len(counts))
+    total_full = int(counts.sum())
+
+    measures = {}
+    for category in list(MISSING_FIELD_BITS) + ["clean", "missing_title_and_publisher"]:
+        total = int(counts[category_selector(category, patterns)].sum())
+        percent = total / total_full if total_full else 0
+        measures[category] = (total, percent)
+    measures["full"] = total_full
+
+    return measures
+
+
+def write_dataframe_measures(measures, path):
+    """
+    Write missing-field measures in the dataframe_measures text format.
+
+    Arguments:
+        measures: Dictionary; output of missing_field_measures.
+        path: String; target txt file path.
+    """
+    with open(path, "w", newline='', encoding="utf-8", errors="ignore") as f:
+        for category, label in MEASURE_LABELS.items():
+            total, percent = measures[category]
+            f.write(f"Total {label} Rows: {total}\n")
+            f.write(f"Percent {label} Rows: {percent}\n\n")
+        f.write(f"Total Dataframe Rows: {measures['full']}")
@@ -0,0 +1,167 @@
+"""
+This module caches the header-stripped, terminator-tagged pages that
+get_clean_entries builds its spans from. A page is stored under a hash of its
+OCR text and of the header and terminator patterns that processed it, so a
+later run reuses every page whose text and patterns are unchanged. Changing a
+downstream rule (line mid splitting, truncation flags, dataframe parsing) then
+reruns no header stripping or terminator matching, and editing an OCR file only
+redoes the pages that were edited.
+
+The cache is a SQLite file (/page_cache/pages.db by default); deleting it is
+always safe.
+"""
+
+import os
+import sqlite3
+import hashlib
+
+import numpy as np
+
+from entry_spans import SPAN_DTYPE, PageBuffer, page_terminator_spans
+
+# Bumped whenever header stripping or terminator tagging changes in a way the
+# patterns do not capture, so that pages cached by older code are not reused.
+PAGE_CACHE_VERSION = 1
+
+PAGE_CACHE_TABLE = "tagged_pages"
+
+# Default cache file, relative to the repository root.
+PAGE_CACHE_PATH = "page_cache/pages.db"
+
+
+def patterns_fingerprint(header_patterns, terminator_re):
+    """
+    Digest of everything besides a page's own text that decides how it is tagged.
+
+    Arguments:
+        header_patterns: List; raw regex strings removed from every page.
+        terminator_re: Compiled regex; entry terminator.
+
+    Returns:
+        fingerprint: Bytes; blake2b digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in [str(PAGE_CACHE_VERSION), *header_patterns, terminator_re.pattern, str(terminator_re.flags)]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def page_key(fingerprint, page):
+    """
+    Cache key of one page's OCR text processed with the patterns of a fingerprint.
+    """
+    return hashlib.blake2b(page.encode("utf-8", "surrogatepass"), digest_size=16, key=fingerprint).hexdigest()
+
+
+class PageCache:
+    """
+    Header-stripped page text and terminator spans by page key, in a SQLite file.
+
+    Arguments:
+        db_path: String; SQLite database file path, created if needed.
+        timeout: Float; seconds to wait on a cache locked by another process.
+    """
+
+    def __init__(self, db_path, timeout=60):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=timeout)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {PAGE_CACHE_TABLE} "
+                                f"(page_key TEXT PRIMARY KEY, text TEXT NOT NULL, spans BLOB NOT NULL)")
+        self.connection.commit()
+
+    def get_many(self, keys):
+        """
+        Cached (text, spans) of every key found, where spans is an (n, 3) int64
+        array of page-relative (start, cut, end).
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for offset in range(0, len(unique_keys), 500):
+            batch = unique_keys[offset:offset + 500]
+            rows = self.connection.execute(f"SELECT page_key, text, spans FROM {PAGE_CACHE_TABLE} "
+                                           f"WHERE page_key IN ({', '.join('?' * len(batch))})", batch)
+            for key, text, spans in rows:
+                found[key] = (text, np.frombuffer(spans, dtype=np.int64).reshape(-1, 3))
+        return found
+
+    def put_many(self, items):
+        """
+        Store (key, text, spans) items.
+        """
+        with self.connection:
+            self.connection.executemany(f"INSERT OR REPLACE INTO {PAGE_CACHE_TABLE} (page_key, text, spans) "
+                                        f"VALUES (?, ?, ?)",
+                                        [(key, text, np.asarray(spans, dtype=np.int64).tobytes())
+                                         for key, text, spans in items])
+
+    def close(self):
+        self.connection.close()
+
+
+def tag_pages(pages, strip_page, terminator_re, document_page_delta=0, cache=None,
+              header_patterns=(), counters=None):
+    """
+    Strip the headers of every page and cut it into entries at each terminator,
+    reusing the cached result of every page whose text and patterns are unchanged.
+
+    Arguments:
+        pages: List; OCR page strings, in order.
+        strip_page: Function; page string -> header-stripped page string.
+        terminator_re: Compiled regex; entry terminator, matched per page with re.M.
+        document_page_delta: Integer; document page number minus catalogue page number.
+        cache: PageCache or None; cache to read and fill, or None to tag every page.
+        header_patterns: List; raw regex strings strip_page removes, part of the cache key.
+        counters: Dictionary or None; if given, filled with page cache hits and misses.
+
+    Returns:
+        buffer: PageBuffer; header-stripped pages.
+        spans: Numpy Array; records of SPAN_DTYPE, as entry_spans.terminator_spans returns.
+        terminator_hits: Integer; number of terminator matches.
+    """
+    keys = [None] * len(pages)
+    cached = {}
+    if cache is not None:
+        fingerprint = patterns_fingerprint(header_patterns, terminator_re)
+        keys = [page_key(fingerprint, page) for page in pages]
+        cached = cache.get_many(keys)
+
+    stripped_pages, page_spans, new_items = [], [], {}
+    for key, page in zip(keys, pages):
+        if key in cached:
+            text, spans = cached[key]
+        elif key in new_items:
+            _, text, spans = new_items[key]
+        else:
+            text = strip_page(page)
+            records, _ = page_terminator_spans(text, terminator_re)
+            spans = np.array(records, dtype=np.int64).reshape(-1, 3)
+            if key is not None:
+                new_items[key] = (key, text, spans)
+        stripped_pages.append(text)
+        page_spans.append(spans)
+
+    if new_items:
+        cache.put_many(new_items.values())
+
+    buffer = PageBuffer(stripped_pages, document_page_delta)
+    spans = np.zeros(sum(len(page_records) for page_records in page_spans), dtype=SPAN_DTYPE)
+    position = 0
+    terminator_hits = 0
+    for page, page_records in enumerate(page_spans, start=1):
+        count = len(page_records)
+        page_start = buffer.page_starts[page - 1]
+        block = spans[position:position + count]
+        block["page"] = page
+        block["start"] = page_records[:, 0] + page_start
+        # A cut of -1 marks an entry without a terminator and is not an offset
+        block["cut"] = np.where(page_records[:, 1] >= 0, page_records[:, 1] + page_start, -1)
+        block["end"] = page_records[:, 2] + page_start
+        terminator_hits += int((page_records[:, 1] >= 0).sum())
+        position += count
+
+    if counters is not None and cache is not None:
+        counters["page_cache_hits"] = sum(key in cached for key in keys)
+        counters["page_cache_misses"] = len(pages) - counters["page_cache_hits"]
+
+    return buffer, spans, terminator_hits
@@ -0,0 +1,322 @@
+"""
+Single entry point for the whole pipeline. The stages form a dependency graph,
+
+    OCR files -> (reconcile) -> entries ----------> dataframes -> database
+              -> fuzzy_entries
+
+and every (year, stage) pair is one task. Tasks whose dependencies have
+finished run concurrently on up to --jobs processes, so reprocessing a single
+year end to end or the whole corpus needs no code edits:
+
+``(python prefix) pipeline.py --years 1912 --stages entries dataframes database``
+``(python prefix) pipeline.py --jobs 8``
+
+The reconcile stage (reconcile_ocr.py) only runs when selected, and the
+entries stage segments its merged OCR files with --ocr-source reconciled:
+``(python prefix) pipeline.py --years 1912 --stages reconcile entries --ocr-source reconciled``
+
+With --handoff True, a year's entries and dataframes stages run as one task
+that hands the clean entries over in memory (see handoff.py):
+``(python prefix) pipeline.py --years 1912 --stages entries dataframes --handoff True``
+"""
+
+import os
+import sys
+import argparse
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from compressed_io import COMPRESSION_CHOICES
+from page_cache import PAGE_CACHE_PATH
+from reconcile_ocr import OCR_SOURCES
+from instrumentation import RunRecorder
+
+STAGES = ["reconcile", "entries", "fuzzy_entries", "dataframes", "database"]
+
+# Stages run when --stages is not given.
+DEFAULT_STAGES = ["entries", "fuzzy_entries", "dataframes", "database"]
+
+# Task that runs a year's entries and dataframes stages together with --handoff.
+HANDOFF_STAGE = "entries+dataframes"
+
+# Stage -> stages that must have finished for the same year first.
+STAGE_DEPENDENCIES = {
+    "reconcile": [],
+    "entries": ["reconcile"],
+    "fuzzy_entries": [],
+    "dataframes": ["entries"],
+    "database": ["dataframes"],
+}
+
+# Stage -> years the stage has patterns and inputs for.
+STAGE_YEARS = {
+    "reconcile": [f"{year:02d}" for year in range(2, 23)],
+    "entries": [f"{year:02d}" for year in range(2, 23)],
+    "fuzzy_entries": [f"{year:02d}" for year in range(8, 19)],
+    "dataframes": [f"{year:02d}" for year in range(2, 23)],
+    "database": [f"{year:02d}" for year in range(2, 23)],
+}
+
+# Stage -> years run when --years is not given.
+DEFAULT_STAGE_YEARS = {
+    "reconcile": [f"{year:02d}" for year in range(2, 23)],
+    "entries": STAGE_YEARS["entries"],
+    "fuzzy_entries": STAGE_YEARS["fuzzy_entries"],
+    "dataframes": [f"{year:02d}" for year in range(12, 22)],
+    "database": [f"{year:02d}" for year in range(12, 22)],
+}
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Runs the reconcile, entries, fuzzy entries, dataframes '
+                                                 'and database stages for a selection of years.')
+
+    parser.add_argument("--years", nargs="+", default=None,
+            help="Years or inclusive year ranges, e.g. 1912, 12 or 1908-1918. "
+                 "By default each stage runs over the years its script covers.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=DEFAULT_STAGES,
+            help="Stages to run. Stages that are not selected are assumed to be up to date on disk.")
+    parser.add_argument("--jobs", type=int, default=1,
+            help="Number of (year, stage) tasks run at the same time.")
+    parser.add_argument("--verbose", type=str, default="False",
+            help="Prints out entry and dataframe metrics into the CLI.")
+    parser.add_argument("--fuzzy-workers", type=int, default=1,
+            help="Number of processes that score the pages of each year in the fuzzy entries stage.")
+    parser.add_argument("--chunksize", type=int, default=None,
+            help="Number of clean entries processed per batch when creating dataframes.")
+    parser.add_argument("--handoff", type=str, default="False",
+            help="Runs the entries and dataframes stages of a year as one task that hands the clean "
+                 "entries to the dataframe extractor in memory instead of through the clean entries CSV.")
+    parser.add_argument("--write-entries", type=str, default="True",
+            help="With --handoff True, whether the entry CSVs are still written.")
+    parser.add_argument("--compression", type=str, choices=COMPRESSION_CHOICES, default=None,
+            help="Compression of the entry and dataframe CSVs written. By default each output "
+                 "keeps the format it already has on disk.")
+    parser.add_argument("--ocr-source", type=str, choices=OCR_SOURCES, default="selected",
+            help="OCR file the entries stage segments: the file selected for each year, or the "
+                 "merge of both OCR sources written by the reconcile stage.")
+    parser.add_argument("--page-cache", type=str, default=PAGE_CACHE_PATH,
+            help="SQLite file, relative to the repository root, that the entries stage caches "
+                 "header-stripped and tagged pages in. An empty string disables the cache.")
+    parser.add_argument("--database", type=str, default="ecb_catalogue.db",
+            help="SQLite database, relative to the repository root, loaded by the database stage.")
+    parser.add_argument("--metrics", type=str, default="metrics/pipeline_metrics.jsonl",
+            help="JSON lines file, relative to the repository root, that per-stage run metrics are appended to.")
+
+    return parser.parse_args(args)
+
+
+def parse_years(year_arguments):
+    """
+    Turn --years arguments into two-digit year strings.
+
+    Arguments:
+        year_arguments: List; strings such as "1912", "12" or "1908-1918".
+
+    Returns:
+        year_strings: List; sorted, unique two-digit year strings.
+    """
+    years = set()
+    for argument in year_arguments:
+        first, _, last = argument.partition("-")
+        first = int(first) % 100
+        last = int(last) % 100 if last else first
+        if last < first:
+            raise ValueError(f"Year range {argument} ends before it starts.")
+        years.update(range(first, last + 1))
+
+    return [f"{year:02d}" for year in sorted(years)]
+
+
+def plan_tasks(stages, year_strings=None, handoff=False):
+    """
+    Build the task graph for a selection of stages and years.
+
+    Arguments:
+        stages: List; selected stages.
+        year_strings: List or None; selected years, or None for DEFAULT_STAGE_YEARS.
+        handoff: Boolean; if true, a year with both an entries and a dataframes task
+                 gets one HANDOFF_STAGE task in their place.
+
+    Returns:
+        tasks: Dictionary; (year_string, stage) -> set of (year_string, stage) tasks it
+               waits for. Only selected tasks appear as dependencies.
+    """
+    tasks = {}
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        years = DEFAULT_STAGE_YEARS[stage] if year_strings is None else year_strings
+        for year_string in years:
+            if year_string in STAGE_YEARS[stage]:
+                tasks[(year_string, stage)] = set()
+
+    # (year_string, stage) -> handoff task that stands for it
+    fused = {}
+    if handoff:
+        for year_string in {year_string for year_string, _ in tasks}:
+            if (year_string, "entries") in tasks and (year_string, "dataframes") in tasks:
+                del tasks[(year_string, "entries")], tasks[(year_string, "dataframes")]
+                tasks[(year_string, HANDOFF_STAGE)] = set()
+                fused[(year_string, "entries")] = fused[(year_string, "dataframes")] = (year_string, HANDOFF_STAGE)
+
+    for (year_string, stage), dependencies in tasks.items():
+        stage_dependencies = (STAGE_DEPENDENCIES["entries"] if stage == HANDOFF_STAGE
+                              else STAGE_DEPENDENCIES[stage])
+        for dependency in stage_dependencies:
+            dependency = fused.get((year_string, dependency), (year_string, dependency))
+            if dependency in tasks:
+                dependencies.add(dependency)
+
+    return tasks
+
+
+def run_task(year_string, stage, cwd_path, options):
+    """
+    Run one (year, stage) task. Runs in a worker process when --jobs is above 1.
+
+    Arguments:
+        year_string: String; string representation of year.
+        stage: String; one of STAGES.
+        cwd_path: String; repository root path.
+        options: Dictionary; verbose, fuzzy_workers, chunksize, write_entries, compression, ocr_source,
+                 page_cache, database, metrics and run_id.
+    """
+    recorder = RunRecorder(os.path.join(cwd_path, options["metrics"]),
+                           options["verbose"], options["run_id"])
+
+    if stage == "reconcile":
+        from reconcile_ocr import reconcile_year
+        reconcile_year(year_string, cwd_path, recorder)
+
+    elif stage == "entries":
+        from create_entries import create_year_entries
+        create_year_entries(year_string, cwd_path, options["verbose"], recorder, options["compression"],
+                            options["ocr_source"], options["page_cache"])
+
+    elif stage == HANDOFF_STAGE:
+        from handoff import create_year_entries_and_dataframes
+        create_year_entries_and_dataframes(year_string, cwd_path, options["verbose"], recorder,
+                                           options["chunksize"], options["compression"], options["ocr_source"],
+                                           options["page_cache"], options["write_entries"])
+
+    elif stage == "fuzzy_entries":
+        from scaled_fuzzy_matching import create_year_fuzzy_entries
+        create_year_fuzzy_entries(year_string, cwd_path, recorder, options["fuzzy_workers"])
+
+    elif stage == "dataframes":
+        from create_dataframes import create_year_dataframes
+        create_year_dataframes(year_string, cwd_path, options["verbose"], recorder,
+                               options["chunksize"], options["compression"])
+
+    elif stage == "database":
+        from catalogue_database import load_year
+        from create_dataframes import get_dataframe_paths
+        from entry_ids import delta_counters
+        df_path = get_dataframe_paths(year_string, cwd_path)[0]
+        db_path = os.path.join(cwd_path, options["database"])
+        with recorder.stage(year_string, "database", input_paths=[df_path],
+                            output_paths=[db_path]) as counters:
+            delta = load_year(db_path, year_string, df_path)
+            counters.update(delta_counters(delta))
+            counters["entries_out"] = len(delta["added"]) + len(delta["changed"])
+
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+
+def run_pipeline(tasks, cwd_path, options, jobs=1):
+    """
+    Run every task once its dependencies have finished. A failed task is
+    reported and the tasks that depend on it are skipped; the others still run.
+
+    Arguments:
+        tasks: Dictionary; output of plan_tasks.
+        cwd_path: String; repository root path.
+        options: Dictionary; see run_task.
+        jobs: Integer; number of tasks run at the same time.
+
+    Returns:
+        failed: List; (year_string, stage) tasks that failed or were skipped.
+    """
+    waiting = {task: set(dependencies) for task, dependencies in tasks.items()}
+    failed = []
+
+    def skip_dependents(task):
+        for other in [other for other, dependencies in waiting.items() if task in dependencies]:
+            del waiting[other]
+            print(f"[19{other[0]} {other[1]}] skipped")
+            failed.append(other)
+            skip_dependents(other)
+
+    def finish(task, error=None):
+        if error is not None:
+            print(f"[19{task[0]} {task[1]}] failed: {error!r}")
+            failed.append(task)
+            skip_dependents(task)
+            return
+        for dependencies in waiting.values():
+            dependencies.discard(task)
+
+    def ready():
+        tasks_ready = sorted(task for task, dependencies in waiting.items() if not dependencies)
+        for task in tasks_ready:
+            del waiting[task]
+        return tasks_ready
+
+    if jobs <= 1:
+        while waiting:
+            for task in ready():
+                try:
+                    run_task(task[0], task[1], cwd_path, options)
+                except Exception as error:
+                    finish(task, error)
+                else:
+                    finish(task)
+        return failed
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while waiting or running:
+            for task in ready():
+                running[executor.submit(run_task, task[0], task[1], cwd_path, options)] = task
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.exception())
+
+    return failed
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    options = {
+        "verbose": args.verbose == "True",
+        "fuzzy_workers": args.fuzzy_workers,
+        "chunksize": args.chunksize,
+        "write_entries": args.write_entries == "True",
+        "compression": args.compression,
+        "ocr_source": args.ocr_source,
+        "page_cache": args.page_cache or None,
+        "database": args.database,
+        "metrics": args.metrics,
+        "run_id": datetime.datetime.now().strftime("%Y%m%dT%H%M%S"),
+    }
+
+    year_strings = parse_years(args.years) if args.years else None
+    tasks = plan_tasks(args.stages, year_strings, args.handoff == "True")
+
+    failed = run_pipeline(tasks, cwd_path, options, args.jobs)
+    print(f"{len(tasks) - len(failed)} of {len(tasks)} tasks finished.")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,463 @@
+"""
+This module reconciles the two OCR sources of a year: the /princeton_years/
+file and the /new_text_files/ file (ecb_19YY_*_070724.txt). The file that
+create_entries.get_ocr_file_path selects is the primary source and keeps its
+pages and lines. Each of its lines is aligned with the line it reads as in the
+other source, and where the two readings differ, the one that fits the
+catalogue better is kept:
+``(python prefix) reconcile_ocr.py --years 1908-1918``
+
+Alignment is anchored on runs of ANCHOR_LINES lines whose rolling hash is
+unique in both sources, so it takes near-linear time. Only the short stretches
+between anchors are diffed. The merged OCR file is written to
+/reconciled/ecb_19YY.txt, where create_entries.py --ocr-source reconciled
+reads it. Lines where the sources disagree and neither reading is clearly
+better keep the primary reading and are listed in
+/reconciled/reconcile_flags_19YY.csv.
+"""
+
+import os
+import re
+import csv
+import sys
+import glob
+import math
+import bisect
+import argparse
+from collections import Counter
+from difflib import SequenceMatcher
+
+from compressed_io import open_text, read_text, resolve_path
+
+# Number of consecutive lines hashed together into an anchor.
+ANCHOR_LINES = 3
+
+# Longest stretch of lines between two anchors that is diffed line by line.
+MAX_GAP_LINES = 200
+
+# Lowest similarity of two aligned lines for either to replace the other.
+MIN_LINE_SIMILARITY = 0.6
+
+# Smallest difference in mean log token frequency for a reading to win on frequency alone.
+MIN_SCORE_MARGIN = 1.0
+
+HASH_BASE = 1_000_003
+HASH_MODULUS = (1 << 61) - 1
+
+NON_ALPHANUMERIC_RE = re.compile(r"[\W_]+")
+
+FLAG_COLUMNS = ["page", "line", "reason", "primary", "secondary"]
+
+# Choices for the --ocr-source argument of create_entries.py and pipeline.py.
+OCR_SOURCES = ["selected", "reconciled"]
+
+
+def get_ocr_sources(year_string, cwd_path):
+    """
+    Gets a year's OCR sources.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+
+    Returns:
+        primary_path: String; OCR file create_entries.py segments by default.
+        secondary_path: String or None; the year's other OCR file, if there is one.
+    """
+    from create_entries import get_ocr_file_path
+
+    primary_path = get_ocr_file_path(year_string, cwd_path)
+    candidates = [cwd_path + os.path.join("/princeton_years/", f"ecb_19{year_string}.txt")]
+    candidates += sorted(glob.glob(cwd_path + os.path.join("/new_text_files/", f"ecb_19{year_string}_*_070724.txt*")))
+
+    for candidate in candidates:
+        candidate = resolve_path(candidate)
+        if os.path.exists(candidate) and os.path.abspath(candidate) != os.path.abspath(primary_path):
+            return primary_path, candidate
+    return primary_path, None
+
+
+def get_reconciled_paths(year_string, cwd_path):
+    """
+    Gets the merged OCR file and the flagged lines CSV of a year.
+    """
+    directory = cwd_path + "/reconciled/"
+    return directory + f"ecb_19{year_string}.txt", directory + f"reconcile_flags_19{year_string}.csv"
+
+
+def split_lines(contents):
+    """
+    Split OCR file contents into lines, with the index of the \\f separated page of each.
+    """
+    lines, pages = [], []
+    for page_index, page in enumerate(contents.split("\f")):
+        page_lines = page.split("\n")
+        lines.extend(page_lines)
+        pages.extend([page_index] * len(page_lines))
+    return lines, pages
+
+
+def join_lines(lines, pages):
+    """
+    Inverse of split_lines.
+    """
+    page_texts = [[] for _ in range(pages[-1] + 1)] if pages else [[]]
+    for line, page_index in zip(lines, pages):
+        page_texts[page_index].append(line)
+    return "\f".join("\n".join(page_lines) for page_lines in page_texts)
+
+
+def normalise_line(line):
+    """
+    Lowercase letters and digits of a line, which OCR sources of the same page agree on most.
+    """
+    return NON_ALPHANUMERIC_RE.sub("", line).casefold()
+
+
+def window_hashes(line_keys, window=ANCHOR_LINES):
+    """
+    Rolling polynomial hash of every run of window consecutive line keys.
+
+    Arguments:
+        line_keys: List; integer key of each line.
+        window: Integer; number of lines per run.
+
+    Returns:
+        hashes: List; hash of the run starting at each line that has a full run.
+    """
+    if len(line_keys) < window:
+        return []
+    top = pow(HASH_BASE, window - 1, HASH_MODULUS)
+    value = 0
+    for key in line_keys[:window]:
+        value = (value * HASH_BASE + key) % HASH_MODULUS
+    hashes = [value]
+    for start in range(1, len(line_keys) - window + 1):
+        value = (value - line_keys[start - 1] * top) % HASH_MODULUS
+        value = (value * HASH_BASE + line_keys[start + window - 1]) % HASH_MODULUS
+        hashes.append(value)
+    return hashes
+
+
+def unique_positions(hashes, blank):
+    """
+    Position of every hash that occurs once, leaving out runs of blank lines.
+    """
+    counts = Counter(hashes)
+    return {value: position for position, value in enumerate(hashes)
+            if counts[value] == 1 and not blank[position]}
+
+
+def longest_increasing_chain(pairs):
+    """
+    Longest subsequence of (i, j) pairs, sorted by i, whose j also increase
+    (patience sorting, O(n log n)).
+    """
+    tails, tail_indexes, previous = [], [], [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect.bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+        previous[index] = tail_indexes[position - 1] if position else None
+
+    chain = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        chain.append(pairs[index])
+        index = previous[index]
+    return chain[::-1]
+
+
+def anchor_pairs(primary_keys, secondary_keys, window=ANCHOR_LINES):
+    """
+    Lines of the two sources that are aligned by anchors: runs of window lines
+    that hash the same and occur once in each source, in an order both agree on.
+
+    Arguments:
+        primary_keys: List; line keys of the primary source.
+        secondary_keys: List; line keys of the secondary source.
+        window: Integer; lines per anchor.
+
+    Returns:
+        pairs: List; increasing (primary line, secondary line) pairs.
+    """
+    blank_key = hash("")
+    primary_blank = [all(key == blank_key for key in primary_keys[i:i + window])
+                     for i in range(len(primary_keys) - window + 1)]
+    secondary_blank = [all(key == blank_key for key in secondary_keys[j:j + window])
+                       for j in range(len(secondary_keys) - window + 1)]
+    primary_anchors = unique_positions(window_hashes(primary_keys, window), primary_blank)
+    secondary_anchors = unique_positions(window_hashes(secondary_keys, window), secondary_blank)
+
+    starts = sorted((i, secondary_anchors[value]) for value, i in primary_anchors.items()
+                    if value in secondary_anchors)
+    pairs = {}
+    for i, j in longest_increasing_chain(starts):
+        for offset in range(window):
+            pairs.setdefault(i + offset, j + offset)
+
+    # Overlapping anchors can pair a line twice; keep the pairs that stay increasing
+    return longest_increasing_chain(sorted(pairs.items()))
+
+
+def pair_similar(primary_norm, secondary_norm, i_range, j_range, lookahead=3):
+    """
+    Pair the lines of a stretch the sources split into different numbers of
+    lines: each primary line, in order, takes the first of the next lookahead
+    unpaired secondary lines that is similar enough to it.
+
+    Returns:
+        pairs: List; (primary line, secondary line) pairs.
+        unpaired: List; primary lines left without a partner.
+    """
+    pairs, unpaired = [], []
+    j = j_range[0]
+    for i in range(*i_range):
+        for candidate in range(j, min(j + lookahead, j_range[1])):
+            matcher = SequenceMatcher(None, primary_norm[i], secondary_norm[candidate], autojunk=False)
+            if matcher.quick_ratio() >= MIN_LINE_SIMILARITY and matcher.ratio() >= MIN_LINE_SIMILARITY:
+                pairs.append((i, candidate))
+                j = candidate + 1
+                break
+        else:
+            unpaired.append(i)
+    return pairs, unpaired
+
+
+def align_gap(primary_norm, secondary_norm, i_range, j_range):
+    """
+    Pair the lines of one stretch between anchors.
+
+    Arguments:
+        primary_norm: List; normalised lines of the primary source.
+        secondary_norm: List; normalised lines of the secondary source.
+        i_range: Tuple; first and past-the-end primary line of the stretch.
+        j_range: Tuple; first and past-the-end secondary line of the stretch.
+
+    Returns:
+        pairs: List; (primary line, secondary line) pairs.
+        unpaired: List; primary lines in the stretch left without a partner.
+    """
+    i_start, i_end = i_range
+    j_start, j_end = j_range
+    if i_end - i_start == j_end - j_start:
+        return list(zip(range(i_start, i_end), range(j_start, j_end))), []
+    if i_end - i_start > MAX_GAP_LINES or j_end - j_start > MAX_GAP_LINES:
+        return pair_similar(primary_norm, secondary_norm, i_range, j_range)
+
+    pairs, unpaired = [], []
+    matcher = SequenceMatcher(None, primary_norm[i_start:i_end], secondary_norm[j_start:j_end], autojunk=False)
+    for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        if tag == "equal" or (tag == "replace" and a_end - a_start == b_end - b_start):
+            pairs.extend(zip(range(i_start + a_start, i_start + a_end), range(j_start + b_start, j_start + b_end)))
+        elif tag == "replace":
+            block_pairs, block_unpaired = pair_similar(primary_norm, secondary_norm, (i_start + a_start, i_start + a_end),
+                                                       (j_start + b_start, j_start + b_end))
+            pairs.extend(block_pairs)
+            unpaired.extend(block_unpaired)
+        else:
+            unpaired.extend(range(i_start + a_start, i_start + a_end))
+    return pairs, unpaired
+
+
+def align_lines(primary_lines, secondary_lines):
+    """
+    Align the lines of two OCR sources.
+
+    Returns:
+        pairs: List; increasing (primary line, secondary line) pairs.
+        unpaired: List; primary lines without a partner.
+        num_anchored: Integer; number of pairs found by anchors.
+    """
+    primary_norm = [normalise_line(line) for line in primary_lines]
+    secondary_norm = [normalise_line(line) for line in secondary_lines]
+    primary_keys = [hash(line) for line in primary_norm]
+    secondary_keys = [hash(line) for line in secondary_norm]
+
+    anchored = anchor_pairs(primary_keys, secondary_keys)
+    bounds = [(-1, -1)] + anchored + [(len(primary_lines), len(secondary_lines))]
+
+    pairs, unpaired = [], []
+    for (i, j), (next_i, next_j) in zip(bounds, bounds[1:]):
+        if (i, j) != (-1, -1):
+            pairs.append((i, j))
+        if next_i - i > 1 or next_j - j > 1:
+            gap_pairs, gap_unpaired = align_gap(primary_norm, secondary_norm, (i + 1, next_i), (j + 1, next_j))
+            pairs.extend(gap_pairs)
+            unpaired.extend(gap_unpaired)
+    return pairs, unpaired, len(anchored)
+
+
+def reading_score(tokens, token_counts):
+    """
+    Mean log frequency, in both sources, of the tokens only one reading has.
+    OCR errors make rare tokens ("59," for "5s.", "od." for "9d.").
+    """
+    if not tokens:
+        return 0.0
+    return sum(math.log(token_counts[token]) for token in tokens) / len(tokens)
+
+
+def choose_reading(primary, secondary, token_counts, terminator_re):
+    """
+    Choose between two readings of a line.
+
+    A reading that ends in an entry terminator (e.g. "Nov. 12") when the other
+    does not is kept, as the segmenters split entries on terminators. Otherwise
+    the reading whose differing tokens are more frequent in the year wins, if it
+    is clearly more frequent.
+
+    Returns:
+        line: String; the reading kept.
+        reason: String; "secondary" if the secondary reading was kept, "flagged" if
+                neither was clearly better, and "primary" otherwise.
+    """
+    primary_terminated = terminator_re.search(primary) is not None
+    secondary_terminated = terminator_re.search(secondary) is not None
+    if primary_terminated != secondary_terminated:
+        return (primary, "primary") if primary_terminated else (secondary, "secondary")
+
+    primary_tokens, secondary_tokens = Counter(primary.split()), Counter(secondary.split())
+    primary_score = reading_score(list((primary_tokens - secondary_tokens).elements()), token_counts)
+    secondary_score = reading_score(list((secondary_tokens - primary_tokens).elements()), token_counts)
+    if secondary_score - primary_score >= MIN_SCORE_MARGIN:
+        return secondary, "secondary"
+    if primary_score - secondary_score >= MIN_SCORE_MARGIN or normalise_line(primary) == normalise_line(secondary):
+        return primary, "primary"
+    return primary, "flagged"
+
+
+def reconcile(primary_contents, secondary_contents, terminator_re, counters=None):
+    """
+    Merge two OCR sources of a year.
+
+    Arguments:
+        primary_contents: String; primary OCR file contents; its pages and lines are kept.
+        secondary_contents: String; other OCR file contents.
+        terminator_re: Compiled regex; matches lines that end an entry.
+        counters: Dictionary or None; if given, filled with line, anchor and decision counts.
+
+    Returns:
+        merged_contents: String; merged OCR file contents.
+        flags: List; FLAG_COLUMNS dictionaries for lines to check by hand.
+    """
+    primary_lines, primary_pages = split_lines(primary_contents)
+    secondary_lines, _ = split_lines(secondary_contents)
+    pairs, unpaired, num_anchored = align_lines(primary_lines, secondary_lines)
+
+    token_counts = Counter(token for lines in (primary_lines, secondary_lines)
+                           for line in lines for token in line.split())
+
+    merged_lines = list(primary_lines)
+    flags = []
+    decisions = Counter()
+    for i, j in pairs:
+        primary, secondary = primary_lines[i], secondary_lines[j]
+        if primary == secondary:
+            decisions["identical"] += 1
+            continue
+        if SequenceMatcher(None, primary, secondary).ratio() < MIN_LINE_SIMILARITY:
+            decisions["dissimilar"] += 1
+            flags.append({"page": primary_pages[i], "line": i, "reason": "dissimilar",
+                          "primary": primary, "secondary": secondary})
+            continue
+        merged_lines[i], reason = choose_reading(primary, secondary, token_counts, terminator_re)
+        decisions[reason] += 1
+        if reason == "flagged":
+            flags.append({"page": primary_pages[i], "line": i, "reason": reason,
+                          "primary": primary, "secondary": secondary})
+
+    for i in unpaired:
+        if primary_lines[i].strip():
+            flags.append({"page": primary_pages[i], "line": i, "reason": "unaligned",
+                          "primary": primary_lines[i], "secondary": ""})
+    flags.sort(key=lambda flag: flag["line"])
+
+    if counters is not None:
+        counters.update({
+            "lines": len(primary_lines),
+            "secondary_lines": len(secondary_lines),
+            "anchored_lines": num_anchored,
+            "aligned_lines": len(pairs),
+            "unaligned_lines": len(unpaired),
+            "identical_lines": decisions["identical"],
+            "kept_primary": decisions["primary"],
+            "kept_secondary": decisions["secondary"],
+            "flagged_lines": decisions["flagged"] + decisions["dissimilar"],
+        })
+
+    return join_lines(merged_lines, primary_pages), flags
+
+
+def reconcile_year(year_string, cwd_path, recorder):
+    """
+    Reconcile one year's OCR sources and write the merged OCR file and the flags CSV.
+    A year with a single source is copied as it is.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        recorder: RunRecorder; records the "reconcile" stage.
+    """
+    from create_entries import get_splitters_by_year
+
+    primary_path, secondary_path = get_ocr_sources(year_string, cwd_path)
+    merged_path, flags_path = get_reconciled_paths(year_string, cwd_path)
+    input_paths = [primary_path] + ([secondary_path] if secondary_path else [])
+
+    with recorder.stage(year_string, "reconcile", input_paths=input_paths,
+                        output_paths=[merged_path, flags_path]) as counters:
+        _, _, year_variations = get_splitters_by_year(year_string)
+        terminator_re = re.compile(r"\W({})\.?$".format("|".join(year_variations)))
+
+        primary_contents = read_text(primary_path)
+        if secondary_path is None:
+            merged_contents, flags = primary_contents, []
+        else:
+            merged_contents, flags = reconcile(primary_contents, read_text(secondary_path),
+                                               terminator_re, counters)
+
+        os.makedirs(os.path.dirname(merged_path), exist_ok=True)
+        with open_text(merged_path, "w") as f:
+            f.write(merged_contents)
+        with open(flags_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FLAG_COLUMNS)
+            writer.writeheader()
+            writer.writerows(flags)
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Merges the two OCR sources of each year.')
+    parser.add_argument("--years", nargs="+", default=["1902-1922"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1908-1918.")
+    parser.add_argument("--verbose", type=str, default="False",
+            help="Prints out line alignment metrics into the CLI.")
+    parser.add_argument("--metrics", type=str, default="metrics/pipeline_metrics.jsonl",
+            help="JSON lines file, relative to the repository root, that per-stage run metrics are appended to.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    from instrumentation import RunRecorder
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    recorder = RunRecorder(os.path.join(cwd_path, args.metrics), args.verbose == "True")
+
+    for year_string in parse_years(args.years):
+        reconcile_year(year_string, cwd_path, recorder)
@@ -3,8 +3,197 @@ This module contains functions useful for exploring data parsed from the
 English Catalogues
 """
 
+import csv
+import os
+import re
+from itertools import islice
+
+import numpy as np
 import pandas as pd
 
+from compressed_io import open_text, resolve_path
+
+
+def length_counts(path, skip_header=False, drop_nulls=False, block_size=65536):
+    '''
+    Count the strings of each length in the first column of a csv file,
+    streaming the file in blocks so that the strings are never all held in
+    memory at once.
+
+    Parameters
+    ----------
+    path : str
+        The path to the csv file
+
+    skip_header : bool, default False
+        Skip the first row of the file (e.g. the "entry" header of the
+        clean_entries files)
+
+    drop_nulls : bool, default False
+        Do not count empty values; otherwise they count as length 0
+
+    block_size : int, default 65536
+        Number of rows read per block
+
+    Returns
+    -------
+    counts : numpy.ndarray
+        counts[n] is the number of strings with n characters
+    '''
+    counts = np.zeros(1, dtype=np.int64)
+
+    with open_text(resolve_path(path), newline='') as f:
+        reader = csv.reader(f)
+        if skip_header:
+            next(reader, None)
+
+        while True:
+            rows = list(islice(reader, block_size))
+            if not rows:
+                break
+            # Blank lines are skipped, as pd.read_csv does
+            block = np.fromiter((len(row[0]) for row in rows if row), dtype=np.int64)
+            if drop_nulls:
+                block = block[block > 0]
+
+            block_counts = np.bincount(block)
+            if block_counts.size > counts.size:
+                block_counts[:counts.size] += counts
+                counts = block_counts
+            else:
+                counts[:block_counts.size] += block_counts
+
+    return counts
+
+
+def _path_label(path):
+    '''
+    Label a file by the catalogue year in its name, or by its name.
+    '''
+    name = os.path.basename(path)
+    match = re.search(r'19\d\d', name)
+    return match.group(0) if match else name
+
+
+def histogram_lengths(
+        paths,
+        bins=range(0, 400, 5),
+        underflow_lim=30,
+        overflow_lim=300,
+        skip_header=False,
+        drop_nulls=False
+):
+    '''
+    Histogram the lengths of strings in the first column of any number of
+    csv files (e.g. one entries file per year), one streaming pass per file.
+
+    Parameters
+    ----------
+    paths : list-like or dict
+        Paths to the csv files, or a mapping of row label to path. Rows
+        are labelled by the year in the file name by default
+
+    bins : int or list-like, default range(0, 400, 5)
+        The number of bins or a sequence of bin edges, shared by every file
+
+    underflow_lim : int, default 30
+        The minimum number of characters expected in any string
+
+    overflow_lim : int, default 300
+        The maximum number of characters expected in any string
+
+    skip_header : bool, default False
+        Skip the first row of every file
+
+    drop_nulls : bool, default False
+        Do not count empty values
+
+    Returns
+    -------
+    histograms : pandas.DataFrame
+        file x bin matrix of counts, with columns labelled by left bin edge
+
+    summary : pandas.DataFrame
+        per file total, underflow and overflow counts and rates, and mean
+        and median length
+    '''
+    if not isinstance(paths, dict):
+        paths = {_path_label(path): path for path in paths}
+
+    all_counts = {
+        label: length_counts(path, skip_header, drop_nulls)
+        for label, path in paths.items()
+    }
+
+    # Shared bin edges over the lengths seen in any file
+    combined = np.zeros(max((c.size for c in all_counts.values()), default=1), dtype=np.int64)
+    for counts in all_counts.values():
+        combined[:counts.size] += counts
+    edges = np.histogram_bin_edges(np.flatnonzero(combined), bins=bins)
+
+    rows = []
+    summary_rows = []
+    for label, counts in all_counts.items():
+        lengths = np.arange(counts.size)
+        rows.append(np.histogram(lengths, bins=edges, weights=counts)[0].astype(np.int64))
+
+        total = int(counts.sum())
+        cumulative = np.cumsum(counts)
+        underflow_count = int(cumulative[min(underflow_lim, counts.size - 1)])
+        overflow_count = int(counts[overflow_lim:].sum())
+        summary_rows.append({
+            'total': total,
+            'underflow': underflow_count,
+            'overflow': overflow_count,
+            'underflow_rate': underflow_count / total if total else 0,
+            'overflow_rate': overflow_count / total if total else 0,
+            'mean_length': float(lengths @ counts / total) if total else 0,
+            'median_length': int(np.searchsorted(cumulative, total / 2)) if total else 0,
+        })
+
+    labels = list(all_counts)
+    histograms = pd.DataFrame(rows, index=labels, columns=edges[:-1])
+    summary = pd.DataFrame(summary_rows, index=labels)
+
+    return histograms, summary
+
+
+def plot_length_histograms(histograms, ax=None, title='Lengths of entries by year'):
+    '''
+    Plot the rows of a histogram_lengths matrix as one step line per file.
+    matplotlib is only imported when plotting.
+
+    Parameters
+    ----------
+    histograms : pandas.DataFrame
+        file x bin matrix from histogram_lengths
+
+    ax : matplotlib.axes.Axes, optional
+        Axes to draw on; a new figure is created by default
+
+    title : str, default 'Lengths of entries by year'
+        Title for the plot
+
+    Returns
+    -------
+    ax : matplotlib.axes.Axes
+        matplotlib axes object for the plot
+    '''
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        _, ax = plt.subplots(figsize=(12, 6))
+
+    for label, row in histograms.iterrows():
+        ax.step(histograms.columns, row.to_numpy(), where='post', label=str(label))
+
+    ax.set_xlabel('Number of characters in an entry')
+    ax.set_ylabel('Number of entries found')
+    ax.set_title(title)
+    ax.legend()
+
+    return ax
+
 
 def histogram_strings_by_length(
         path,
@@ -12,6 +201,7 @@ def histogram_strings_by_length(
         underflow_lim=30,
         overflow_lim=300,
         show_over_under=False,
+        skip_header=False,
         drop_nulls=False,
         title='Lengths of entries',
         xlabel='Number of characters in an entry',
@@ -39,6 +229,9 @@ def histogram_strings_by_length(
         Show under- and overflow boundaries on the plot and print the
         number of strings outside those limits
 
+    skip_header : bool, default False
+        Skip the first row of the file, e.g. the entry header of the entry CSVs
+
     drop_nulls : bool, default True
         Remove null values from the data set read from the file.
 
@@ -66,20 +259,21 @@ def histogram_strings_by_length(
         matplotlib axes object for the histogram
     '''
 
-    strings = pd.read_csv(path, header=None)[0]
+    import matplotlib.pyplot as plt
 
-    if drop_nulls:
-        strings = strings.loc[~strings.isna()]
+    counts = length_counts(path, skip_header=skip_header, drop_nulls=drop_nulls)
+    lengths = np.arange(counts.size)
 
-    lengths = strings.map(len)
-    fig = lengths.hist(bins=bins, figsize=(12, 6))
+    _, fig = plt.subplots(figsize=(12, 6))
+    fig.hist(lengths, bins=bins, weights=counts)
+    fig.grid(True)
     fig.set_xlabel(xlabel)
     fig.set_ylabel(ylabel)
     fig.set_title(title)
 
-    total = lengths.size
-    underflow_count = lengths.loc[lengths <= underflow_lim].size
-    overflow_count = lengths.loc[lengths >= overflow_lim].size
+    total = int(counts.sum())
+    underflow_count = int(counts[:underflow_lim + 1].sum())
+    overflow_count = int(counts[overflow_lim:].sum())
 
     if show_over_under:
 
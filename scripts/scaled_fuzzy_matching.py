@@ -4,14 +4,20 @@ import csv
 import sys
 from tqdm import tqdm
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import pandas as pd
 from strsimpy.cosine import Cosine
 import numpy as np
 from scipy.signal import find_peaks
+from compressed_io import read_text, resolve_path
 from create_entries import clean_entries_and_measures_to_csv
+from entry_density import check_entry_density
+from instrumentation import RunRecorder
 
 CUTOFF_POINT_SCORE = 0.40
 CLOSE_INDEX_THRESHOLD = 5
+SEGMENT_LENGTH = 10
 
 patternFrontDict = {
     "00": r"centimetres.\n.*\n",
@@ -78,235 +84,366 @@ month_abbrvs = [
     "Dec",
 ]
 
-def scaled_fuzzy_matching(file_path, year_string):
+def page_scores(page, month_string_profiles, cosine):
     """
-    Gets clean entries via fuzzy matching from a single Princeton OCR file's year.
+    Cosine similarity of every segment of a page to every month string.
 
     Arguments:
-        file_path: String; Princeton OCR full file path.
-        year_string: String; string representation of year.
+        page: String; page text.
+        month_string_profiles: List; Cosine profiles of the month strings.
+        cosine: Cosine; shingle size 2 cosine similarity.
 
     Returns:
-        full_entries: array; object containing all entries.
-        clean_entries: array; object containing clean entries.
-        clean_entries_measures: array; object containing clean entries measures.
-        line_mid_entries: array; object containing entries with dates in the middle.
-        front_trunc_entries: array; object containing entries with front truncation.
+        scores: Numpy Array; (len(page), months) scores rounded to 3 decimals,
+                one row per segment starting at each character of the page.
     """
+    scores = np.zeros((len(page), len(month_string_profiles)))
+    for text_index in range(len(page)):
+        segment_profile = cosine.get_profile(page[text_index: text_index + SEGMENT_LENGTH])
+        for profile_index, month_string_profile in enumerate(month_string_profiles):
+            try:
+                scores[text_index, profile_index] = round(cosine.similarity_profiles(segment_profile,
+                                                                                     month_string_profile), 3)
+            except:
+                scores[text_index, profile_index] = 0
+    return scores
 
-    entries = []
-    infile = open(file_path, "r", encoding="utf-8", errors="ignore")
-    contents = infile.read()
-    infile.close()
+# Shared memory blocks and page layout attached by each page scoring worker
+_worker_state = {}
+
+def _attach_worker(text_name, scores_name, page_starts, num_segments, month_strings):
+    """
+    Attach a page scoring worker to the shared page text and score matrix.
+    """
+    text_block = shared_memory.SharedMemory(name=text_name)
+    scores_block = shared_memory.SharedMemory(name=scores_name)
+    cosine = Cosine(2)
+    _worker_state.update({
+        "text_block": text_block,
+        "scores_block": scores_block,
+        "scores": np.ndarray((num_segments, len(month_strings)), dtype=np.float64, buffer=scores_block.buf),
+        "page_starts": page_starts,
+        "cosine": cosine,
+        "month_string_profiles": [cosine.get_profile(month_string) for month_string in month_strings],
+    })
+
+def _score_page_range(first_page, last_page):
+    """
+    Score the segments of pages first_page to last_page (exclusive) into the
+    shared score matrix. Pages are stored as UTF-32, 4 bytes per character,
+    separated by one form feed, so a page's segments start at its character offset.
+    """
+    page_starts = _worker_state["page_starts"]
+    text = _worker_state["text_block"].buf
+    for page_number in range(first_page, last_page):
+        start, end = page_starts[page_number], page_starts[page_number + 1] - 1
+        page = bytes(text[4 * start:4 * end]).decode("utf-32-le")
+        segment_start = start - page_number
+        _worker_state["scores"][segment_start:segment_start + len(page)] = page_scores(
+            page, _worker_state["month_string_profiles"], _worker_state["cosine"])
+    return last_page - first_page
+
+def parallel_page_scores(ecb_pages, month_strings, workers):
+    """
+    Page parallel version of the segment scoring: the page text is placed in
+    shared memory, and a worker pool scores ranges of pages into a shared score
+    matrix. The matrix is identical to the one built one page at a time.
+
+    Arguments:
+        ecb_pages: List; page strings.
+        month_strings: List; month strings, e.g. "Jan 12".
+        workers: Integer; number of worker processes.
+
+    Returns:
+        scores_array: Numpy Array; (segments, months) scores, segments in page order.
+    """
+    # Character offset of every page in the form feed joined text, plus the end
+    page_starts = np.concatenate([[0], np.cumsum([len(page) + 1 for page in ecb_pages])]).tolist()
+    num_segments = sum(len(page) for page in ecb_pages)
+    text = "\f".join(ecb_pages).encode("utf-32-le")
+
+    text_block = shared_memory.SharedMemory(create=True, size=max(len(text), 1))
+    scores_block = shared_memory.SharedMemory(create=True, size=max(num_segments * len(month_strings) * 8, 1))
+    try:
+        text_block.buf[:len(text)] = text
+        scores = np.ndarray((num_segments, len(month_strings)), dtype=np.float64, buffer=scores_block.buf)
+
+        # Several page ranges per worker, so that slow pages even out
+        pages_per_task = max(1, -(-len(ecb_pages) // (workers * 4)))
+        page_ranges = [(first_page, min(first_page + pages_per_task, len(ecb_pages)))
+                       for first_page in range(0, len(ecb_pages), pages_per_task)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker,
+                                 initargs=(text_block.name, scores_block.name, page_starts,
+                                           num_segments, month_strings)) as executor:
+            futures = [executor.submit(_score_page_range, first_page, last_page)
+                       for first_page, last_page in page_ranges]
+            for future in tqdm(futures, desc="Calculate Month - Segment Cosine Scores"):
+                future.result()
+
+        scores_array = scores.copy()
+        del scores
+    finally:
+        text_block.close()
+        text_block.unlink()
+        scores_block.close()
+        scores_block.unlink()
+
+    return scores_array
+
+def volume_pages(contents, year_string):
+    """
+    Cut the front matter and the appendix off an OCR file and split the rest into pages.
+
+    Arguments:
+        contents: String; Princeton OCR file contents.
+        year_string: String; string representation of year.
 
+    Returns:
+        ecb_pages: List; page strings.
+        content_start: Integer; offset in contents at which the first page starts.
+    """
     # Get ecb_content and back_matter
     patternFront = patternFrontDict[year_string]
     text_raw = re.split(patternFront, contents)
     #front_matter = text_raw[0]
     ecb_content = text_raw[1]
+    content_start = re.search(patternFront, contents).end()
     appendix_pattern = appendixPatternDict[year_string]
     appendix_list = re.split(appendix_pattern, ecb_content, flags=re.DOTALL)
     ecb_content = appendix_list[0]
 
     # Split into pages
-    ecb_pages = ecb_content.split("\f")
-
-    # Iterate through pages to get all segments
-    segments = []
-    segment_length = 10
-    for page_number in tqdm(range(len(ecb_pages)), desc="Get all page segments"):
-        page = ecb_pages[page_number]
-        for text_index in range(len(page)):
-            segment = [page_number]
-            segment.append(text_index)
-            text = page[text_index: text_index + segment_length]
-            segment.append(text)
-            segments.append(segment)
-        # break
-
-    # Create Month Strings to be matched
-    month_strings = []
-    for index in range(len(month_abbrvs)):
-        month_string = f"{month_abbrvs[index]} {year_string}"
-        month_strings.append(month_string)
-
-    # Calculate Month String Cosine Profiles
+    return ecb_content.split("\f"), content_start
+
+def get_month_strings(year_string):
+    """
+    Month strings matched against the segments, e.g. "Jan 12".
+    """
+    return [f"{month_abbrv} {year_string}" for month_abbrv in month_abbrvs]
+
+def segment_starts(ecb_pages):
+    """
+    Index of the first segment of every page. A page has one segment starting at
+    each of its characters, so segment i of the volume starts at character
+    i - starts[page] of its page.
+    """
+    starts = np.zeros(len(ecb_pages), dtype=np.int64)
+    np.cumsum([len(page) for page in ecb_pages[:-1]], out=starts[1:])
+    return starts
+
+def score_pages(ecb_pages, month_strings, workers=1):
+    """
+    Cosine similarity of every segment of every page to every month string.
+
+    Arguments:
+        ecb_pages: List; page strings.
+        month_strings: List; month strings, e.g. "Jan 12".
+        workers: Integer; number of processes that score the pages.
+
+    Returns:
+        scores_array: Numpy Array; (segments, months) scores, segments in page order.
+    """
+    if workers > 1:
+        return parallel_page_scores(ecb_pages, month_strings, workers)
+
     cosine = Cosine(2)
-    month_string_profiles = []
-    for month_string_index in range(len(month_strings)):
-            month_string = month_strings[month_string_index]
-            month_string_profile = cosine.get_profile(month_string)
-            month_string_profiles.append(month_string_profile)
-    
-    # Calculate Month String - Segments Cosine Similarity Scores
-    scores_array = []
-    for segment_index in tqdm(range(len(segments)), desc="Calculate Month - Segment Cosine Scores"):
-        segment_text = segments[segment_index][2]
-        segment_profile = cosine.get_profile(segment_text)
-        scores = []
-        for profile_index in range(len(month_string_profiles)):
-            month_string_profile = month_string_profiles[profile_index]
+    month_string_profiles = [cosine.get_profile(month_string) for month_string in month_strings]
+    scores_array = np.zeros((sum(len(page) for page in ecb_pages), len(month_strings)))
+    segment_start = 0
+    for page in tqdm(ecb_pages, desc="Calculate Month - Segment Cosine Scores"):
+        scores_array[segment_start:segment_start + len(page)] = page_scores(page, month_string_profiles, cosine)
+        segment_start += len(page)
+    return scores_array
+
+def peak_sequences(scores_array):
+    """
+    Peaks of every month's scores over the whole volume, each widened to the run
+    of equal scores around it.
+
+    Arguments:
+        scores_array: Numpy Array; (segments, months) scores.
+
+    Returns:
+        sequences: Dictionary; months, first and last segment indexes and scores of
+                   the sequences, as arrays ordered by month and then by peak.
+    """
+    months, firsts, lasts, scores = [], [], [], []
+    for month_index in tqdm(range(scores_array.shape[1]), desc="Get Potential Sequences"):
+        month_scores = scores_array[:, month_index]
+        peaks = find_peaks(month_scores)[0]
+
+        # Runs of equal scores, and the run each peak is in
+        run_starts = np.flatnonzero(np.concatenate([[True], month_scores[1:] != month_scores[:-1]]))
+        run_ends = np.concatenate([run_starts[1:], [len(month_scores)]]) - 1
+        runs = np.searchsorted(run_starts, peaks, side="right") - 1
+
+        months.append(np.full(len(peaks), month_index))
+        firsts.append(run_starts[runs])
+        lasts.append(run_ends[runs])
+        scores.append(month_scores[peaks])
+
+    return {"month": np.concatenate(months), "first": np.concatenate(firsts),
+            "last": np.concatenate(lasts), "score": np.concatenate(scores)}
+
+def refine_cutoffs(ecb_pages, sequences, month_strings, min_score):
+    """
+    Find the cutoff point at the end of every sequence scoring above min_score:
+    the last segment of the sequence is shortened from the right for as long as
+    that raises its score.
+
+    Arguments:
+        ecb_pages: List; page strings.
+        sequences: Dictionary; peak_sequences output.
+        month_strings: List; month strings, e.g. "Jan 12".
+        min_score: Float; sequences scoring at most this are skipped.
+
+    Returns:
+        refined_cutoffs: Dictionary; page, cutoff point in the page, best score and
+                         sequence score arrays, in sequence order.
+    """
+    cosine = Cosine(2)
+    month_string_profiles = [cosine.get_profile(month_string) for month_string in month_strings]
+    starts = segment_starts(ecb_pages)
+
+    kept = np.flatnonzero(sequences["score"] > min_score)
+    pages = np.searchsorted(starts, sequences["last"][kept], side="right") - 1
+    cutoff_points = np.zeros(len(kept), dtype=np.int64)
+    best_scores = np.zeros(len(kept))
+
+    for position, sequence_index in enumerate(tqdm(kept, desc="Get Desirable Cutoff Points")):
+        segment_page = pages[position]
+        segment_start_index = int(sequences["last"][sequence_index] - starts[segment_page])
+        segment_string = ecb_pages[segment_page][segment_start_index: segment_start_index + SEGMENT_LENGTH]
+        segment_string_length = len(segment_string)
+        keep_searching = True
+        left_counter = 0
+        month_string_profile = month_string_profiles[sequences["month"][sequence_index]]
+        segment_profile = cosine.get_profile(segment_string)
+        best_score = round(cosine.similarity_profiles(segment_profile, month_string_profile), 3)
+        while keep_searching:
+            left_counter += 1
+            next_string = segment_string[:segment_string_length - left_counter]
+            next_segment_profile = cosine.get_profile(next_string)
             try:
-                score = round(cosine.similarity_profiles(segment_profile, month_string_profile),3)
+                score = round(cosine.similarity_profiles(next_segment_profile, month_string_profile), 3)
             except:
                 score = 0
-            scores.append(score)
-        scores_array.append(scores)
-    
-    # Get Potential Sequences
-    month_desirable_sequences = {}
-    for month_index in tqdm(range(0, 12), desc="Get Potential Sequences"):
-        month_scores = []
-        for index in range(len(scores_array)):
-            score = scores_array[index][month_index]
-            month_scores.append(score)
-        np_month_scores = np.array(month_scores)
-
-        # Find Peaks
-        peaks = find_peaks(np_month_scores)[0].tolist()
-        peak_scores = np_month_scores[peaks].tolist()
-
-        # Iterate through peaks to find desirable sequences of strings
-        desirable_sequences = []
-        for index in range(len(peaks)):
-            peak_index = peaks[index]
-            peak_score = peak_scores[index]
-            desirable_sequence = [peak_index]
-
-            # Check Left
-            check_left = True
-            left_counter = 1
-            while check_left:
-                index_to_check = peak_index - left_counter
-                if index_to_check in range(len(month_scores)):
-                    if month_scores[index_to_check] == peak_score:
-                        desirable_sequence.append(index_to_check)
-                    else:
-                        check_left = False
-                else:
-                    check_left = False
-                left_counter += 1
-
-            # Check Right
-            check_right = True
-            right_counter = 1
-            while check_right:
-                index_to_check = peak_index + right_counter
-                if index_to_check in range(len(month_scores)):
-                    if month_scores[index_to_check] == peak_score:
-                        desirable_sequence.append(index_to_check)
-                    else:
-                        check_right = False
-                else:
-                    check_right = False
-                right_counter += 1
-
-            # Sort Desirable Sequence
-            desirable_sequence.sort()
-            desirable_sequence.append(peak_score)
-            desirable_sequences.append(desirable_sequence)
-
-        month_desirable_sequences[month_index] = desirable_sequences
-    
-    # Iterate through desirable sequences to locate desirable sequences of segments
-    desirable_segment_arrays_dict = {}
-    for key in tqdm(month_desirable_sequences, desc="Locate desirable sequences of segments"):
-        desirable_segment_arrays = []
-        desirable_sequences = month_desirable_sequences[key]
-        for sequence in desirable_sequences:
-            score = sequence[-1]
-            sequence = sequence[:-1]
-            segments_array = []
-            if score > CUTOFF_POINT_SCORE:
-                for index in range(len(sequence)):
-                    sequence_value = sequence[index]
-                    segment = segments[sequence_value]
-                    segments_array.append(segment)
-            if len(segments_array) > 0:
-                desirable_segment_arrays.append(segments_array)
-        desirable_segment_arrays_dict[key] = desirable_segment_arrays
-    
-    # Get desirable cutoff points
+            if score > best_score and left_counter < segment_string_length:
+                best_score = score
+            else:
+                left_counter -= 1
+                keep_searching = False
+        cutoff_points[position] = segment_start_index + segment_string_length - left_counter
+        best_scores[position] = best_score
+
+    return {"page": pages, "cutoff_point": cutoff_points, "best_score": best_scores,
+            "sequence_score": sequences["score"][kept]}
+
+def select_cutoffs(refined_cutoffs, cutoff_score=CUTOFF_POINT_SCORE, close_threshold=CLOSE_INDEX_THRESHOLD):
+    """
+    Keep the cutoff points of the sequences scoring above cutoff_score, and of
+    cutoff points closer than close_threshold characters on a page keep the
+    higher scoring one.
+
+    Arguments:
+        refined_cutoffs: Dictionary; refine_cutoffs output, for a min_score of at most cutoff_score.
+        cutoff_score: Float; sequences scoring at most this give no cutoff point.
+        close_threshold: Integer; distance below which two cutoff points are the same.
+
+    Returns:
+        cutoff_points_dict: Dictionary; page -> list of cutoff points in the page.
+    """
     cutoff_points_dict = {}
     score_cutoff_points_dict = {}
-    for key in tqdm(desirable_segment_arrays_dict, desc="Get Desirable Cutoff Points"):
-        desirable_segment_arrays = desirable_segment_arrays_dict[key]
-        for segment_array in desirable_segment_arrays:
-            if len(segment_array) > 0:
-                segment = segment_array[-1]
-                segment_page = segment[0]
-                segment_start_index = segment[1]
-                segment_string = segment[2]
-                segment_string_length = len(segment_string)
-                keep_searching = True
-                left_counter = 0
-                month_string_profile = month_string_profiles[key]
-                segment_profile = cosine.get_profile(segment_string)
-                best_score = round(cosine.similarity_profiles(segment_profile, 
-                                                                month_string_profile),3)
-                #print(f"{segment_string}: {segment_start_index + segment_string_length - left_counter}")
-                while keep_searching:
-                    left_counter += 1
-                    next_string = segment_string[:segment_string_length - left_counter]
-                    #print(f"{next_string}: {segment_start_index + segment_string_length - left_counter}")
-                    next_segment_profile = cosine.get_profile(next_string)
-                    try:
-                        score = round(cosine.similarity_profiles(next_segment_profile, 
-                                                                month_string_profile),3)
-                    except:
-                        score = 0
-                    if score > best_score and left_counter < segment_string_length:
-                        best_score = score
-                    else:
-                        left_counter -= 1
-                        keep_searching = False
-                cutoff_point = segment_start_index + segment_string_length - left_counter
-                #print(cutoff_point)
-                #print("-------------------")
-                if best_score > 0:
-                    if segment_page not in cutoff_points_dict:
-                        cutoff_points_dict[segment_page] = []
-                    if segment_page not in score_cutoff_points_dict:
-                        score_cutoff_points_dict[segment_page] = []
-                    cutoff_points_array = cutoff_points_dict[segment_page]
-                    score_cutoff_points_array = score_cutoff_points_dict[segment_page]
-                    if cutoff_point not in cutoff_points_array:
-                        exists_close = False
-                        replaced = False
-                        # Remove low score points that are close to high score points
-                        for cutoff_point_index in range(len(cutoff_points_array)):
-                            examining_cutoff_point = cutoff_points_array[cutoff_point_index]
-                            examining_cutoff_point_score = score_cutoff_points_array[cutoff_point_index]
-                            if abs(cutoff_point - examining_cutoff_point) < CLOSE_INDEX_THRESHOLD \
-                                                    and best_score <= examining_cutoff_point_score:
-                                exists_close = True
-                            if abs(cutoff_point - examining_cutoff_point) < CLOSE_INDEX_THRESHOLD \
-                                                    and best_score > examining_cutoff_point_score:
-                                cutoff_points_array[cutoff_point_index] = cutoff_point
-                                score_cutoff_points_array[cutoff_point_index] = best_score
-                                replaced = True
-                        if not exists_close and not replaced:
-                            cutoff_points_array.append(cutoff_point)
-                            score_cutoff_points_array.append(best_score)
-                    cutoff_points_dict[segment_page] = cutoff_points_array
-                    score_cutoff_points_dict[segment_page] = score_cutoff_points_array
-    
-    # Get entries
+    for segment_page, cutoff_point, best_score, sequence_score in zip(
+            refined_cutoffs["page"].tolist(), refined_cutoffs["cutoff_point"].tolist(),
+            refined_cutoffs["best_score"].tolist(), refined_cutoffs["sequence_score"].tolist()):
+        if sequence_score <= cutoff_score or best_score <= 0:
+            continue
+        cutoff_points_array = cutoff_points_dict.setdefault(segment_page, [])
+        score_cutoff_points_array = score_cutoff_points_dict.setdefault(segment_page, [])
+        if cutoff_point not in cutoff_points_array:
+            exists_close = False
+            replaced = False
+            # Remove low score points that are close to high score points
+            for cutoff_point_index in range(len(cutoff_points_array)):
+                examining_cutoff_point = cutoff_points_array[cutoff_point_index]
+                examining_cutoff_point_score = score_cutoff_points_array[cutoff_point_index]
+                if abs(cutoff_point - examining_cutoff_point) < close_threshold \
+                                        and best_score <= examining_cutoff_point_score:
+                    exists_close = True
+                if abs(cutoff_point - examining_cutoff_point) < close_threshold \
+                                        and best_score > examining_cutoff_point_score:
+                    cutoff_points_array[cutoff_point_index] = cutoff_point
+                    score_cutoff_points_array[cutoff_point_index] = best_score
+                    replaced = True
+            if not exists_close and not replaced:
+                cutoff_points_array.append(cutoff_point)
+                score_cutoff_points_array.append(best_score)
+    return cutoff_points_dict
+
+def page_entries(ecb_pages, cutoff_points_dict):
+    """
+    Cut every page into entries at its cutoff points, in page order. Text before
+    the first cutoff point of a page is not part of an entry.
+
+    Arguments:
+        ecb_pages: List; page strings.
+        cutoff_points_dict: Dictionary; select_cutoffs output.
+
+    Returns:
+        entries: List; entries with their lines joined.
+    """
+    entries = []
     for page_index in tqdm(range(len(ecb_pages)), desc="Get Entries"):
         if page_index in cutoff_points_dict:
             page = ecb_pages[page_index]
-            cutoff_points_array = cutoff_points_dict[page_index]
-            # TODO investigate the below line
-            #print(zip(cutoff_points_array, cutoff_points_array[1:]+[None]))
-            cutoff_points_array.sort()
+            cutoff_points_array = sorted(cutoff_points_dict[page_index])
             page_entries = [page[i:j] for i,j in zip(cutoff_points_array, cutoff_points_array[1:]+[None])]
-            cleaned_page_entries = []
-            for page_entry_index in range(len(page_entries)):
-                page_entry = page_entries[page_entry_index]
-                if len(page_entry) > 0:
-                    page_entry = "".join(page_entry.splitlines())
-                    cleaned_page_entries.append(page_entry)
-            entries += cleaned_page_entries
+            entries += ["".join(page_entry.splitlines()) for page_entry in page_entries if len(page_entry) > 0]
+    return entries
+
+def scaled_fuzzy_matching(file_path, year_string, workers=1, counters=None):
+    """
+    Gets clean entries via fuzzy matching from a single Princeton OCR file's year.
+
+    Arguments:
+        file_path: String; Princeton OCR full file path.
+        year_string: String; string representation of year.
+        workers: Integer; number of processes that score the pages. Segments and
+                 their scores never cross a page, so the pages are scored in parallel
+                 when above 1; peaks and cutoffs are then found over the whole volume
+                 as before, and the entries are the same either way.
+        counters: Dictionary or None; if given, filled with entry density counters,
+                  see entry_density.py.
+
+    Returns:
+        full_entries: array; object containing all entries.
+        clean_entries: array; object containing clean entries.
+        clean_entries_measures: array; object containing clean entries measures.
+        line_mid_entries: array; object containing entries with dates in the middle.
+        front_trunc_entries: array; object containing entries with front truncation.
+    """
+
+    contents = read_text(file_path)
+    ecb_pages, _ = volume_pages(contents, year_string)
+
+    # Calculate Month String - Segments Cosine Similarity Scores, one row per segment
+    month_strings = get_month_strings(year_string)
+    scores_array = score_pages(ecb_pages, month_strings, workers)
+
+    # Get Potential Sequences, and the best cutoff point at the end of each
+    sequences = peak_sequences(scores_array)
+    refined_cutoffs = refine_cutoffs(ecb_pages, sequences, month_strings, CUTOFF_POINT_SCORE)
+
+    # Get entries
+    cutoff_points_dict = select_cutoffs(refined_cutoffs, CUTOFF_POINT_SCORE, CLOSE_INDEX_THRESHOLD)
+    entries = page_entries(ecb_pages, cutoff_points_dict)
+
+    # Compare the cutoffs per page with the publication page counts
+    cutoff_pages = np.array([page_index + 1 for page_index, cutoff_points in cutoff_points_dict.items()
+                             for _ in cutoff_points], dtype=np.int64)
+    check_entry_density(year_string, "fuzzy_segment", cutoff_pages, None, len(ecb_pages), counters)
 
     # Get line mid entries  
     line_mid_re = re.compile(r".*({})\.?\W00\.?[^\.]+".format("|".join(month_abbrvs)))
@@ -343,41 +480,72 @@ def scaled_fuzzy_matching(file_path, year_string):
 
     return full_entries, clean_entries, clean_entries_measures, line_mid_entries, front_trunc_entries
 
-if __name__ == "__main__":
+def create_year_fuzzy_entries(year_string, cwd_path, recorder, workers=1):
+    """
+    Segments one /princeton_years/ OCR file with scaled fuzzy matching and writes
+    its entries and entries measures to /entries_fuzzy/.
+
+    Arguments:
+        year_string: String; string representation of year.
+        cwd_path: String; repository root path.
+        recorder: RunRecorder; records the "fuzzy_segment" stage.
+        workers: Integer; number of processes that score the pages.
+    """
     # Iterate through Princeton OCR folder
     folder_path = '/princeton_years/'
 
+    file_name = "ecb_19" + year_string + ".txt" 
+    file_path = resolve_path(cwd_path + os.path.join(folder_path, file_name))
+
+    # Initialize Directories
+    full_entries_directory = "/entries_fuzzy/full_entries/"
+    clean_entries_directory = "/entries_fuzzy/clean_entries/"
+    clean_entries_measures_directory = "/entries_fuzzy/entries_measures/"
+    front_trunc_entries_directory = "/entries_fuzzy/front_trunc_entries/"
+    line_mid_entries_directory = "/entries_fuzzy/line_mid_entries/"
+
+    # Run scaled fuzzy matching
+    with recorder.stage(year_string, "fuzzy_segment", input_paths=[file_path]) as counters:
+        full_entries, clean_entries, clean_entries_measures, \
+        line_mid_entries, front_trunc_entries = scaled_fuzzy_matching(file_path, year_string, workers, counters)
+        counters["entries_out"] = len(full_entries)
+        counters["line_mid_hits"] = clean_entries_measures[0]
+        counters["front_trunc_hits"] = clean_entries_measures[2]
+
+    # Written like the /entries/ clean entries, as a single "entry" column
+    clean_entries_df = pd.DataFrame({"entry": clean_entries})
+
+    clean_entries_and_measures_to_csv(full_entries, clean_entries_df, clean_entries_measures, 
+                                line_mid_entries, front_trunc_entries,
+                                year_string, cwd_path, full_entries_directory,
+                                clean_entries_directory,
+                                clean_entries_measures_directory,
+                                front_trunc_entries_directory,
+                                line_mid_entries_directory)
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Segments the Princeton OCR files with scaled fuzzy matching.')
+
+    parser.add_argument("--workers", type=int, default=1,
+            help="Number of processes that score the pages of a year in parallel.")
+
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    args = argparse_create(sys.argv[1:])
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    recorder = RunRecorder(os.path.join(cwd_path, "metrics/pipeline_metrics.jsonl"))
+
     # Only cover years 1908 and 1918
     for year in tqdm(range(8,19)):
-    #for year in tqdm(range(10,19)):
-        if year != 21:
-            if year < 10:
-                year = "0" + str(year)
-
-            # Initialize entries
-            entries = []
-
-            # Get appropriate paths 
-            year_string = str(year)
-            file_name = "ecb_19" + str(year) + ".txt" 
-            cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
-            file_path = cwd_path + os.path.join(folder_path, file_name)
-
-            # Initialize Directories
-            full_entries_directory = "/entries_fuzzy/full_entries/"
-            clean_entries_directory = "/entries_fuzzy/clean_entries/"
-            clean_entries_measures_directory = "/entries_fuzzy/entries_measures/"
-            front_trunc_entries_directory = "/entries_fuzzy/front_trunc_entries/"
-            line_mid_entries_directory = "/entries_fuzzy/line_mid_entries/"
-
-            # Run scaled fuzzy matching
-            full_entries, clean_entries, clean_entries_measures, \
-            line_mid_entries, front_trunc_entries = scaled_fuzzy_matching(file_path, year_string)
-
-            clean_entries_and_measures_to_csv(full_entries, clean_entries, clean_entries_measures, 
-                                        line_mid_entries, front_trunc_entries,
-                                        year_string, cwd_path, full_entries_directory,
-                                        clean_entries_directory,
-                                        clean_entries_measures_directory,
-                                        front_trunc_entries_directory,
-                                        line_mid_entries_directory)
\ No newline at end of file
+        create_year_fuzzy_entries(f"{year:02d}", cwd_path, recorder, args.workers)
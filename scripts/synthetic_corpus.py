@@ -0,0 +1,200 @@
+"""
+This module generates synthetic, catalogue-shaped OCR text for benchmarking the
+segmentation and dataframe scripts, and cuts small fixed samples out of the
+real OCR files in /princeton_years/ and /new_text_files/.
+"""
+
+import random
+import re
+
+from compressed_io import read_text
+from create_entries import get_splitters_by_year
+
+# Text that satisfies both the splitters.txt patterns (create_entries.py) and
+# the patterns in scaled_fuzzy_matching.py for the years we can synthesise.
+SYNTHETIC_MARKERS = {
+    "12": {
+        "front": "are also given whenever possible in inches, i inch=21 centimetres.\nA\nACADEMY\n",
+        "appendix": "APPENDIX\nLEARNED SOCIETIES, PRINTING CLUBS, &c., WITH LISTS OF THEIR\n"
+                    "PUBLICATIONS, 1912\n",
+    },
+}
+
+SURNAMES = [
+    "Abercrombie", "Adams", "Bindloss", "Boehme", "Cantlie", "Dana", "Evans",
+    "Faraday", "Gaskell", "Hawthorne", "Johnson", "King", "Leslie", "Morris",
+    "Raymond", "Seton", "Tolstoy", "Whitman", "Yonge",
+]
+
+FORENAMES = ["A.", "C. S.", "Harold", "H. C.", "James", "Mrs.", "R. Brimley", "W. M. L."]
+
+TITLE_WORDS = [
+    "history", "of", "the", "life", "and", "letters", "a", "study", "essays",
+    "Great", "Britain", "church", "poems", "village", "romance", "guide", "in",
+]
+
+FORMATS = ["Cr. 8vo.", "8vo.", "12mo.", "4to.", "Ryl. 8vo.", "fo."]
+
+PRICES = ["6s.", "3s. 6d.", "2s. 6d. net", "Is. net", "7s. 6d. net", "6d."]
+
+PUBLISHERS = ["DENT", "LONGMANS", "MACMILLAN", "HODDER & S.", "CAMB. UNIV. PRESS", "W. COLLINS"]
+
+MONTHS = ["Jan.", "Feb.", "Mar.", "Apr.", "May", "June", "July", "Aug.", "Sep.", "Oct.", "Nov.", "Dec."]
+
+
+def wrap_lines(text, width=48):
+    """
+    Wrap text onto lines of roughly the catalogue's column width.
+
+    Arguments:
+        text: String; text to wrap.
+        width: Integer; maximum line length.
+
+    Returns:
+        lines: List; wrapped lines.
+    """
+    lines = []
+    line = ""
+    for word in text.split(" "):
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def synthetic_entry(rng, year_variations):
+    """
+    Generate one main entry, ending with a publisher, month and a (possibly
+    OCR-confused) year token.
+
+    Arguments:
+        rng: random.Random; source of randomness.
+        year_variations: List; OCR variations of the catalogue year.
+
+    Returns:
+        entry: String; single-line entry text.
+    """
+    title = " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(3, 12)))
+    title = title[0].upper() + title[1:]
+    year_token = year_variations[0] if rng.random() < 0.8 else rng.choice(year_variations)
+
+    return "{} ({})—{}. {}, pp. {}, {} {}, {} {}".format(
+        rng.choice(SURNAMES), rng.choice(FORENAMES), title, rng.choice(FORMATS),
+        rng.randint(20, 600), rng.choice(PRICES), rng.choice(PUBLISHERS),
+        rng.choice(MONTHS), year_token,
+    )
+
+
+def synthetic_page(rng, page_number, year_string, year_variations, entries_per_page=70,
+                   line_mid_rate=0.01):
+    """
+    Generate one catalogue page: page-number header, running heading, entries
+    wrapped over several lines, and the occasional line-mid merge where one
+    entry starts on the same line as the previous entry's date.
+
+    Arguments:
+        rng: random.Random; source of randomness.
+        page_number: Integer; catalogue page number.
+        year_string: String; string representation of year.
+        year_variations: List; OCR variations of the catalogue year.
+        entries_per_page: Integer; number of entries on the page.
+        line_mid_rate: Float; probability that an entry is merged into the previous line.
+
+    Returns:
+        page: String; page text, without the \\f separator.
+    """
+    lines = [
+        "",
+        f"## p. {page_number} (#{page_number + 10}) " + "#" * 46,
+        "",
+        str(page_number),
+        f"[19{year_string}",
+        "THE ENGLISH CATALOGUE",
+        rng.choice(SURNAMES).upper(),
+    ]
+    for _ in range(entries_per_page):
+        entry_lines = wrap_lines(synthetic_entry(rng, year_variations))
+        if len(lines) > 7 and rng.random() < line_mid_rate:
+            lines[-1] = f"{lines[-1]} {entry_lines[0]}"
+            entry_lines = entry_lines[1:]
+        lines += entry_lines
+
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_volume(year_string, num_pages, seed=0):
+    """
+    Generate a whole synthetic volume: front matter, num_pages catalogue pages
+    separated by \\f, and the appendix heading.
+
+    Arguments:
+        year_string: String; string representation of year, a key of SYNTHETIC_MARKERS.
+        num_pages: Integer; number of catalogue pages.
+        seed: Integer; random seed, so that volumes are reproducible.
+
+    Returns:
+        contents: String; full OCR-like file contents.
+    """
+    rng = random.Random(seed)
+    markers = SYNTHETIC_MARKERS[year_string]
+    _, _, year_variations = get_splitters_by_year(year_string)
+
+    parts = [f"THE ENGLISH CATALOGUE OF BOOKS FOR 19{year_string}\n\f", markers["front"]]
+    for page_number in range(1, num_pages + 1):
+        parts.append(synthetic_page(rng, page_number, year_string, year_variations))
+        parts.append("\f")
+    parts.append(markers["appendix"])
+    parts.append("Aberdeen University Studies.\n")
+
+    return "".join(parts)
+
+
+def write_synthetic_volume(path, year_string, num_pages, seed=0):
+    """
+    Write a synthetic volume to disk.
+
+    Arguments:
+        path: String; target txt file path.
+        year_string: String; string representation of year, a key of SYNTHETIC_MARKERS.
+        num_pages: Integer; number of catalogue pages.
+        seed: Integer; random seed.
+
+    Returns:
+        size: Integer; number of characters written.
+    """
+    contents = synthetic_volume(year_string, num_pages, seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(contents)
+    return len(contents)
+
+
+def real_sample(file_path, year_string, num_pages):
+    """
+    Cut a fixed sample out of a real OCR file: the front matter, the first
+    num_pages catalogue pages and the appendix heading, so the sample can be
+    fed to the same scripts as the full volume.
+
+    Arguments:
+        file_path: String; path to a /princeton_years/ or /new_text_files/ OCR file.
+        year_string: String; string representation of year.
+        num_pages: Integer; number of catalogue pages to keep.
+
+    Returns:
+        contents: String; sample file contents.
+    """
+    contents = read_text(file_path)
+
+    front_pattern, appendix_pattern, _ = get_splitters_by_year(year_string)
+    front_match = re.search(front_pattern, contents)
+    appendix_match = re.search(appendix_pattern, contents, flags=re.DOTALL)
+    if front_match is None or appendix_match is None:
+        raise IndexError(f"No front or appendix match in {file_path} for year {year_string}.")
+
+    pages = contents[front_match.end():appendix_match.start()].split("\f")
+
+    return (contents[:front_match.end()] + "\f".join(pages[:num_pages])
+            + "\f" + appendix_match.group(0) + "\n")
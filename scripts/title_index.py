@@ -0,0 +1,282 @@
+"""
+This module answers "which catalogue rows look like this title/author?" across
+every year without rereading the /dataframes/ CSVs. It builds a persistent
+character 3-gram TF-IDF index over the normalised title and author of every
+row (the same TfidfVectorizer tooling as scaled_fuzzy_matching_attempt.py),
+so a lookup is one sparse dot product. Batch lookups use sparse_dot_topn when
+it is installed and scipy otherwise.
+
+``(python prefix) title_index.py build --years 1912-1921``
+``(python prefix) title_index.py query "Thomas Hardy : critical study" --author Abercrombie``
+``(python prefix) title_index.py batch queries.csv --output matches.csv``
+"""
+
+import os
+import re
+import sys
+import pickle
+import argparse
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+try:
+    from sparse_dot_topn import sp_matmul_topn
+except ImportError:
+    try:
+        # sparse_dot_topn < 1.0
+        from sparse_dot_topn import awesome_cossim_topn
+
+        def sp_matmul_topn(A, B, top_n, threshold, sort):
+            return awesome_cossim_topn(A, B, ntop=top_n, lower_bound=threshold)
+    except ImportError:
+        sp_matmul_topn = None
+
+# Catalogue columns kept with the index and returned with every match.
+INDEX_COLUMNS = ["catalogue_year", "entry_id", "title", "author_name", "publisher", "date"]
+
+NON_ALPHANUMERIC_RE = re.compile(r"[\W_]+")
+
+
+def normalise_text(text):
+    """
+    Lowercase letters and digits of a title or author, separated by single spaces.
+    """
+    if not isinstance(text, str):
+        return ""
+    return NON_ALPHANUMERIC_RE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+def index_text(titles, authors):
+    """
+    Normalised "title author" strings that rows and queries are indexed by.
+
+    Arguments:
+        titles: Iterable; titles.
+        authors: Iterable; author names, None where unknown.
+
+    Returns:
+        texts: List; one string per title.
+    """
+    return [f"{normalise_text(title)} {normalise_text(author)}".strip()
+            for title, author in zip(titles, authors)]
+
+
+def read_catalogue_rows(paths):
+    """
+    Read the INDEX_COLUMNS of several /dataframes/ CSVs, skipping rows without a title.
+
+    Arguments:
+        paths: List; df_19YY.csv file paths.
+
+    Returns:
+        rows: Pandas Dataframe; INDEX_COLUMNS of every titled row.
+    """
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, usecols=lambda column: column in INDEX_COLUMNS, dtype=str)
+        frames.append(df.reindex(columns=INDEX_COLUMNS))
+    rows = pd.concat(frames, ignore_index=True)
+    return rows[rows["title"].notna()].reset_index(drop=True)
+
+
+def top_k_rows(scores, k, min_score):
+    """
+    Indexes and scores of the k best scoring columns of each row of a dense score matrix.
+    """
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k else np.empty((len(scores), 0), dtype=int)
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    return [(columns[values >= min_score], values[values >= min_score])
+            for columns, values in zip(best, best_scores)]
+
+
+class TitleIndex:
+    """
+    Character 3-gram TF-IDF index over the titles and authors of catalogue rows.
+
+    Arguments:
+        vectorizer: TfidfVectorizer; fitted on the rows' index text.
+        matrix: Scipy CSR Matrix; L2-normalised TF-IDF vector of each row.
+        rows: Pandas Dataframe; INDEX_COLUMNS of each row, in matrix order.
+    """
+
+    def __init__(self, vectorizer, matrix, rows):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.rows = rows
+        self._matrix_t = None
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Fit an index over catalogue rows, e.g. from read_catalogue_rows.
+        """
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 3), min_df=1,
+                                     lowercase=False, dtype=np.float32)
+        matrix = vectorizer.fit_transform(index_text(rows["title"], rows["author_name"]))
+        return cls(vectorizer, matrix.tocsr(), rows)
+
+    def save(self, directory):
+        """
+        Write the index to a directory: the matrix as .npz, the fitted vectorizer as a
+        pickle and the row columns as CSV.
+        """
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(os.path.join(directory, "matrix.npz"), self.matrix)
+        with open(os.path.join(directory, "vectorizer.pkl"), "wb") as f:
+            pickle.dump(self.vectorizer, f)
+        self.rows.to_csv(os.path.join(directory, "rows.csv"), index=False)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Read an index written by save.
+        """
+        matrix = sparse.load_npz(os.path.join(directory, "matrix.npz")).tocsr()
+        with open(os.path.join(directory, "vectorizer.pkl"), "rb") as f:
+            vectorizer = pickle.load(f)
+        rows = pd.read_csv(os.path.join(directory, "rows.csv"), dtype=str)
+        return cls(vectorizer, matrix, rows)
+
+    @property
+    def matrix_t(self):
+        """
+        Transposed matrix in CSR form, as sparse_dot_topn expects for batch queries.
+        """
+        if self._matrix_t is None:
+            self._matrix_t = self.matrix.T.tocsr()
+        return self._matrix_t
+
+    def query(self, title, author=None, k=10, min_score=0.0):
+        """
+        Rows most similar to one title (and author).
+
+        Arguments:
+            title: String; title to look up.
+            author: String or None; author name to look up with it.
+            k: Integer; largest number of rows returned.
+            min_score: Float; lowest cosine similarity returned.
+
+        Returns:
+            matches: Pandas Dataframe; INDEX_COLUMNS and score of each match, best first.
+        """
+        return self.query_batch([title], None if author is None else [author], k, min_score) \
+            .drop(columns="query_index")
+
+    def query_batch(self, titles, authors=None, k=5, min_score=0.5, batch_size=2000):
+        """
+        Rows most similar to each of many titles (and authors), matched together.
+
+        Arguments:
+            titles: List; titles to look up.
+            authors: List or None; author name of each title.
+            k: Integer; largest number of rows returned per title.
+            min_score: Float; lowest cosine similarity returned.
+            batch_size: Integer; titles scored per sparse product, to bound memory.
+
+        Returns:
+            matches: Pandas Dataframe; query_index, INDEX_COLUMNS and score of each
+                     match, best first within each query.
+        """
+        authors = [None] * len(titles) if authors is None else authors
+        queries = self.vectorizer.transform(index_text(titles, authors))
+
+        query_indexes, row_indexes, scores = [], [], []
+        for start in range(0, queries.shape[0], batch_size):
+            block = queries[start:start + batch_size]
+            for offset, (columns, values) in enumerate(self.top_k(block, k, min_score)):
+                query_indexes.append(np.full(len(columns), start + offset))
+                row_indexes.append(columns)
+                scores.append(values)
+
+        row_indexes = np.concatenate(row_indexes) if row_indexes else np.empty(0, dtype=int)
+        matches = self.rows.iloc[row_indexes].reset_index(drop=True)
+        matches.insert(0, "query_index", np.concatenate(query_indexes) if query_indexes else [])
+        matches["score"] = np.concatenate(scores) if scores else []
+        return matches
+
+    def top_k(self, queries, k, min_score):
+        """
+        Best k rows of each query vector, as (row indexes, scores) pairs.
+        """
+        if sp_matmul_topn is not None:
+            product = sp_matmul_topn(queries, self.matrix_t, top_n=k, threshold=min_score, sort=True)
+            return [(product.indices[start:end], product.data[start:end])
+                    for start, end in zip(product.indptr[:-1], product.indptr[1:])]
+
+        scores = (queries @ self.matrix_t).toarray()
+        return top_k_rows(scores, k, min_score)
+
+
+def argparse_create(args):
+    """
+    Parser to parse this script's arguments that pertain to the running of this code.
+
+    Arguments:
+        args: User inputted arguments that have yet to be parsed.
+
+    Returns:
+        parsed_args: Parsed user inputted arguments.
+    """
+    parser = argparse.ArgumentParser(description='Builds and queries the catalogue title index.')
+    parser.add_argument("--index", type=str, default="title_index",
+            help="Index directory, relative to the repository root.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Index every row of the given years' dataframes.")
+    build.add_argument("--years", nargs="+", default=["1912-1921"],
+            help="Years or inclusive year ranges, e.g. 1912 or 1912-1921.")
+
+    query = commands.add_parser("query", help="Print the rows most similar to one title.")
+    query.add_argument("title", type=str)
+    query.add_argument("--author", type=str, default=None)
+    query.add_argument("-k", type=int, default=10)
+
+    batch = commands.add_parser("batch", help="Match every title of a CSV file.")
+    batch.add_argument("queries", type=str, help="CSV file with a title and optionally an author column.")
+    batch.add_argument("--output", type=str, required=True)
+    batch.add_argument("-k", type=int, default=5)
+    batch.add_argument("--min-score", type=float, default=0.5)
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    import time
+
+    from create_dataframes import get_dataframe_paths
+    from pipeline import parse_years
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    index_path = os.path.join(cwd_path, args.index)
+
+    if args.command == "build":
+        paths = [get_dataframe_paths(year_string, cwd_path)[0] for year_string in parse_years(args.years)]
+        index = TitleIndex.build(read_catalogue_rows([path for path in paths if os.path.exists(path)]))
+        index.save(index_path)
+        print(f"{len(index.rows.index)} rows indexed in {index_path}")
+
+    elif args.command == "query":
+        index = TitleIndex.load(index_path)
+        start = time.perf_counter()
+        matches = index.query(args.title, args.author, args.k)
+        print(matches.to_string())
+        print(f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    else:
+        index = TitleIndex.load(index_path)
+        queries = pd.read_csv(args.queries, dtype=str)
+        matches = index.query_batch(queries["title"].tolist(),
+                                    queries["author"].tolist() if "author" in queries else None,
+                                    args.k, args.min_score)
+        matches.to_csv(args.output, index=False)
+        print(f"{len(matches.index)} matches for {len(queries.index)} titles written to {args.output}")
@@ -0,0 +1,175 @@
+"""
+This module is a local stand-in for the WorldCat Search API v2 /bibs request,
+so that enrichment.py can be developed and checked offline. It answers a
+query with a recorded response when one exists (an enrichment response cache
+directory, e.g. from a run against WorldCat, passed as --replay), and
+otherwise by searching the records of /worldcat_fixtures/bibs.json:
+``(python prefix) worldcat_stub.py --port 8765 --replay ../enrichment/cache``
+
+--fail-every and --latency make it answer some requests with 429 and delay
+every response, to exercise the client's retries and concurrency.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from enrichment import BIBS_PATH, ResponseCache, normalise_text, query_key
+
+# Query field -> record fields it is searched in.
+QUERY_FIELDS = {
+    "ti": ["title"],
+    "au": ["author"],
+    "pb": ["publisher"],
+    "kw": ["title", "author", "publisher"],
+}
+
+QUERY_TERM_RE = re.compile(r"\b(ti|au|pb|kw):(.*?)(?=\s+AND\s+\w\w:|$)")
+
+
+def record_fields(bib):
+    """
+    Normalised title, author and publisher text and the publication year of a fixture record.
+    """
+    titles = bib["title"]["mainTitles"]
+    creators = bib.get("contributor", {}).get("creators", [])
+    publishers = bib.get("publishers", [])
+    date = re.search(r"1[0-9]{3}", bib.get("date", {}).get("publicationDate", ""))
+    return {
+        "title": normalise_text(" ".join(title["text"] for title in titles)),
+        "author": normalise_text(" ".join(creator.get(name, {}).get("text", "")
+                                          for creator in creators
+                                          for name in ("firstName", "secondName"))),
+        "publisher": normalise_text(" ".join(publisher["publisherName"]["text"] for publisher in publishers)),
+        "year": int(date.group()) if date else None,
+    }
+
+
+def search_fixtures(records, params):
+    """
+    Fixture records that match a query: at least half of the words of every
+    query term appear in the fields it searches, and the publication year is in
+    the datePublished range.
+
+    Arguments:
+        records: List; (fixture record, record_fields) pairs.
+        params: Dictionary; query parameters.
+
+    Returns:
+        response: Dictionary; /bibs response.
+    """
+    terms = QUERY_TERM_RE.findall(params.get("q", ""))
+    first_year, _, last_year = params.get("datePublished", "").partition("-")
+
+    matches = []
+    for bib, fields in records:
+        if first_year and (fields["year"] is None
+                           or not int(first_year) <= fields["year"] <= int(last_year or first_year)):
+            continue
+        for field, text in terms:
+            words = normalise_text(text).split()
+            searched = " ".join(fields[name] for name in QUERY_FIELDS[field]).split()
+            if words and sum(word in searched for word in words) * 2 < len(words):
+                break
+        else:
+            matches.append(bib)
+
+    limit = int(params.get("limit", 10))
+    return {"numberOfRecords": len(matches), "bibRecords": matches[:limit]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /bibs requests; the server holds the fixtures and settings.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != BIBS_PATH:
+            self.send_json(404, {"message": f"Unknown path {url.path}"})
+            return
+
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            rate_limited = server.fail_every and server.num_requests % server.fail_every == 0
+        if server.latency:
+            time.sleep(server.latency)
+        if rate_limited:
+            self.send_json(429, {"message": "Too many requests"}, {"Retry-After": "0.1"})
+            return
+
+        params = dict(parse_qsl(url.query))
+        response = server.replay.get(query_key(params)) if server.replay else None
+        if response is None:
+            response = search_fixtures(server.records, params)
+        self.send_json(200, response)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(port=8765, fixtures_path=None, replay=None, fail_every=0, latency=0.0, verbose=False):
+    """
+    Create a stub server; call serve_forever() on it, e.g. in a thread.
+
+    Arguments:
+        port: Integer; port to listen on, 0 for any free port.
+        fixtures_path: String or None; fixture records JSON, /worldcat_fixtures/bibs.json by default.
+        replay: String or None; response cache directory whose responses are replayed.
+        fail_every: Integer; answer every fail_every-th request with 429, 0 for never.
+        latency: Float; seconds every response is delayed by.
+        verbose: Boolean; If true, logs every request.
+
+    Returns:
+        server: ThreadingHTTPServer; the bound server.
+    """
+    if fixtures_path is None:
+        fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worldcat_fixtures", "bibs.json")
+    with open(fixtures_path, "r", encoding="utf-8") as f:
+        bibs = json.load(f)["bibRecords"]
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.records = [(bib, record_fields(bib)) for bib in bibs]
+    server.replay = ResponseCache(replay) if replay else None
+    server.fail_every = fail_every
+    server.latency = latency
+    server.verbose = verbose
+    server.num_requests = 0
+    server.lock = threading.Lock()
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Serves a local stand-in for the WorldCat /bibs request.')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", type=str, default=None, help="Fixture records JSON.")
+    parser.add_argument("--replay", type=str, default=None,
+            help="Enrichment response cache directory whose responses are replayed.")
+    parser.add_argument("--fail-every", type=int, default=0,
+            help="Answer every n-th request with 429 Too Many Requests.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every response is delayed by.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(sys.argv[1:])
+
+    server = make_server(args.port, args.fixtures, args.replay, args.fail_every, args.latency, args.verbose)
+    print(f"Serving {BIBS_PATH} on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()